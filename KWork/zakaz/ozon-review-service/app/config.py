@@ -36,6 +36,10 @@ class Settings(BaseSettings):
     # Polling settings
     polling_interval_minutes: int = 30  # How often to fetch new reviews
     
+    # Metrics settings
+    metrics_enabled: bool = True  # Request and SQL metrics at /metrics
+    slow_query_ms: int = 0  # Log DB statements slower than this with parameters (0 = off)
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,12 +1,15 @@
 """Main FastAPI application"""
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import logging
 import os
 from app.database import Base, engine
 from app.background_tasks import start_background_tasks, shutdown_background_tasks
 from app.api.routes import reviews, responses, settings, integrations
+from app.config import settings as app_settings
+from app.metrics import MetricsMiddleware, instrument_engine, metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,6 +25,11 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Record request latency and SQL per route
+if app_settings.metrics_enabled:
+    instrument_engine(engine)
+    app.add_middleware(MetricsMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +45,13 @@ app.include_router(responses.router)
 app.include_router(settings.router)
 app.include_router(integrations.router)
 
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Request and SQL metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # Mount static files (frontend)
 frontend_path = os.path.join(os.path.dirname(__file__), "frontend")
 try:
@@ -6,6 +6,8 @@ from app.api.services import router as services_router
 from app.api.orders import router as orders_router
 from app.api.messages import router as messages_router
 from app.api.reviews import router as reviews_router
+from app.api.statements import router as statements_router
+from app.api.auth import router as auth_router
 
 __all__ = [
     "users_router",
@@ -13,4 +15,6 @@ __all__ = [
     "orders_router",
     "messages_router",
     "reviews_router",
+    "statements_router",
+    "auth_router",
 ]
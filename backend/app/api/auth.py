@@ -0,0 +1,74 @@
+"""
+API маршруты для входа через Telegram WebApp
+"""
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.db.session import get_db
+from app.core.config import get_settings
+from app.core.security import InitDataError, create_session_token, verify_init_data
+from app.models import User
+from app.schemas import TelegramAuthRequest, SessionResponse
+
+router = APIRouter(prefix="/api/v1/auth", tags=["Auth"])
+
+
+def _user_from_init_data(db: Session, telegram_user: dict) -> User:
+    """Пользователь по telegram_id; при первом входе - создаётся из initData"""
+    telegram_id = int(telegram_user["id"])
+    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    if user:
+        return user
+
+    user = User(
+        telegram_id=telegram_id,
+        telegram_username=telegram_user.get("username"),
+        first_name=telegram_user.get("first_name") or str(telegram_id),
+        last_name=telegram_user.get("last_name"),
+        avatar_url=telegram_user.get("photo_url"),
+        created_at=datetime.utcnow(),
+    )
+    db.add(user)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Параллельный первый вход того же пользователя
+        db.rollback()
+        return db.query(User).filter(User.telegram_id == telegram_id).one()
+    db.refresh(user)
+    return user
+
+
+@router.post("/telegram", response_model=SessionResponse)
+def login_telegram(auth_data: TelegramAuthRequest, db: Session = Depends(get_db)):
+    """
+    Вход по initData Telegram WebApp
+    
+    Подпись initData проверяется один раз здесь; дальше клиент передаёт
+    выданный токен в заголовке Authorization: Bearer <токен>, и запросы
+    проверяются без обращения к БД.
+    """
+    settings = get_settings()
+    if not settings.telegram_bot_token:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Вход через Telegram не настроен"
+        )
+    try:
+        fields = verify_init_data(auth_data.init_data, settings.telegram_bot_token, settings.init_data_max_age_seconds)
+    except InitDataError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
+        )
+
+    user = _user_from_init_data(db, fields["user"])
+    if user.is_banned:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Пользователь заблокирован"
+        )
+
+    token, expires_in = create_session_token(user.id, user.telegram_id)
+    return SessionResponse(access_token=token, expires_in=expires_in, user_id=user.id)
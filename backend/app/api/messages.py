@@ -1,19 +1,137 @@
 """
 API маршруты для управления сообщениями в чате заказа
+
+Кроме REST есть WebSocket /{order_id}/messages/ws: новые, изменённые
+и удалённые сообщения приходят подписчикам сразу, без опроса get_messages.
 """
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, Query, joinedload
+from app.db.session import get_db, SessionLocal
+from app.db.outbox import enqueue_events
+from app.api.pagination import paginate
+from app.core.pubsub import broker, order_channel
 from app.models import Message, Order
 from app.schemas import MessageCreate, MessageResponse, MessageDetailResponse
-from datetime import datetime
 
 router = APIRouter(prefix="/api/v1/orders", tags=["Messages"])
 
+# Коды закрытия WebSocket (4000+ - коды приложения)
+WS_CLOSE_NOT_FOUND = 4404
+WS_CLOSE_FORBIDDEN = 4403
+
+# Водяные знаки для следующего инкрементального запроса
+SYNC_SINCE_ID_HEADER = "X-Sync-Since-Id"
+SYNC_UPDATED_SINCE_HEADER = "X-Sync-Updated-Since"
+SYNC_EDITED_AFTER_ID_HEADER = "X-Sync-Edited-After-Id"
+
+# Максимум сообщений в одном ответе
+MAX_MESSAGES_PAGE = 1000
+
+
+def _message_dict(msg: Message) -> dict:
+    """Сообщение с краткой информацией об авторе"""
+    return {
+        "id": msg.id,
+        "order_id": msg.order_id,
+        "author_id": msg.author_id,
+        "text": msg.text,
+        "attachments": msg.attachments,
+        "is_edited": msg.is_edited,
+        "is_deleted": msg.is_deleted,
+        "created_at": msg.created_at,
+        "edited_at": msg.edited_at,
+        "author": {
+            "id": msg.author.id,
+            "first_name": msg.author.first_name,
+            "avatar_url": msg.author.avatar_url,
+        }
+    }
+
+
+@dataclass
+class _DeltaPage:
+    """Страница инкрементальной синхронизации и водяные знаки для следующей"""
+    messages: list[Message]
+    since_id: int
+    updated_since: Optional[datetime]
+    edited_after_id: Optional[int]
+    complete: bool  # Больше изменений нет
+
+
+def _delta_page(
+    db: Session,
+    order_id: int,
+    since_id: Optional[int],
+    updated_since: Optional[datetime],
+    edited_after_id: Optional[int],
+    limit: int
+) -> _DeltaPage:
+    """
+    Изменения чата после since_id/updated_since, не больше limit сообщений
+
+    Два потока со своими курсорами: изменённые и удалённые сообщения из уже
+    полученных (id <= since_id) - по (edited_at, id) после (updated_since,
+    edited_after_id), затем новые - по id после since_id. Удалённые тоже
+    попадают в выборку (с is_deleted=True), чтобы клиент убрал их у себя.
+    Индексы: (order_id, edited_at) и (order_id, id).
+    """
+    # Момент берём до запроса: изменения во время запроса попадут в следующий
+    watermark = datetime.utcnow()
+    if since_id is None:
+        # Есть только updated_since: у клиента всё, что создано до него
+        since_id = db.query(func.max(Message.id)).filter(
+            Message.order_id == order_id,
+            Message.created_at <= updated_since
+        ).scalar() or 0
+
+    edited: list[Message] = []
+    next_updated_since, next_edited_after_id = watermark, None
+    if updated_since is not None:
+        after = Message.edited_at > updated_since
+        if edited_after_id is not None:
+            after = or_(after, and_(Message.edited_at == updated_since, Message.id > edited_after_id))
+        edited = db.query(Message).options(joinedload(Message.author)).filter(
+            Message.order_id == order_id,
+            Message.id <= since_id,
+            after
+        ).order_by(Message.edited_at, Message.id).limit(limit).all()
+        if len(edited) == limit:
+            # Не всё поместилось - следующая страница после последнего изменения
+            next_updated_since, next_edited_after_id = edited[-1].edited_at, edited[-1].id
+
+    created: list[Message] = []
+    if len(edited) < limit:
+        created = db.query(Message).options(joinedload(Message.author)).filter(
+            Message.order_id == order_id,
+            Message.id > since_id
+        ).order_by(Message.id).limit(limit - len(edited)).all()
+
+    return _DeltaPage(
+        messages=edited + created,
+        since_id=max([since_id] + [msg.id for msg in created]),
+        updated_since=next_updated_since,
+        edited_after_id=next_edited_after_id,
+        complete=len(edited) + len(created) < limit,
+    )
+
+
+def _publish(event_type: str, msg: Message) -> None:
+    """Разослать событие чата подписчикам WebSocket (после commit)"""
+    broker.publish(order_channel(msg.order_id), {
+        "type": event_type,
+        "message": jsonable_encoder(_message_dict(msg)),
+    })
+
 
 @router.post("/{order_id}/messages/", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
-async def send_message(
+def send_message(
     order_id: int,
     message_data: MessageCreate,
     author_id: int,
@@ -53,17 +171,26 @@ async def send_message(
     )
     
     db.add(new_message)
+    db.flush()
+    # Уведомление получателю в Telegram - через outbox, вне запроса
+    enqueue_events(db, "message.created", [order_id], {"message_id": new_message.id})
     db.commit()
     db.refresh(new_message)
+    _publish("message.created", new_message)
     
     return new_message
 
 
 @router.get("/{order_id}/messages/", response_model=list[MessageDetailResponse])
-async def get_messages(
+def get_messages(
     order_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    since_id: Optional[int] = None,
+    updated_since: Optional[datetime] = None,
+    edited_after_id: Optional[int] = None,
     user_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
@@ -75,6 +202,17 @@ async def get_messages(
     - user_id: ID пользователя (для проверки доступа)
     - skip: пропустить сообщений
     - limit: максимум сообщений
+    - cursor: курсор более старой страницы из заголовка X-Next-Cursor (вместо skip)
+    
+    Инкрементальный режим (если передан since_id и/или updated_since):
+    - since_id: только сообщения с ID больше указанного
+    - updated_since: сообщения, созданные, изменённые или удалённые после этого момента
+    - edited_after_id: продолжение страницы изменений (из X-Sync-Edited-After-Id)
+    
+    В инкрементальном режиме удалённые сообщения тоже возвращаются, а в заголовках
+    X-Sync-Since-Id, X-Sync-Updated-Since и X-Sync-Edited-After-Id (если есть)
+    приходят значения для следующего запроса. Пока в ответе limit сообщений,
+    запрос с новыми значениями надо повторить.
     """
     # Проверяем заказ
     order = db.query(Order).filter(Order.id == order_id).first()
@@ -91,42 +229,31 @@ async def get_messages(
             detail="Вы не можете смотреть сообщения этого заказа"
         )
     
-    limit = min(limit, 1000)
+    limit = min(limit, MAX_MESSAGES_PAGE)
+    
+    if since_id is not None or updated_since is not None:
+        page = _delta_page(db, order_id, since_id, updated_since, edited_after_id, limit)
+        response.headers[SYNC_SINCE_ID_HEADER] = str(page.since_id)
+        response.headers[SYNC_UPDATED_SINCE_HEADER] = page.updated_since.isoformat()
+        if page.edited_after_id is not None:
+            response.headers[SYNC_EDITED_AFTER_ID_HEADER] = str(page.edited_after_id)
+        
+        return [_message_dict(msg) for msg in page.messages]
     
-    messages = db.query(Message).filter(
+    query = db.query(Message).filter(
         Message.order_id == order_id,
         Message.is_deleted == False
-    ).order_by(Message.created_at.desc()).offset(skip).limit(limit).all()
+    )
+    messages = paginate(query.options(joinedload(Message.author)), Message, response, skip, limit, cursor)
     
     # Переворачиваем для корректного порядка (новые снизу)
     messages.reverse()
     
-    # Добавляем информацию об авторе
-    result = []
-    for msg in messages:
-        msg_dict = {
-            "id": msg.id,
-            "order_id": msg.order_id,
-            "author_id": msg.author_id,
-            "text": msg.text,
-            "attachments": msg.attachments,
-            "is_edited": msg.is_edited,
-            "is_deleted": msg.is_deleted,
-            "created_at": msg.created_at,
-            "edited_at": msg.edited_at,
-            "author": {
-                "id": msg.author.id,
-                "first_name": msg.author.first_name,
-                "avatar_url": msg.author.avatar_url,
-            }
-        }
-        result.append(msg_dict)
-    
-    return result
+    return [_message_dict(msg) for msg in messages]
 
 
 @router.put("/{order_id}/messages/{message_id}", response_model=MessageResponse)
-async def edit_message(
+def edit_message(
     order_id: int,
     message_id: int,
     message_data: MessageCreate,
@@ -175,12 +302,13 @@ async def edit_message(
     
     db.commit()
     db.refresh(message)
+    _publish("message.edited", message)
     
     return message
 
 
 @router.delete("/{order_id}/messages/{message_id}", status_code=status.HTTP_200_OK)
-async def delete_message(
+def delete_message(
     order_id: int,
     message_id: int,
     user_id: int,
@@ -216,7 +344,116 @@ async def delete_message(
     # Мягкое удаление (не удаляем физически, только помечаем как удалённое)
     message.is_deleted = True
     message.text = "[Сообщение удалено]"
+    message.edited_at = datetime.utcnow()  # Водяной знак для инкрементальной синхронизации
     
     db.commit()
+    _publish("message.deleted", message)
     
     return {"message": "Сообщение удалено"}
+
+
+def _open_chat(
+    order_id: int,
+    user_id: int,
+    last_id: Optional[int],
+    updated_since: Optional[datetime]
+) -> tuple[Optional[int], list[dict]]:
+    """
+    Проверить доступ к чату и загрузить изменения после last_id/updated_since
+    
+    Возвращает (код закрытия или None, сообщения для досылки).
+    """
+    db = SessionLocal()
+    try:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            return WS_CLOSE_NOT_FOUND, []
+        if user_id not in [order.buyer_id, order.seller_id]:
+            return WS_CLOSE_FORBIDDEN, []
+        if last_id is None and updated_since is None:
+            return None, []
+        
+        backlog = []
+        edited_after_id = None
+        while True:
+            page = _delta_page(db, order_id, last_id, updated_since, edited_after_id, MAX_MESSAGES_PAGE)
+            backlog.extend(jsonable_encoder(_message_dict(msg)) for msg in page.messages)
+            if page.complete:
+                return None, backlog
+            last_id, updated_since, edited_after_id = page.since_id, page.updated_since, page.edited_after_id
+    finally:
+        db.close()
+
+
+@router.websocket("/{order_id}/messages/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    order_id: int,
+    user_id: int,
+    last_id: Optional[int] = None,
+    updated_since: Optional[datetime] = None
+):
+    """
+    Чат заказа в реальном времени
+    
+    Параметры:
+    - user_id: ID участника заказа
+    - last_id: ID последнего полученного сообщения (при переподключении
+      сначала придут только сообщения после него)
+    - updated_since: момент последней синхронизации (придут и изменения
+      старых сообщений за время отключения)
+    
+    Сервер присылает JSON: {"type": "message.created" | "message.edited" |
+    "message.deleted", "message": {...}}
+    """
+    await websocket.accept()
+    
+    # Подписываемся до загрузки истории, чтобы не потерять сообщения между ними
+    async with broker.subscribe(order_channel(order_id)) as events:
+        close_code, backlog = await run_in_threadpool(_open_chat, order_id, user_id, last_id, updated_since)
+        if close_code is not None:
+            await websocket.close(code=close_code)
+            return
+        
+        last_sent_id = last_id or 0
+        for message in backlog:
+            if message["id"] > last_sent_id:
+                event_type = "message.created"
+            else:
+                event_type = "message.deleted" if message["is_deleted"] else "message.edited"
+            await websocket.send_json({"type": event_type, "message": message})
+            last_sent_id = max(last_sent_id, message["id"])
+        
+        async def forward_events():
+            nonlocal last_sent_id
+            while True:
+                event = await events.get()
+                # Клиенту уходят только события сообщений
+                if "message" not in event:
+                    continue
+                message_id = event["message"]["id"]
+                # Уже отправлено из истории
+                if event["type"] == "message.created" and message_id <= last_sent_id:
+                    continue
+                await websocket.send_json(event)
+                if event["type"] == "message.created":
+                    last_sent_id = max(last_sent_id, message_id)
+        
+        async def wait_disconnect():
+            # Входящие кадры клиента не нужны, читаем до отключения
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+        
+        tasks = [asyncio.create_task(forward_events()), asyncio.create_task(wait_disconnect())]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # Ошибка отправки означает, что клиент ушёл
+                if task.exception() and not isinstance(task.exception(), (WebSocketDisconnect, RuntimeError)):
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
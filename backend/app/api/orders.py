@@ -2,10 +2,16 @@
 API маршруты для управления заказами
 """
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
 from app.db.session import get_db
-from app.models import Order, Service, User, OrderStatus, Transaction, TransactionType, TransactionStatus
+from app.api.pagination import paginate
+from app.db.ledger import LedgerError, run_with_retry, find_payment, pay_order
+from app.db.outbox import enqueue_events
+from app.db.transitions import TransitionNotAllowed, record_transitions, transition_order
+from app.models import Order, Service, User, Message, OrderStatus, OrderActor, Transaction, TransactionType, TransactionStatus
 from app.schemas import OrderCreate, OrderUpdate, OrderResponse, OrderDetailResponse
 from datetime import datetime, timedelta
 
@@ -13,7 +19,7 @@ router = APIRouter(prefix="/api/v1/orders", tags=["Orders"])
 
 
 @router.post("/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
-async def create_order(order_data: OrderCreate, buyer_id: int, db: Session = Depends(get_db)):
+def create_order(order_data: OrderCreate, buyer_id: int, db: Session = Depends(get_db)):
     """
     Создать заказ (купить услугу)
     
@@ -61,7 +67,7 @@ async def create_order(order_data: OrderCreate, buyer_id: int, db: Session = Dep
     # Создаём заказ
     price = service.price
     platform_fee_percent = 10.0  # 10% комиссия платформы
-    platform_fee = price * (platform_fee_percent / 100)
+    platform_fee = price.percent(platform_fee_percent)  # Money: целые копейки, без float
     seller_gets = price - platform_fee
     
     new_order = Order(
@@ -93,6 +99,7 @@ async def create_order(order_data: OrderCreate, buyer_id: int, db: Session = Dep
     )
     
     db.add(escrow_transaction)
+    enqueue_events(db, "order.created", [new_order.id])
     db.commit()
     db.refresh(new_order)
     
@@ -100,14 +107,26 @@ async def create_order(order_data: OrderCreate, buyer_id: int, db: Session = Dep
 
 
 @router.get("/{order_id}", response_model=OrderDetailResponse)
-async def get_order(order_id: int, db: Session = Depends(get_db)):
+def get_order(order_id: int, db: Session = Depends(get_db)):
     """Получить информацию о заказе"""
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
+    # Участники, услуга и отзыв подгружаются JOIN'ом, количество сообщений -
+    # подзапросом COUNT, без загрузки самих сообщений
+    messages_count = select(func.count(Message.id)).where(
+        Message.order_id == Order.id
+    ).correlate(Order).scalar_subquery()
+    
+    row = db.query(Order, messages_count).options(
+        joinedload(Order.buyer),
+        joinedload(Order.seller),
+        joinedload(Order.service),
+        joinedload(Order.review),
+    ).filter(Order.id == order_id).first()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Заказ не найден"
         )
+    order, messages_count = row
     
     # Подготавливаем полный ответ
     order_dict = {
@@ -127,7 +146,7 @@ async def get_order(order_id: int, db: Session = Depends(get_db)):
             "title": order.service.title,
             "category": order.service.category,
         },
-        "messages_count": len(order.messages),
+        "messages_count": messages_count,
         "review": None,
     }
     
@@ -142,10 +161,12 @@ async def get_order(order_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/buyer/{buyer_id}/", response_model=list[OrderResponse])
-async def get_buyer_orders(
+def get_buyer_orders(
     buyer_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     status_filter: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
@@ -155,15 +176,17 @@ async def get_buyer_orders(
     if status_filter:
         query = query.filter(Order.status == status_filter)
     
-    orders = query.offset(skip).limit(limit).all()
+    orders = paginate(query, Order, response, skip, limit, cursor)
     return orders
 
 
 @router.get("/seller/{seller_id}/", response_model=list[OrderResponse])
-async def get_seller_orders(
+def get_seller_orders(
     seller_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     status_filter: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
@@ -173,134 +196,141 @@ async def get_seller_orders(
     if status_filter:
         query = query.filter(Order.status == status_filter)
     
-    orders = query.offset(skip).limit(limit).all()
+    orders = paginate(query, Order, response, skip, limit, cursor)
     return orders
 
 
 @router.put("/{order_id}", response_model=OrderResponse)
-async def update_order(
+def update_order(
     order_id: int,
     order_data: OrderUpdate,
     user_id: int,
     db: Session = Depends(get_db)
 ):
-    """Обновить заказ (изменить статус, отправить результат)"""
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Заказ не найден"
-        )
-    
-    # Проверяем, что это участник заказа
-    if user_id not in [order.buyer_id, order.seller_id]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Вы не участник этого заказа"
-        )
+    """
+    Обновить заказ (изменить статус, отправить результат)
     
-    # Обновляем поля
-    if order_data.status is not None:
-        # Логика изменения статусов
-        if order_data.status == OrderStatus.COMPLETED:
-            # Когда заказ завершён, выплачиваем продавцу
-            order.completed_at = datetime.utcnow()
-            
-            # Создаём транзакцию выплаты
-            release_transaction = Transaction(
-                user_id=order.seller_id,
-                order_id=order.id,
-                type=TransactionType.ORDER_RELEASE,
-                amount=order.seller_gets,
-                status=TransactionStatus.COMPLETED,
-                description=f"Выплата за завершённый заказ",
-                created_at=datetime.utcnow(),
-                completed_at=datetime.utcnow(),
+    Смена статуса - по таблице переходов ORDER_TRANSITIONS: кто и из какого
+    статуса может перевести заказ. Повтор того же статуса ничего не меняет.
+    """
+    def apply_update() -> Order:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Заказ не найден"
             )
-            db.add(release_transaction)
-            
-            # Обновляем баланс продавца
-            order.seller.balance += order.seller_gets
-            order.seller.total_earned += order.seller_gets
-            
-            # Обновляем статистику
-            order.seller.completed_orders += 1
-            order.service.total_orders += 1
+        
+        # Проверяем, что это участник заказа
+        if user_id not in [order.buyer_id, order.seller_id]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Вы не участник этого заказа"
+            )
+        actor = OrderActor.BUYER if user_id == order.buyer_id else OrderActor.SELLER
+        
+        # Статус - условным UPDATE, выплата по завершению - из outbox
+        if order_data.status is not None:
+            try:
+                changed = transition_order(db, order, order_data.status, actor)
+            except TransitionNotAllowed as e:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
             
-            order.is_paid = True
+            if not changed and order.status != order_data.status:
+                # Параллельный запрос успел сменить статус раньше
+                current = db.query(Order.status).filter(Order.id == order_id).scalar()
+                if current != order_data.status:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="Статус заказа уже изменён, обновите данные"
+                    )
         
-        order.status = order_data.status
-    
-    if order_data.seller_result is not None:
-        order.seller_result = order_data.seller_result
-    
-    if order_data.buyer_comment is not None:
-        order.buyer_comment = order_data.buyer_comment
+        # Остальные поля пишем, только если они действительно изменились
+        if order_data.seller_result is not None and order_data.seller_result != order.seller_result:
+            order.seller_result = order_data.seller_result
+            order.updated_at = datetime.utcnow()
+        
+        if order_data.buyer_comment is not None and order_data.buyer_comment != order.buyer_comment:
+            order.buyer_comment = order_data.buyer_comment
+            order.updated_at = datetime.utcnow()
+        
+        return order
     
-    order.updated_at = datetime.utcnow()
-    db.commit()
+    order = run_with_retry(db, apply_update)
     db.refresh(order)
     
     return order
 
 
-@router.post("/{order_id}/pay", status_code=status.HTTP_200_OK)
-async def pay_for_order(order_id: int, buyer_id: int, db: Session = Depends(get_db)):
-    """Оплатить заказ"""
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
+def _payment_response(payment: Transaction, order_id: int, buyer_id: int) -> dict:
+    """Ответ на оплату (и на повтор запроса с тем же Idempotency-Key)"""
+    if payment.order_id != order_id or payment.user_id != buyer_id:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Заказ не найден"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Idempotency-Key уже использован для другой оплаты"
         )
+    return {"message": "Заказ оплачен, работа начинается", "transaction_id": payment.id}
+
+
+@router.post("/{order_id}/pay", status_code=status.HTTP_200_OK)
+def pay_for_order(
+    order_id: int,
+    buyer_id: int,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: Session = Depends(get_db)
+):
+    """
+    Оплатить заказ
     
-    if order.buyer_id != buyer_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Только покупатель может оплатить заказ"
-        )
-    
-    if order.is_paid:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Заказ уже оплачен"
-        )
-    
-    # Проверяем баланс покупателя
-    buyer = db.query(User).filter(User.id == buyer_id).first()
-    if buyer.balance < order.price:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Недостаточно средств на балансе"
-        )
-    
-    # Списываем деньги со счёта покупателя
-    buyer.balance -= order.price
-    buyer.total_spent += order.price
-    
-    # Обновляем транзакцию эскроу
-    escrow_tx = db.query(Transaction).filter(
-        Transaction.order_id == order_id,
-        Transaction.type == TransactionType.ORDER_ESCROW
-    ).first()
-    
-    if escrow_tx:
-        escrow_tx.status = TransactionStatus.COMPLETED
-        escrow_tx.completed_at = datetime.utcnow()
-    
-    # Изменяем статус заказа
-    order.is_paid = True
-    order.payment_date = datetime.utcnow()
-    order.status = OrderStatus.IN_PROGRESS
-    order.updated_at = datetime.utcnow()
-    
-    db.commit()
-    
-    return {"message": "Заказ оплачен, работа начинается"}
+    Заголовок Idempotency-Key (опционально): повторный запрос с тем же ключом
+    не спишет деньги ещё раз, а вернёт результат первой оплаты.
+    """
+    if idempotency_key:
+        payment = find_payment(db, idempotency_key)
+        if payment:
+            return _payment_response(payment, order_id, buyer_id)
+    
+    def pay() -> Transaction:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Заказ не найден"
+            )
+        
+        if order.buyer_id != buyer_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Только покупатель может оплатить заказ"
+            )
+        
+        if order.is_paid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Заказ уже оплачен"
+            )
+        
+        # Списание и смена статуса - условными UPDATE, см. app/db/ledger.py
+        payment = pay_order(db, order, idempotency_key)
+        record_transitions(db, [order.id], OrderStatus.WAITING_PAYMENT, OrderStatus.IN_PROGRESS, OrderActor.SYSTEM)
+        return payment
+    
+    try:
+        payment = run_with_retry(db, pay)
+    except LedgerError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел провести оплату первым
+        db.rollback()
+        payment = find_payment(db, idempotency_key) if idempotency_key else None
+        if payment is None:
+            raise
+    
+    return _payment_response(payment, order_id, buyer_id)
 
 
 @router.post("/{order_id}/cancel", status_code=status.HTTP_200_OK)
-async def cancel_order(order_id: int, user_id: int, db: Session = Depends(get_db)):
+def cancel_order(order_id: int, user_id: int, db: Session = Depends(get_db)):
     """Отменить заказ (только если не оплачен)"""
     order = db.query(Order).filter(Order.id == order_id).first()
     if not order:
@@ -315,15 +345,16 @@ async def cancel_order(order_id: int, user_id: int, db: Session = Depends(get_db
             detail="Вы не участник этого заказа"
         )
     
-    if order.is_paid:
+    # Статус проверяется в самом UPDATE, чтобы не отменить заказ, оплаченный параллельно
+    actor = OrderActor.BUYER if user_id == order.buyer_id else OrderActor.SELLER
+    try:
+        cancelled = run_with_retry(db, lambda: transition_order(db, order, OrderStatus.CANCELLED, actor))
+    except TransitionNotAllowed:
+        cancelled = False
+    if not cancelled and order.status != OrderStatus.CANCELLED:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Оплаченный заказ нельзя отменить"
         )
     
-    order.status = OrderStatus.CANCELLED
-    order.updated_at = datetime.utcnow()
-    
-    db.commit()
-    
     return {"message": "Заказ отменён"}
@@ -0,0 +1,76 @@
+"""
+Курсорная (keyset) пагинация списков
+
+Списки сортируются по (created_at, id) от новых к старым. Курсор - это
+закодированная пара (created_at, id) последней записи страницы; следующая
+страница берётся условием WHERE (created_at, id) < курсор, поэтому её
+стоимость не зависит от глубины, а новые записи не сдвигают выдачу.
+
+Курсор следующей страницы возвращается в заголовке X-Next-Cursor
+(тело ответа остаётся списком, старые skip/limit продолжают работать).
+Вместо created_at можно сортировать по другой колонке даты (sort_column).
+"""
+import base64
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Непрозрачный курсор из (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Разобрать курсор, 400 если он повреждён"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор"
+        )
+
+
+def paginate(
+    query: Query,
+    model,
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort_column=None,
+) -> list:
+    """
+    Страница записей от новых к старым
+
+    - cursor передан: keyset-условие по (created_at, id), skip игнорируется
+    - cursor не передан: старое поведение через offset(skip)
+    - sort_column: колонка даты вместо model.created_at
+
+    Если страница заполнена целиком, в ответ добавляется X-Next-Cursor.
+    """
+    if sort_column is None:
+        sort_column = model.created_at
+    query = query.order_by(sort_column.desc(), model.id.desc())
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(sort_column, model.id) < tuple_(created_at, row_id))
+    elif skip:
+        query = query.offset(skip)
+
+    items = query.limit(limit).all()
+
+    if items and len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, sort_column.key), last.id)
+
+    return items
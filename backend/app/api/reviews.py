@@ -1,10 +1,15 @@
 """
 API маршруты для управления отзывами
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, Query, joinedload
 from app.db.session import get_db
+from app.api.pagination import paginate
+from app.db.ratings import apply_review_rating
+from app.db.outbox import enqueue_events
+from app.core.cache import cache, service_key, user_public_key, TOP_RATED_KEY
 from app.models import Review, Order, User, OrderStatus
 from app.schemas import ReviewCreate, ReviewResponse, ReviewDetailResponse
 from datetime import datetime
@@ -12,8 +17,44 @@ from datetime import datetime
 router = APIRouter(prefix="/api/v1/orders", tags=["Reviews"])
 
 
+def _review_cards_query(db: Session) -> Query:
+    """
+    Запрос отзывов вместе с автором и получателем
+    
+    Оба пользователя подгружаются JOIN'ом в том же SELECT, поэтому
+    страница отзывов стоит один запрос независимо от её размера.
+    """
+    return db.query(Review).options(
+        joinedload(Review.reviewer),
+        joinedload(Review.reviewed_user),
+    )
+
+
+def _review_card(review: Review) -> dict:
+    """Отзыв с краткой информацией об авторе и получателе"""
+    return {
+        "id": review.id,
+        "order_id": review.order_id,
+        "reviewer_id": review.reviewer_id,
+        "reviewed_user_id": review.reviewed_user_id,
+        "rating": review.rating,
+        "text": review.text,
+        "created_at": review.created_at,
+        "reviewer": {
+            "id": review.reviewer.id,
+            "first_name": review.reviewer.first_name,
+            "avatar_url": review.reviewer.avatar_url,
+        },
+        "reviewed_user": {
+            "id": review.reviewed_user.id,
+            "first_name": review.reviewed_user.first_name,
+            "avatar_url": review.reviewed_user.avatar_url,
+        }
+    }
+
+
 @router.post("/{order_id}/review/", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
-async def create_review(
+def create_review(
     order_id: int,
     review_data: ReviewCreate,
     reviewer_id: int,
@@ -71,66 +112,41 @@ async def create_review(
     db.add(new_review)
     db.flush()
     
-    # Обновляем рейтинг продавца
-    seller = order.seller
-    
-    # Получаем все отзывы продавца
-    all_reviews = db.query(Review).filter(Review.reviewed_user_id == seller.id).all()
-    
-    # Считаем среднюю оценку
-    if all_reviews:
-        total_rating = sum(r.rating for r in all_reviews)
-        avg_rating = total_rating / len(all_reviews)
-        seller.rating = round(avg_rating, 2)
-        seller.total_reviews = len(all_reviews)
-    
-    seller.updated_at = datetime.utcnow()
+    # Обновляем рейтинг продавца и услуги (накопительно, одним UPDATE)
+    apply_review_rating(db, order.seller_id, order.service_id, new_review.rating)
+    enqueue_events(db, "review.created", [order_id], {"review_id": new_review.id, "rating": new_review.rating})
     
     db.commit()
     db.refresh(new_review)
+    cache.invalidate(
+        service_key(order.service_id),
+        user_public_key(order.seller_id),
+        TOP_RATED_KEY,
+    )
     
     return new_review
 
 
 @router.get("/{order_id}/review/", response_model=ReviewDetailResponse)
-async def get_review(order_id: int, db: Session = Depends(get_db)):
+def get_review(order_id: int, db: Session = Depends(get_db)):
     """Получить отзыв на заказ"""
-    review = db.query(Review).filter(Review.order_id == order_id).first()
+    review = _review_cards_query(db).filter(Review.order_id == order_id).first()
     if not review:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Отзыв не найден"
         )
     
-    # Добавляем информацию об авторе и объекте отзыва
-    review_dict = {
-        "id": review.id,
-        "order_id": review.order_id,
-        "reviewer_id": review.reviewer_id,
-        "reviewed_user_id": review.reviewed_user_id,
-        "rating": review.rating,
-        "text": review.text,
-        "created_at": review.created_at,
-        "reviewer": {
-            "id": review.reviewer.id,
-            "first_name": review.reviewer.first_name,
-            "avatar_url": review.reviewer.avatar_url,
-        },
-        "reviewed_user": {
-            "id": review.reviewed_user.id,
-            "first_name": review.reviewed_user.first_name,
-            "avatar_url": review.reviewed_user.avatar_url,
-        }
-    }
-    
-    return review_dict
+    return _review_card(review)
 
 
 @router.get("/user/{user_id}/reviews/", response_model=list[ReviewDetailResponse])
-async def get_user_reviews(
+def get_user_reviews(
     user_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Получить все отзывы пользователя"""
@@ -144,45 +160,27 @@ async def get_user_reviews(
     
     limit = min(limit, 100)
     
-    reviews = db.query(Review).filter(
-        Review.reviewed_user_id == user_id
-    ).order_by(Review.created_at.desc()).offset(skip).limit(limit).all()
-    
-    # Добавляем информацию об авторах
-    result = []
-    for review in reviews:
-        review_dict = {
-            "id": review.id,
-            "order_id": review.order_id,
-            "reviewer_id": review.reviewer_id,
-            "reviewed_user_id": review.reviewed_user_id,
-            "rating": review.rating,
-            "text": review.text,
-            "created_at": review.created_at,
-            "reviewer": {
-                "id": review.reviewer.id,
-                "first_name": review.reviewer.first_name,
-                "avatar_url": review.reviewer.avatar_url,
-            },
-            "reviewed_user": {
-                "id": review.reviewed_user.id,
-                "first_name": review.reviewed_user.first_name,
-                "avatar_url": review.reviewed_user.avatar_url,
-            }
-        }
-        result.append(review_dict)
+    query = _review_cards_query(db).filter(Review.reviewed_user_id == user_id)
+    reviews = paginate(query, Review, response, skip, limit, cursor)
     
-    return result
+    return [_review_card(review) for review in reviews]
 
 
 @router.get("/top-rated/", response_model=list[dict])
-async def get_top_rated_sellers(
+def get_top_rated_sellers(
     limit: int = 10,
     db: Session = Depends(get_db)
 ):
     """Получить список топ-рейтинговых продавцов"""
     limit = min(limit, 50)
     
+    # В кэше лежит максимальный топ (50), любой limit - его срез
+    result = cache.get_or_load(TOP_RATED_KEY, lambda: _load_top_rated_sellers(db, 50))
+    
+    return result[:limit]
+
+
+def _load_top_rated_sellers(db: Session, limit: int) -> list[dict]:
     sellers = db.query(User).filter(
         User.is_active == True,
         User.is_banned == False,
@@ -204,7 +202,7 @@ async def get_top_rated_sellers(
 
 
 @router.get("/by-rating/", response_model=list[dict])
-async def get_reviews_by_rating(
+def get_reviews_by_rating(
     rating: int,
     db: Session = Depends(get_db)
 ):
@@ -215,7 +213,7 @@ async def get_reviews_by_rating(
             detail="Оценка должна быть от 1 до 5"
         )
     
-    reviews = db.query(Review).filter(
+    reviews = _review_cards_query(db).filter(
         Review.rating == rating
     ).order_by(Review.created_at.desc()).limit(50).all()
     
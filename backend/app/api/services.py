@@ -2,18 +2,23 @@
 API маршруты для управления услугами
 """
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from app.db.session import get_db
+from app.api.pagination import paginate
+from app.core.cache import cache, service_key, user_public_key, MISS
+from app.db.search import search_services_query, index_service, unindex_service
+from app.db.facets import normalize_category, service_facets, apply_facet_changes, get_facets, split_tags
+from app.db.tags import MAX_TAG_FILTER, set_service_tags, services_with_tags_query
 from app.models import Service, User, ServiceStatus
-from app.schemas import ServiceCreate, ServiceUpdate, ServiceResponse, ServiceDetailResponse
+from app.schemas import ServiceCreate, ServiceUpdate, ServiceResponse, ServiceDetailResponse, UserPublicResponse
 from datetime import datetime
 
 router = APIRouter(prefix="/api/v1/services", tags=["Services"])
 
 
 @router.post("/", response_model=ServiceResponse, status_code=status.HTTP_201_CREATED)
-async def create_service(service_data: ServiceCreate, seller_id: int, db: Session = Depends(get_db)):
+def create_service(service_data: ServiceCreate, seller_id: int, db: Session = Depends(get_db)):
     """
     Создать новую услугу
     
@@ -43,7 +48,7 @@ async def create_service(service_data: ServiceCreate, seller_id: int, db: Sessio
         seller_id=seller_id,
         title=service_data.title,
         description=service_data.description,
-        category=service_data.category,
+        category=normalize_category(service_data.category),
         tags=service_data.tags,
         price=service_data.price,
         execution_days=service_data.execution_days,
@@ -54,15 +59,85 @@ async def create_service(service_data: ServiceCreate, seller_id: int, db: Sessio
     )
     
     db.add(new_service)
+    db.flush()  # Чтобы получить ID услуги для поискового индекса
+    index_service(db, new_service)
+    set_service_tags(db, new_service.id, new_service.tags)
+    apply_facet_changes(db, set(), service_facets(new_service))
     db.commit()
     db.refresh(new_service)
     
     return new_service
 
 
+@router.get("/facets/", response_model=dict)
+def get_service_facets(tags_limit: int = 50, db: Session = Depends(get_db)):
+    """
+    Количество активных услуг по категориям и тегам
+    
+    Счётчики хранятся готовыми и обновляются при изменении услуг.
+    
+    Параметры:
+    - tags_limit: сколько самых популярных тегов вернуть (макс 200)
+    """
+    return get_facets(db, tags_limit=min(tags_limit, 200))
+
+
+@router.get("/by-tags/", response_model=list[ServiceResponse])
+def get_services_by_tags(
+    tags: str,
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Услуги, у которых есть все перечисленные теги (от новых к старым)
+    
+    Параметры:
+    - tags: теги через запятую, например "python,telegram" (макс 10)
+    - skip: пропустить записей
+    - limit: максимум записей (макс 100)
+    - cursor: курсор следующей страницы из заголовка X-Next-Cursor (вместо skip)
+    """
+    tag_names = split_tags(tags)
+    if not tag_names or len(tag_names) > MAX_TAG_FILTER:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Укажите от 1 до {MAX_TAG_FILTER} тегов"
+        )
+    
+    limit = min(limit, 100)
+    query = services_with_tags_query(db, tag_names)
+    return paginate(query, Service, response, skip, limit, cursor)
+
+
 @router.get("/{service_id}", response_model=ServiceDetailResponse)
-async def get_service(service_id: int, db: Session = Depends(get_db)):
+def get_service(service_id: int, db: Session = Depends(get_db)):
     """Получить полную информацию об услуге"""
+    # В кэше лежат только активные услуги, без данных продавца
+    service_dict = cache.get(service_key(service_id))
+    if service_dict is MISS:
+        service_dict = _load_service(db, service_id)
+    
+    # Продавец - из его публичного профиля, который сбрасывается при его изменениях
+    seller = cache.get_or_load(
+        user_public_key(service_dict["seller_id"]),
+        lambda: UserPublicResponse.model_validate(db.get(User, service_dict["seller_id"])),
+    )
+    return {
+        **service_dict,
+        "seller": {
+            "id": seller["id"],
+            "first_name": seller["first_name"],
+            "avatar_url": seller["avatar_url"],
+            "rating": seller["rating"],
+            "completed_orders": seller["completed_orders"],
+        }
+    }
+
+
+def _load_service(db: Session, service_id: int) -> dict:
     service = db.query(Service).filter(Service.id == service_id).first()
     if not service:
         raise HTTPException(
@@ -77,58 +152,56 @@ async def get_service(service_id: int, db: Session = Depends(get_db)):
             detail="Услуга недоступна"
         )
     
-    # Добавляем информацию о продавце
-    seller = service.seller
-    service_dict = {
-        **{col.name: getattr(service, col.name) for col in service.__table__.columns},
-        "seller": {
-            "id": seller.id,
-            "first_name": seller.first_name,
-            "avatar_url": seller.avatar_url,
-            "rating": seller.rating,
-            "completed_orders": seller.completed_orders,
-        }
-    }
-    
-    return service_dict
+    service_dict = {col.name: getattr(service, col.name) for col in service.__table__.columns}
+    return cache.set(service_key(service_id), service_dict)
 
 
 @router.get("/", response_model=list[ServiceResponse])
-async def list_services(
+def list_services(
+    response: Response,
     category: Optional[str] = None,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
-    Получить список услуг с фильтрацией
+    Получить список услуг с фильтрацией (от новых к старым)
     
     Параметры:
     - category: фильтр по категории (опционально)
     - skip: пропустить записей
     - limit: максимум записей (макс 100)
+    - cursor: курсор следующей страницы из заголовка X-Next-Cursor (вместо skip)
     """
     limit = min(limit, 100)
     
     query = db.query(Service).filter(Service.status == ServiceStatus.ACTIVE)
     
     if category:
-        query = query.filter(Service.category.ilike(f"%{category}%"))
+        # Точное совпадение нормализованной категории - работает по индексу (status, category)
+        query = query.filter(Service.category == normalize_category(category))
     
-    services = query.offset(skip).limit(limit).all()
+    services = paginate(query, Service, response, skip, limit, cursor)
     return services
 
 
 @router.get("/search/", response_model=list[ServiceResponse])
-async def search_services(
+def search_services(
     q: str,
+    skip: int = 0,
+    limit: int = 50,
     db: Session = Depends(get_db)
 ):
     """
     Поиск услуг по названию, описанию и тегам
     
+    Результаты отсортированы по релевантности (FTS5 на SQLite, tsvector на PostgreSQL).
+    
     Параметры:
     - q: поисковый запрос (минимум 2 символа)
+    - skip: пропустить записей
+    - limit: максимум записей (макс 100)
     """
     if len(q) < 2:
         raise HTTPException(
@@ -136,18 +209,15 @@ async def search_services(
             detail="Поисковый запрос должен быть минимум 2 символа"
         )
     
-    services = db.query(Service).filter(
-        Service.status == ServiceStatus.ACTIVE,
-        (Service.title.ilike(f"%{q}%") | 
-         Service.description.ilike(f"%{q}%") |
-         Service.tags.ilike(f"%{q}%"))
-    ).limit(50).all()
+    limit = min(limit, 100)
+    
+    services = search_services_query(db, q).offset(skip).limit(limit).all()
     
     return services
 
 
 @router.put("/{service_id}", response_model=ServiceResponse)
-async def update_service(
+def update_service(
     service_id: int,
     service_data: ServiceUpdate,
     seller_id: int,
@@ -168,15 +238,18 @@ async def update_service(
             detail="Вы можете редактировать только свои услуги"
         )
     
+    facets_before = service_facets(service)
+    
     # Обновляем поля
     if service_data.title is not None:
         service.title = service_data.title
     if service_data.description is not None:
         service.description = service_data.description
     if service_data.category is not None:
-        service.category = service_data.category
+        service.category = normalize_category(service_data.category)
     if service_data.tags is not None:
         service.tags = service_data.tags
+        set_service_tags(db, service.id, service.tags)
     if service_data.price is not None:
         service.price = service_data.price
     if service_data.execution_days is not None:
@@ -189,14 +262,17 @@ async def update_service(
         service.status = service_data.status
     
     service.updated_at = datetime.utcnow()
+    index_service(db, service)
+    apply_facet_changes(db, facets_before, service_facets(service))
     db.commit()
     db.refresh(service)
+    cache.invalidate(service_key(service_id))
     
     return service
 
 
 @router.delete("/{service_id}", status_code=status.HTTP_200_OK)
-async def delete_service(
+def delete_service(
     service_id: int,
     seller_id: int,
     db: Session = Depends(get_db)
@@ -215,23 +291,30 @@ async def delete_service(
             detail="Вы можете удалять только свои услуги"
         )
     
+    unindex_service(db, service.id)
+    set_service_tags(db, service.id, None)
+    apply_facet_changes(db, service_facets(service), set())
     db.delete(service)
     db.commit()
+    cache.invalidate(service_key(service_id))
     
     return {"message": "Услуга удалена"}
 
 
 @router.get("/seller/{seller_id}/", response_model=list[ServiceResponse])
-async def get_seller_services(
+def get_seller_services(
     seller_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Получить все услуги продавца"""
-    services = db.query(Service).filter(
+    query = db.query(Service).filter(
         Service.seller_id == seller_id,
         Service.status == ServiceStatus.ACTIVE
-    ).offset(skip).limit(limit).all()
+    )
+    services = paginate(query, Service, response, skip, limit, cursor)
     
     return services
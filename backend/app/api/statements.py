@@ -0,0 +1,69 @@
+"""
+API маршруты для выписки по счёту и баланса на дату
+"""
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session
+from app.db.session import get_db
+from app.api.pagination import paginate
+from app.db.balances import posted_transactions, statement_entries, balance_at
+from app.models import Transaction, User
+from app.schemas import StatementEntry, BalanceResponse
+
+router = APIRouter(prefix="/api/v1/users", tags=["Statements"])
+
+
+def _ensure_user(db: Session, user_id: int) -> None:
+    if db.query(User.id).filter(User.id == user_id).first() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пользователь не найден"
+        )
+
+
+@router.get("/{user_id}/statement", response_model=list[StatementEntry])
+def get_statement(
+    user_id: int,
+    response: Response,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Выписка по счёту: проведённые транзакции от новых к старым
+    
+    У каждой строки - сумма со знаком и баланс после неё. Баланс считается
+    от ближайшего снимка, а не суммированием всего журнала.
+    
+    Параметры:
+    - date_from, date_to: период по дате проведения (опционально)
+    - limit: максимум записей (макс 100)
+    - cursor: курсор следующей страницы из заголовка X-Next-Cursor
+    """
+    _ensure_user(db, user_id)
+    limit = min(limit, 100)
+    
+    query = db.query(Transaction).filter(posted_transactions(user_id))
+    if date_from:
+        query = query.filter(Transaction.completed_at >= date_from)
+    if date_to:
+        query = query.filter(Transaction.completed_at <= date_to)
+    
+    transactions = paginate(query, Transaction, response, 0, limit, cursor, sort_column=Transaction.completed_at)
+    return statement_entries(db, user_id, transactions)
+
+
+@router.get("/{user_id}/balance", response_model=BalanceResponse)
+def get_balance(user_id: int, as_of: Optional[datetime] = None, db: Session = Depends(get_db)):
+    """
+    Баланс пользователя по журналу транзакций на дату as_of
+    
+    Без as_of - на текущий момент.
+    """
+    _ensure_user(db, user_id)
+    as_of = as_of or datetime.utcnow()
+    
+    return {"user_id": user_id, "as_of": as_of, "balance": balance_at(db, user_id, as_of)}
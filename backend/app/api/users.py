@@ -1,18 +1,33 @@
 """
 API маршруты для управления пользователями
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from app.db.session import get_db
+from app.api.pagination import paginate
+from app.core.cache import cache, user_public_key, TOP_RATED_KEY, MISS
+from app.core.activity import activity_tracker
+from app.core.security import owner_guard
+from app.db.facets import split_tags
+from app.db.tags import MAX_TAG_FILTER, set_user_skills, users_with_skills_query
 from app.models import User
-from app.schemas import UserCreate, UserUpdate, UserResponse, UserPublicResponse
+from app.schemas import (
+    UserCreate,
+    UserUpdate,
+    UserResponse,
+    UserPublicResponse,
+    TelegramUserPublicResponse,
+    UserBatchRequest,
+    TelegramUserBatchRequest,
+)
 from datetime import datetime
 
 router = APIRouter(prefix="/api/v1/users", tags=["Users"])
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     """
     Регистрация нового пользователя через Telegram
     
@@ -43,14 +58,46 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
+    db.flush()  # Чтобы получить ID пользователя для связей навыков
+    set_user_skills(db, new_user.id, new_user.skills)
     db.commit()
     db.refresh(new_user)
     
     return new_user
 
 
+@router.get("/by-skills/", response_model=list[UserPublicResponse])
+def get_users_by_skills(
+    skills: str,
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Исполнители, у которых есть все перечисленные навыки
+    
+    Параметры:
+    - skills: навыки через запятую, например "python,django" (макс 10)
+    - skip: пропустить записей
+    - limit: максимум записей (макс 100)
+    - cursor: курсор следующей страницы из заголовка X-Next-Cursor (вместо skip)
+    """
+    skill_names = split_tags(skills)
+    if not skill_names or len(skill_names) > MAX_TAG_FILTER:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Укажите от 1 до {MAX_TAG_FILTER} навыков"
+        )
+    
+    limit = min(limit, 100)
+    query = users_with_skills_query(db, skill_names)
+    return paginate(query, User, response, skip, limit, cursor)
+
+
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_db)):
     """Получить полный профиль пользователя (только свой профиль)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -59,15 +106,14 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
             detail="Пользователь не найден"
         )
     
-    # Обновляем last_active
-    user.last_active = datetime.utcnow()
-    db.commit()
+    # last_active пишется в БД пачкой фоновой задачей, а не на каждое чтение
+    activity_tracker.touch(user.id)
     
     return user
 
 
 @router.get("/telegram/{telegram_id}", response_model=UserResponse)
-async def get_user_by_telegram_id(telegram_id: int, db: Session = Depends(get_db)):
+def get_user_by_telegram_id(telegram_id: int, db: Session = Depends(get_db)):
     """Получить профиль по Telegram ID"""
     user = db.query(User).filter(User.telegram_id == telegram_id).first()
     if not user:
@@ -76,15 +122,49 @@ async def get_user_by_telegram_id(telegram_id: int, db: Session = Depends(get_db
             detail="Пользователь не найден"
         )
     
-    user.last_active = datetime.utcnow()
-    db.commit()
+    activity_tracker.touch(user.id)
     
     return user
 
 
+@router.post("/batch", response_model=list[UserPublicResponse])
+def get_users_batch(batch: UserBatchRequest, db: Session = Depends(get_db)):
+    """
+    Получить публичные профили нескольких пользователей одним запросом
+    
+    Повторяющиеся ID учитываются один раз, порядок ответа совпадает с порядком
+    запроса, несуществующие ID пропускаются.
+    """
+    ids = list(dict.fromkeys(batch.ids))
+    users = db.query(User).filter(User.id.in_(ids)).all()
+    
+    by_id = {user.id: user for user in users}
+    return [by_id[user_id] for user_id in ids if user_id in by_id]
+
+
+@router.post("/telegram/batch", response_model=list[TelegramUserPublicResponse])
+def get_users_by_telegram_ids(batch: TelegramUserBatchRequest, db: Session = Depends(get_db)):
+    """
+    Получить публичные профили по списку Telegram ID (для бота)
+    
+    Повторяющиеся ID учитываются один раз, порядок ответа совпадает с порядком
+    запроса, незарегистрированные Telegram ID пропускаются. Баланс и заработок
+    не отдаются: запрос не привязан к сессии пользователя.
+    """
+    telegram_ids = list(dict.fromkeys(batch.telegram_ids))
+    users = db.query(User).filter(User.telegram_id.in_(telegram_ids)).all()
+    
+    by_telegram_id = {user.telegram_id: user for user in users}
+    return [by_telegram_id[tg_id] for tg_id in telegram_ids if tg_id in by_telegram_id]
+
+
 @router.get("/public/{user_id}", response_model=UserPublicResponse)
-async def get_user_public_profile(user_id: int, db: Session = Depends(get_db)):
+def get_user_public_profile(user_id: int, db: Session = Depends(get_db)):
     """Получить публичный профиль пользователя"""
+    cached = cache.get(user_public_key(user_id))
+    if cached is not MISS:
+        return cached
+    
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(
@@ -92,11 +172,11 @@ async def get_user_public_profile(user_id: int, db: Session = Depends(get_db)):
             detail="Пользователь не найден"
         )
     
-    return user
+    return cache.set(user_public_key(user_id), UserPublicResponse.model_validate(user))
 
 
-@router.put("/{user_id}", response_model=UserResponse)
-async def update_user(user_id: int, user_data: UserUpdate, db: Session = Depends(get_db)):
+@router.put("/{user_id}", response_model=UserResponse, dependencies=[Depends(owner_guard)])
+def update_user(user_id: int, user_data: UserUpdate, db: Session = Depends(get_db)):
     """Обновить свой профиль"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -114,29 +194,39 @@ async def update_user(user_id: int, user_data: UserUpdate, db: Session = Depends
         user.bio = user_data.bio
     if user_data.skills is not None:
         user.skills = user_data.skills
+        set_user_skills(db, user.id, user.skills)
     if user_data.avatar_url is not None:
         user.avatar_url = user_data.avatar_url
     
     user.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(user)
+    # Имя и аватар продавца есть и в топе (в карточке услуги - из публичного профиля)
+    cache.invalidate(user_public_key(user_id), TOP_RATED_KEY)
     
     return user
 
 
 @router.get("/", response_model=list[UserPublicResponse])
-async def list_users(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+def list_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """Получить список активных пользователей"""
-    users = db.query(User).filter(
+    query = db.query(User).filter(
         User.is_active == True,
         User.is_banned == False
-    ).offset(skip).limit(limit).all()
+    )
+    users = paginate(query, User, response, skip, limit, cursor)
     
     return users
 
 
 @router.get("/search/by-name", response_model=list[UserPublicResponse])
-async def search_users_by_name(q: str, db: Session = Depends(get_db)):
+def search_users_by_name(q: str, db: Session = Depends(get_db)):
     """Поиск пользователей по имени"""
     if len(q) < 2:
         raise HTTPException(
@@ -154,7 +244,7 @@ async def search_users_by_name(q: str, db: Session = Depends(get_db)):
 
 
 @router.post("/{user_id}/ban", status_code=status.HTTP_200_OK)
-async def ban_user(user_id: int, db: Session = Depends(get_db)):
+def ban_user(user_id: int, db: Session = Depends(get_db)):
     """Заблокировать пользователя (только админ)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -166,12 +256,13 @@ async def ban_user(user_id: int, db: Session = Depends(get_db)):
     user.is_banned = True
     user.updated_at = datetime.utcnow()
     db.commit()
+    cache.invalidate(user_public_key(user_id), TOP_RATED_KEY)
     
     return {"message": "Пользователь заблокирован"}
 
 
 @router.post("/{user_id}/unban", status_code=status.HTTP_200_OK)
-async def unban_user(user_id: int, db: Session = Depends(get_db)):
+def unban_user(user_id: int, db: Session = Depends(get_db)):
     """Разблокировать пользователя (только админ)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -183,5 +274,6 @@ async def unban_user(user_id: int, db: Session = Depends(get_db)):
     user.is_banned = False
     user.updated_at = datetime.utcnow()
     db.commit()
+    cache.invalidate(user_public_key(user_id), TOP_RATED_KEY)
     
     return {"message": "Пользователь разблокирован"}
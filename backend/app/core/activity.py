@@ -0,0 +1,106 @@
+"""
+Отложенная запись User.last_active
+
+Чтение профиля не должно быть пишущей транзакцией. Маршруты только отмечают
+пользователя в памяти (touch), повторные отметки одного пользователя
+схлопываются, а фоновая задача раз в last_active_flush_seconds записывает
+все накопленные значения одним массовым UPDATE.
+
+Буфер свой у каждого воркера; при остановке приложения он дописывается.
+"""
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, update
+from app.core.config import get_settings
+from app.db.session import SessionLocal
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки executemany при сбросе
+FLUSH_BATCH_SIZE = 500
+
+
+class ActivityTracker:
+    """Буфер отметок активности пользователей"""
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self, user_id: int) -> None:
+        """Отметить активность пользователя (без обращения к БД)"""
+        with self._lock:
+            self._pending[user_id] = datetime.utcnow()
+
+    def _take_pending(self) -> dict[int, datetime]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _restore_pending(self, pending: dict[int, datetime]) -> None:
+        # Не затираем более свежие отметки, пришедшие во время сбоя
+        with self._lock:
+            for user_id, last_active in pending.items():
+                current = self._pending.get(user_id)
+                if current is None or current < last_active:
+                    self._pending[user_id] = last_active
+
+    def flush(self) -> int:
+        """Записать накопленные отметки в БД, вернуть количество пользователей"""
+        pending = self._take_pending()
+        if not pending:
+            return 0
+
+        statement = (
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam("b_id"))
+            .values(last_active=bindparam("b_last_active"))
+        )
+        rows = [{"b_id": user_id, "b_last_active": ts} for user_id, ts in pending.items()]
+
+        db = SessionLocal()
+        try:
+            connection = db.connection()
+            for start in range(0, len(rows), FLUSH_BATCH_SIZE):
+                connection.execute(statement, rows[start:start + FLUSH_BATCH_SIZE])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._restore_pending(pending)
+            logger.error(f"Не удалось записать last_active: {e}")
+            return 0
+        finally:
+            db.close()
+
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await run_in_threadpool(self.flush)
+
+    def start(self) -> None:
+        """Запустить периодический сброс (из startup приложения)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить сброс и записать остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self.flush)
+
+
+activity_tracker = ActivityTracker(get_settings().last_active_flush_seconds)
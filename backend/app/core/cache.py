@@ -0,0 +1,196 @@
+"""
+Кэш для горячих публичных чтений (услуга, публичный профиль, топ продавцов)
+
+Два уровня:
+- локальный LRU с TTL в памяти процесса (короткий TTL, т.к. в других
+  воркерах инвалидация его не затронет)
+- Redis (опционально, cache_redis_enabled) - общий для всех воркеров
+
+Значения хранятся уже в JSON-совместимом виде (jsonable_encoder), чтобы
+оба уровня отдавали одинаковые данные. Инвалидация - явная, из маршрутов,
+которые меняют данные.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+from fastapi.encoders import jsonable_encoder
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Маркер промаха (None - допустимое значение в кэше)
+MISS = object()
+
+
+class LRUCache:
+    """Потокобезопасный LRU с TTL (маршруты выполняются в пуле потоков)"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISS
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache:
+    """Уровень кэша в Redis; ошибки Redis считаются промахом, а не ошибкой запроса"""
+
+    def __init__(self, url: str, ttl_seconds: int, prefix: str = "tgwork:cache:"):
+        import redis  # Опциональная зависимость
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        try:
+            raw = self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis cache get failed: {e}")
+            return MISS
+        if raw is None:
+            return MISS
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Redis cache set failed: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis cache delete failed: {e}")
+
+
+class EntityCache:
+    """Двухуровневый read-through кэш со счётчиками попаданий/промахов"""
+
+    def __init__(self, local: Optional[LRUCache], remote: Optional[RedisCache] = None):
+        self.local = local
+        self.remote = remote
+        self._lock = threading.Lock()
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, key: str) -> Any:
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not MISS:
+                self._count("local_hits")
+                return value
+        if self.remote is not None:
+            value = self.remote.get(key)
+            if value is not MISS:
+                self._count("redis_hits")
+                if self.local is not None:
+                    self.local.set(key, value)
+                return value
+        self._count("misses")
+        return MISS
+
+    def set(self, key: str, value: Any) -> Any:
+        """Положить значение (в JSON-совместимом виде) и вернуть его"""
+        value = jsonable_encoder(value)
+        if self.local is not None:
+            self.local.set(key, value)
+        if self.remote is not None:
+            self.remote.set(key, value)
+        return value
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Взять из кэша или загрузить и закэшировать"""
+        value = self.get(key)
+        if value is MISS:
+            value = self.set(key, loader())
+        return value
+
+    def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            if self.local is not None:
+                self.local.delete(key)
+            if self.remote is not None:
+                self.remote.delete(key)
+            self._count("invalidations")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        stats["local_entries"] = len(self.local) if self.local is not None else 0
+        stats["redis_enabled"] = self.remote is not None
+        return stats
+
+
+# Ключи кэша
+def service_key(service_id: int) -> str:
+    return f"service:{service_id}"
+
+
+def user_public_key(user_id: int) -> str:
+    return f"user_public:{user_id}"
+
+
+TOP_RATED_KEY = "top_rated"
+
+
+def _build_cache() -> EntityCache:
+    settings = get_settings()
+    if not settings.cache_enabled:
+        return EntityCache(local=None)
+
+    local = LRUCache(settings.cache_max_entries, settings.cache_local_ttl_seconds)
+    remote = None
+    if settings.cache_redis_enabled:
+        try:
+            remote = RedisCache(settings.redis_url, settings.cache_ttl_seconds)
+        except ImportError:
+            logger.warning("cache_redis_enabled=True, но пакет redis не установлен - только локальный кэш")
+    return EntityCache(local, remote)
+
+
+cache = _build_cache()
@@ -4,23 +4,95 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
+# SECRET_KEY из примера: с ним токены сессий не выдаются и не принимаются
+DEFAULT_SECRET_KEY = "your_secret_key_change_this_in_production"
+
 
 class Settings(BaseSettings):
     # Database
     # Для быстрого MVP используем SQLite
     database_url: str = "sqlite:///./tgwork.db"
     
+    # Пул соединений (для SQLite используется только busy timeout)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30  # Секунд ожидания свободного соединения
+    db_pool_recycle: int = 1800  # Пересоздавать соединения старше N секунд
+    db_pool_pre_ping: bool = True
+    sqlite_busy_timeout: int = 15  # Секунд ожидания блокировки записи
+    
     # Redis (опционально для MVP)
     redis_url: str = "redis://localhost:6379/0"
     
+    # Кэш горячих чтений (локальный LRU + опционально Redis)
+    cache_enabled: bool = True
+    cache_max_entries: int = 10000
+    cache_local_ttl_seconds: int = 30
+    cache_ttl_seconds: int = 300  # TTL в Redis
+    cache_redis_enabled: bool = False
+    
+    # Pub/sub событий чата: "memory" (один воркер) или "redis" (несколько воркеров)
+    chat_pubsub_backend: str = "memory"
+    
+    # Как часто записывать накопленные User.last_active (секунды)
+    last_active_flush_seconds: int = 30
+    
+    # Ограничение частоты запросов: "N/S" - N запросов за S секунд на пользователя (без токена - на IP)
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"  # "memory" (лимит на воркер) или "redis" (общий)
+    rate_limit_default: str = "120/60"  # Все маршруты API без своего правила ("" - без ограничения)
+    rate_limit_routes: dict[str, str] = {
+        "search_services": "30/60",
+        "send_message": "30/60",
+        "create_order": "10/60",
+    }
+    rate_limit_max_keys: int = 100000  # Вёдер в памяти воркера
+    rate_limit_trust_forwarded: bool = False  # Брать IP из X-Forwarded-For (за своим прокси)
+    
+    # Сколько раз повторять денежную операцию при конфликте блокировок
+    ledger_max_retries: int = 5
+    
+    # Фоновые задачи по срокам заказов и outbox. Без планировщика выплаты по
+    # завершённым заказам делает только notification_worker.py - он обязателен
+    scheduler_enabled: bool = True
+    order_jobs_interval_seconds: int = 60
+    order_jobs_batch_size: int = 200  # Заказов в одной транзакции
+    order_review_days: int = 3  # Дней на проверку, затем заказ завершается автоматически
+    order_overdue_dispute_hours: int = 72  # Через сколько часов просрочки открывается спор
+    job_lease_seconds: int = 300  # Аренда задачи воркером (на случай падения до release)
+    
+    # Очередь событий переходов заказа (выплаты, уведомления)
+    outbox_interval_seconds: int = 5
+    outbox_batch_size: int = 100
+    
     # JWT
-    secret_key: str = "your_secret_key_change_this_in_production"
+    secret_key: str = DEFAULT_SECRET_KEY  # Обязательно задать свой для входа через Telegram
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    # Вход через Telegram WebApp (app/core/security.py)
+    init_data_max_age_seconds: int = 86400  # Сколько принимается initData после auth_date
+    auth_required: bool = False  # Запросы от имени пользователя (buyer_id и т.п.) - только с токеном
+    auth_cache_max_entries: int = 10000  # Расшифрованных токенов в памяти воркера
+    
     # Telegram
     telegram_bot_token: str = ""
     telegram_webhook_url: str = ""
+    telegram_api_url: str = "https://api.telegram.org"  # Для проверок - адрес фейкового Bot API
+    
+    # Уведомления в Telegram (без telegram_bot_token не создаются)
+    notification_worker_in_app: bool = False  # Отправлять из процесса приложения, а не notification_worker.py
+    notification_batch_size: int = 100
+    notification_poll_seconds: float = 2.0  # Пауза, когда очередь пуста
+    notification_max_attempts: int = 8
+    notification_lease_seconds: int = 120  # Сколько пачка числится за воркером
+    telegram_global_rate: float = 25.0  # Сообщений в секунду на бота (лимит Telegram - 30)
+    telegram_chat_interval_seconds: float = 1.0  # Не чаще одного сообщения в чат
+    telegram_timeout_seconds: float = 10.0
+    
+    # Метрики запросов и SQL (/metrics)
+    metrics_enabled: bool = True
+    slow_query_ms: int = 0  # Писать в лог запросы к БД дольше N мс с параметрами (0 - выключено)
     
     # Server
     debug: bool = True
@@ -0,0 +1,217 @@
+"""
+Метрики запросов и SQL в формате Prometheus (/metrics)
+
+- MetricsMiddleware: время ответа по маршруту (шаблон пути, а не сам путь,
+  чтобы id не плодили серии), методу и статусу;
+- instrument_engine: события SQLAlchemy before/after_cursor_execute -
+  длительность каждого запроса к БД, а для запросов API ещё и количество
+  запросов и суммарное время БД на один HTTP-запрос (видно N+1);
+- медленные запросы (slow_query_ms) пишутся в лог с текстом и параметрами.
+
+Статистика текущего HTTP-запроса лежит в contextvar: маршруты выполняются в
+пуле потоков, но контекст туда копируется, а объект статистики - общий.
+Счётчики свои у каждого воркера (как и в prometheus_client без multiprocess).
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import get_settings
+
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Длина параметров запроса в логе медленных запросов
+SLOW_QUERY_PARAMS_LENGTH = 500
+
+# Маршрут запроса, не дошедшего ни до одного маршрута (404 и т.п.)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (le - включительно)"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@dataclass
+class RequestStats:
+    """SQL одного HTTP-запроса"""
+    method: str
+    path: str
+    statements: int = 0
+    db_seconds: float = 0.0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class Metrics:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: dict[tuple, Histogram] = {}
+        self.request_statements: dict[tuple, Histogram] = {}
+        self.request_db_seconds: dict[tuple, Histogram] = {}
+        self.statements: dict[tuple, Histogram] = {}
+        self.slow_statements: dict[tuple, int] = {}
+
+    @staticmethod
+    def _histogram(series: dict, key: tuple, buckets: tuple) -> Histogram:
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        return histogram
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        with self._lock:
+            self._histogram(self.requests, (method, route, status), LATENCY_BUCKETS).observe(seconds)
+            self._histogram(self.request_statements, (method, route), STATEMENT_COUNT_BUCKETS).observe(stats.statements)
+            self._histogram(self.request_db_seconds, (method, route), LATENCY_BUCKETS).observe(stats.db_seconds)
+
+    def observe_statement(self, source: str, seconds: float, slow: bool) -> None:
+        with self._lock:
+            self._histogram(self.statements, (source,), STATEMENT_BUCKETS).observe(seconds)
+            if slow:
+                self.slow_statements[(source,)] = self.slow_statements.get((source,), 0) + 1
+
+    @staticmethod
+    def _render_histograms(lines: list, name: str, help_text: str, label_names: tuple, series: dict) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(series.items(), key=lambda item: tuple(map(str, item[0]))):
+            labels = _labels(label_names, key)
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+    def render(self) -> str:
+        """Текст в формате Prometheus (text exposition 0.0.4)"""
+        lines: list[str] = []
+        with self._lock:
+            self._render_histograms(
+                lines, "http_request_duration_seconds", "Время ответа на HTTP-запрос",
+                ("method", "route", "status"), self.requests,
+            )
+            self._render_histograms(
+                lines, "http_request_db_statements", "Запросов к БД на один HTTP-запрос",
+                ("method", "route"), self.request_statements,
+            )
+            self._render_histograms(
+                lines, "http_request_db_duration_seconds", "Суммарное время запросов к БД на один HTTP-запрос",
+                ("method", "route"), self.request_db_seconds,
+            )
+            self._render_histograms(
+                lines, "db_statement_duration_seconds", "Время одного запроса к БД (request - из API, background - фоновые задачи)",
+                ("source",), self.statements,
+            )
+            lines.append("# HELP db_slow_statements_total Запросов к БД дольше slow_query_ms")
+            lines.append("# TYPE db_slow_statements_total counter")
+            for key, count in sorted(self.slow_statements.items()):
+                lines.append(f"db_slow_statements_total{{{_labels(('source',), key)}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Замерять все запросы engine к БД"""
+    slow_query_seconds = get_settings().slow_query_ms / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["metrics_started"].pop()
+        stats = _current_request.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += seconds
+
+        slow = 0 < slow_query_seconds <= seconds
+        metrics.observe_statement("request" if stats is not None else "background", seconds, slow)
+        if slow:
+            where = f"{stats.method} {stats.path}" if stats is not None else "фоновая задача"
+            slow_query_logger.warning(
+                f"Медленный запрос {seconds * 1000:.1f} мс ({where}): {statement}; "
+                f"параметры: {repr(parameters)[:SLOW_QUERY_PARAMS_LENGTH]}"
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        # Запрос упал - убираем его отметку времени
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("metrics_started"):
+            connection.info["metrics_started"].pop()
+
+
+class MetricsMiddleware:
+    """ASGI middleware: время ответа и SQL каждого HTTP-запроса"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[dict] = None
+
+    def _route(self, scope: dict) -> str:
+        # Шаблон пути по endpoint, который роутер кладёт в scope
+        if self._routes is None:
+            self._routes = {
+                getattr(route, "endpoint", None) or getattr(route, "app", None): route.path or "/"
+                for route in scope["app"].routes
+            }
+        return self._routes.get(scope.get("endpoint"), UNMATCHED_ROUTE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats(scope["method"], scope["path"])
+        token = _current_request.set(stats)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_request.reset(token)
+            metrics.observe_request(scope["method"], self._route(scope), status, time.perf_counter() - started, stats)
@@ -0,0 +1,207 @@
+"""
+Воркер уведомлений в Telegram
+
+Разбирает очередь telegram_notifications пачками: забирает пачку
+(claim_notifications), отправляет через Bot API sendMessage и записывает
+результаты одной транзакцией (record_results). Запросы к БД идут в пуле
+потоков, отправка - асинхронно, параллельно по разным чатам.
+
+Лимиты Telegram соблюдаются на стороне воркера:
+- не больше telegram_global_rate сообщений в секунду на бота;
+- не чаще одного сообщения в telegram_chat_interval_seconds в один чат;
+- ответ 429 откладывает чат на retry_after секунд.
+
+Ошибки сети и 5xx повторяются с экспоненциальной паузой, 400/403 (чат не
+найден, бот заблокирован) - окончательный отказ.
+
+Лимиты считаются в пределах процесса, поэтому воркер нужен один:
+отдельный процесс notification_worker.py или (NOTIFICATION_WORKER_IN_APP)
+задача внутри приложения с одним воркером uvicorn.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Optional
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import get_settings
+from app.db.notifications import claim_notifications, record_results, retry_delay
+from app.db.session import SessionLocal
+from app.models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Ответы Bot API, после которых повторять бессмысленно
+PERMANENT_ERRORS = {400, 403}
+
+# Сколько отметок последней отправки в чат хранить
+MAX_TRACKED_CHATS = 10000
+
+
+class RateLimiter:
+    """Не больше rate событий в секунду, равномерно"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class TelegramNotifier:
+    """Отправка очереди уведомлений с лимитами и повторами"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.settings = settings
+        self.url = f"{settings.telegram_api_url.rstrip('/')}/bot{settings.telegram_bot_token}/sendMessage"
+        self._global = RateLimiter(settings.telegram_global_rate)
+        self._chat_next: dict[int, float] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _claim(self) -> list[Notification]:
+        db = SessionLocal()
+        try:
+            notifications = claim_notifications(
+                db, self.settings.notification_batch_size, self.settings.notification_lease_seconds
+            )
+            db.expunge_all()
+            return notifications
+        finally:
+            db.close()
+
+    def _record(self, sent: list[int], retries: dict, failed: dict, deferred: dict) -> None:
+        db = SessionLocal()
+        try:
+            record_results(db, sent, retries, failed, deferred)
+        finally:
+            db.close()
+
+    async def _wait_chat(self, chat_id: int) -> None:
+        wait = self._chat_next.get(chat_id, 0.0) - asyncio.get_running_loop().time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _hold_chat(self, chat_id: int, seconds: float) -> None:
+        now = asyncio.get_running_loop().time()
+        if len(self._chat_next) > MAX_TRACKED_CHATS:
+            self._chat_next = {chat: at for chat, at in self._chat_next.items() if at > now}
+        self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), now + seconds)
+
+    async def _send(self, notification: Notification) -> tuple[str, Optional[int], str]:
+        """Отправить одно сообщение: ("sent" | "retry" | "failed", retry_after, ошибка)"""
+        try:
+            response = await self._client.post(self.url, json={
+                "chat_id": notification.chat_id,
+                "text": notification.text,
+            })
+        except httpx.HTTPError as e:
+            return "retry", None, f"Ошибка сети: {e!r}"
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.status_code == 200 and body.get("ok"):
+            return "sent", None, ""
+
+        error = f"{response.status_code}: {body.get('description') or response.text[:200]}"
+        if response.status_code == 429:
+            retry_after = int((body.get("parameters") or {}).get("retry_after", 1))
+            return "retry", retry_after, error
+        if response.status_code in PERMANENT_ERRORS:
+            return "failed", None, error
+        return "retry", None, error
+
+    async def run_once(self) -> int:
+        """Отправить одну пачку, вернуть количество забранных уведомлений"""
+        notifications = await run_in_threadpool(self._claim)
+        if not notifications:
+            return 0
+
+        sent: list[int] = []
+        retries: dict[int, tuple[int, str]] = {}
+        failed: dict[int, str] = {}
+        deferred: dict[int, int] = {}
+
+        by_chat: dict[int, list[Notification]] = defaultdict(list)
+        for notification in notifications:
+            by_chat[notification.chat_id].append(notification)
+
+        async def send_chat(chat_id: int, queue: list[Notification]) -> None:
+            for index, notification in enumerate(queue):
+                await self._wait_chat(chat_id)
+                await self._global.acquire()
+                outcome, retry_after, error = await self._send(notification)
+                self._hold_chat(chat_id, self.settings.telegram_chat_interval_seconds)
+
+                if outcome == "sent":
+                    sent.append(notification.id)
+                elif outcome == "failed":
+                    failed[notification.id] = error
+                else:
+                    retries[notification.id] = (retry_delay(notification.attempts + 1, retry_after), error)
+                    if retry_after is not None:
+                        # Чат упёрся в лимит: остальное в него - после паузы, без траты попыток
+                        self._hold_chat(chat_id, retry_after)
+                        for rest in queue[index + 1:]:
+                            deferred[rest.id] = retry_after
+                        break
+
+        await asyncio.gather(*(send_chat(chat_id, queue) for chat_id, queue in by_chat.items()))
+        await run_in_threadpool(self._record, sent, retries, failed, deferred)
+
+        if retries or failed:
+            logger.warning(f"Уведомления: отправлено {len(sent)}, повтор {len(retries)}, отказ {len(failed)}")
+        return len(notifications)
+
+    async def drain(self) -> None:
+        """Отправлять, пока в очереди есть готовые к отправке уведомления"""
+        while await self.run_once():
+            pass
+
+    async def __aenter__(self) -> "TelegramNotifier":
+        self._client = httpx.AsyncClient(timeout=self.settings.telegram_timeout_seconds)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._client.aclose()
+        self._client = None
+
+    async def run_forever(self) -> None:
+        """Разбирать очередь, пока задачу не отменят"""
+        async with self:
+            while True:
+                try:
+                    if await self.run_once():
+                        continue
+                except Exception as e:
+                    logger.error(f"Ошибка отправки уведомлений: {e}", exc_info=True)
+                await asyncio.sleep(self.settings.notification_poll_seconds)
+
+    def start(self) -> None:
+        """Запустить воркер внутри приложения (из startup)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        """Остановить воркер (из shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+notifier = TelegramNotifier()
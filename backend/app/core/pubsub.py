@@ -0,0 +1,114 @@
+"""
+Pub/sub для событий заказов (рассылка подписчикам WebSocket)
+
+Сообщения чата и переходы статуса идут в разные каналы заказа: подписчик
+чата получает только события сообщений.
+
+- memory: в пределах одного процесса (один воркер uvicorn)
+- redis: через Redis PUBLISH/SUBSCRIBE, для нескольких воркеров
+
+publish() синхронный и потокобезопасный: его вызывают маршруты,
+которые выполняются в пуле потоков. subscribe() - асинхронный
+контекстный менеджер для обработчика WebSocket, отдаёт asyncio.Queue
+с событиями канала.
+"""
+import asyncio
+import json
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def order_channel(order_id: int) -> str:
+    """Канал событий чата заказа"""
+    return f"order:{order_id}:messages"
+
+
+def order_events_channel(order_id: int) -> str:
+    """Канал переходов статуса заказа"""
+    return f"order:{order_id}:events"
+
+
+class InMemoryBroker:
+    """Брокер внутри процесса"""
+
+    def __init__(self):
+        self._subscribers: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            # Очередь принадлежит event loop'у подписчика, кладём через него
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                channel_subscribers = self._subscribers.get(channel)
+                if channel_subscribers is not None:
+                    channel_subscribers.discard(subscriber)
+                    if not channel_subscribers:
+                        del self._subscribers[channel]
+
+
+class RedisBroker:
+    """Брокер через Redis, события доходят до подписчиков всех воркеров"""
+
+    def __init__(self, url: str, prefix: str = "tgwork:"):
+        import redis  # Опциональная зависимость
+
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel: str, event: dict) -> None:
+        try:
+            self._client.publish(self.prefix + channel, json.dumps(event))
+        except Exception as e:
+            # Сообщение уже сохранено в БД, клиент получит его при переподключении
+            logger.warning(f"Redis publish failed: {e}")
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.prefix + channel)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def reader():
+            async for item in pubsub.listen():
+                if item.get("type") == "message":
+                    await queue.put(json.loads(item["data"]))
+
+        reader_task = asyncio.create_task(reader())
+        try:
+            yield queue
+        finally:
+            reader_task.cancel()
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+            await client.aclose()
+
+
+def _build_broker():
+    settings = get_settings()
+    if settings.chat_pubsub_backend == "redis":
+        return RedisBroker(settings.redis_url)
+    return InMemoryBroker()
+
+
+broker = _build_broker()
@@ -0,0 +1,273 @@
+"""
+Ограничение частоты запросов к API (token bucket)
+
+У каждого клиента своё ведро на правило: ёмкость - N запросов, пополняется
+со скоростью N запросов за S секунд ("N/S"). Клиент - пользователь сессии
+(по токену Authorization: Bearer), без токена - IP-адрес.
+
+Правила:
+- rate_limit_routes - для отдельных маршрутов по имени (search_services,
+  send_message, create_order, ...);
+- rate_limit_default - для всех остальных маршрутов API.
+Запрос расходует ведро только одного правила: своего маршрута, иначе общего.
+
+Хранилище вёдер:
+- memory: в памяти процесса (один воркер uvicorn или лимит на воркер)
+- redis: общее для всех воркеров, атомарно через Lua-скрипт; если Redis
+  недоступен, запрос пропускается (ограничение - не повод отказывать)
+
+При превышении - 429 с заголовком Retry-After. Счётчики - /health/ratelimit.
+"""
+import json
+import logging
+import math
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from app.core.config import get_settings
+from app.core.security import decode_session_token
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULE = "default"
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Ведро: capacity запросов, пополнение rate запросов в секунду"""
+    capacity: int
+    rate: float
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """Из строки "N/S": N запросов за S секунд"""
+        requests, _, seconds = value.partition("/")
+        capacity = int(requests)
+        return cls(capacity, capacity / float(seconds or 1))
+
+
+class MemoryBuckets:
+    """
+    Вёдра в памяти процесса
+
+    Вызывается только из event loop (из middleware), поэтому без блокировок.
+    Давно не использованные вёдра вытесняются: к этому времени они всё равно
+    успели бы наполниться.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        """Взять токен; 0 - можно, иначе - сколько секунд ждать"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = float(limit.capacity)
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            tokens, updated = bucket
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            self._buckets.move_to_end(key)
+
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / limit.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# KEYS[1] - ведро; ARGV - ёмкость и скорость. Время - часы Redis, общие для всех воркеров
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Вёдра в Redis, общие для всех воркеров"""
+
+    def __init__(self, url: str, prefix: str = "tgwork:ratelimit:"):
+        import redis.asyncio as aioredis  # Опциональная зависимость
+
+        self.client = aioredis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        wait = await self._take(keys=[self.prefix + key], args=[limit.capacity, limit.rate])
+        return float(wait)
+
+    def __len__(self) -> int:
+        return 0  # Считает Redis
+
+
+class RateLimiter:
+    """Правила, хранилище вёдер и счётчики"""
+
+    def __init__(self, default: Optional[RateLimit], routes: dict[str, RateLimit], buckets,
+                 api_prefix: str, trust_forwarded: bool):
+        self.default = default
+        self.routes = routes
+        self.buckets = buckets
+        self.api_prefix = api_prefix
+        self.trust_forwarded = trust_forwarded
+        self._route_rules: Optional[list] = None
+        self.allowed: dict[str, int] = defaultdict(int)
+        self.limited: dict[str, int] = defaultdict(int)
+        self.backend_errors = 0
+
+    def _rules(self, app) -> list:
+        # Маршруты с собственным правилом - один раз, при первом запросе.
+        # Сверяем регулярку пути и метод напрямую: route.matches() в разы дороже
+        if self._route_rules is None:
+            self._route_rules = [
+                (route.path_regex, route.methods, route.name, self.routes[route.name])
+                for route in app.routes
+                if isinstance(route, APIRoute) and route.name in self.routes
+            ]
+        return self._route_rules
+
+    def rule_for(self, scope: dict) -> Optional[tuple[str, RateLimit]]:
+        """Правило для запроса (None - не ограничивается)"""
+        path, method = scope["path"], scope["method"]
+        for path_regex, methods, name, limit in self._rules(scope["app"]):
+            if method in methods and path_regex.match(path):
+                return name, limit
+        if self.default is not None and scope["path"].startswith(self.api_prefix):
+            return DEFAULT_RULE, self.default
+        return None
+
+    def client_key(self, scope: dict) -> str:
+        """Пользователь сессии, без токена - IP"""
+        headers = dict(scope["headers"])
+        if b"authorization" in headers:
+            scheme, _, token = headers[b"authorization"].decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return f"user:{decode_session_token(token).user_id}"
+                except HTTPException:
+                    pass  # Неверный токен отклонит сам маршрут, а считаем по IP
+        if self.trust_forwarded and b"x-forwarded-for" in headers:
+            return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def check(self, scope: dict) -> float:
+        """0 - пропустить запрос, иначе - сколько секунд ждать"""
+        rule = self.rule_for(scope)
+        if rule is None:
+            return 0.0
+        name, limit = rule
+        try:
+            wait = await self.buckets.take(f"{name}:{self.client_key(scope)}", limit)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"Rate limit backend failed: {e}")
+            return 0.0
+        if wait > 0:
+            self.limited[name] += 1
+        else:
+            self.allowed[name] += 1
+        return wait
+
+    def get_stats(self) -> dict:
+        rules = {DEFAULT_RULE: self.default, **self.routes}
+        return {
+            "backend": type(self.buckets).__name__,
+            "keys": len(self.buckets),
+            "backend_errors": self.backend_errors,
+            "rules": {
+                name: {
+                    "capacity": limit.capacity,
+                    "per_second": round(limit.rate, 4),
+                    "allowed": self.allowed.get(name, 0),
+                    "limited": self.limited.get(name, 0),
+                }
+                for name, limit in rules.items()
+                if limit is not None
+            },
+        }
+
+
+class RateLimitMiddleware:
+    """ASGI middleware: 429 с Retry-After, если ведро клиента пусто"""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        wait = await self.limiter.check(scope)
+        if wait <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = max(1, math.ceil(wait))
+        body = json.dumps(
+            {"detail": f"Слишком много запросов, повторите через {retry_after} с"},
+            ensure_ascii=False,
+        ).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _build_rate_limiter() -> Optional[RateLimiter]:
+    settings = get_settings()
+    if not settings.rate_limit_enabled:
+        return None
+
+    buckets = None
+    if settings.rate_limit_backend == "redis":
+        try:
+            buckets = RedisBuckets(settings.redis_url)
+        except ImportError:
+            logger.warning("rate_limit_backend=redis, но пакет redis не установлен - вёдра в памяти")
+    if buckets is None:
+        buckets = MemoryBuckets(settings.rate_limit_max_keys)
+
+    return RateLimiter(
+        default=RateLimit.parse(settings.rate_limit_default) if settings.rate_limit_default else None,
+        routes={name: RateLimit.parse(value) for name, value in settings.rate_limit_routes.items()},
+        buckets=buckets,
+        api_prefix=settings.api_v1_prefix,
+        trust_forwarded=settings.rate_limit_trust_forwarded,
+    )
+
+
+rate_limiter = _build_rate_limiter()
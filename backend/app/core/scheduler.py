@@ -0,0 +1,222 @@
+"""
+Планировщик фоновых задач (APScheduler внутри процесса приложения)
+
+- order_jobs: раз в order_jobs_interval_seconds разбирает заказы с прошедшим
+  сроком (app.db.deadlines) пачками по order_jobs_batch_size, каждая пачка -
+  отдельная транзакция;
+- outbox: раз в outbox_interval_seconds обрабатывает события (выплата по
+  order.completed, уведомления в Telegram) и рассылает переходы статусов
+  подписчикам pub/sub;
+- balance_snapshots: раз в сутки в 00:30 UTC сохраняет снимки балансов.
+
+Планировщик запускается в каждом воркере uvicorn, но задачу в каждый
+момент выполняет только один: перед запуском воркер берёт аренду в
+таблице job_leases, остальные пропускают запуск. Если воркер упал, аренда
+истечёт через job_lease_seconds. Изменения заказов - условные UPDATE по
+статусу, события забираются условным UPDATE, так что даже при истёкшей
+аренде заказ и событие не обработаются дважды.
+"""
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Callable
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from fastapi.concurrency import run_in_threadpool
+from app.core.cache import cache, user_public_key, TOP_RATED_KEY
+from app.core.config import get_settings
+from app.core.pubsub import broker, order_events_channel
+from app.db.balances import compact_balance_snapshots
+from app.db.deadlines import auto_complete_reviewed_orders, escalate_overdue_orders, notify_overdue_orders
+from app.db.ledger import run_with_retry
+from app.db.leases import acquire_lease, release_lease
+from app.db.notifications import NOTIFICATION_HANDLERS
+from app.db.outbox import merge_handlers, process_events
+from app.db.session import SessionLocal
+from app.db.transitions import ORDER_EVENT_HANDLERS, event_type as order_event_type
+from app.models import Order, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+# Предел пачек за один запуск (остаток - в следующий запуск)
+MAX_BATCHES_PER_RUN = 50
+
+# Обработчики событий outbox: сначала выплата, потом уведомления
+EVENT_HANDLERS = merge_handlers(ORDER_EVENT_HANDLERS, NOTIFICATION_HANDLERS)
+
+# После выплаты у продавца другой completed_orders
+RELEASE_EVENT = order_event_type(OrderStatus.COMPLETED)
+
+
+def _invalidate_sellers(db, order_ids: list[int]) -> None:
+    """Сбросить в кэше профили продавцов выплаченных заказов и топ продавцов"""
+    if not order_ids:
+        return
+    seller_ids = {seller_id for (seller_id,) in db.query(Order.seller_id).filter(Order.id.in_(order_ids))}
+    cache.invalidate(*(user_public_key(seller_id) for seller_id in seller_ids), TOP_RATED_KEY)
+
+
+class BackgroundScheduler:
+    """Фоновые задачи: сроки заказов, события переходов, снимки балансов"""
+
+    def __init__(self):
+        self.scheduler = AsyncIOScheduler(timezone="UTC")
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _with_lease(self, name: str, job: Callable[[], dict]) -> dict:
+        """Выполнить job(), если аренда задачи досталась этому воркеру"""
+        settings = get_settings()
+        db = SessionLocal()
+        try:
+            if not acquire_lease(db, name, self.owner, settings.job_lease_seconds):
+                return {}
+            try:
+                return job()
+            finally:
+                release_lease(db, name, self.owner)
+        finally:
+            db.close()
+
+    def _run_batches(self, job: Callable) -> int:
+        """Повторять пачки job(db), пока есть заказы; вернуть количество обработанных"""
+        batch_size = get_settings().order_jobs_batch_size
+        total = 0
+        for _ in range(MAX_BATCHES_PER_RUN):
+            db = SessionLocal()
+            try:
+                order_ids = run_with_retry(db, lambda: job(db, datetime.utcnow(), batch_size))
+            finally:
+                db.close()
+            total += len(order_ids)
+            if len(order_ids) < batch_size:
+                break
+        return total
+
+    def run_order_jobs(self) -> dict:
+        """Один проход по заказам с прошедшим сроком"""
+        grace = timedelta(hours=get_settings().order_overdue_dispute_hours)
+
+        def process() -> dict:
+            return {
+                # Сначала спор, потом уведомление: давно просроченным оно уже не нужно
+                "disputed": self._run_batches(
+                    lambda db, now, size: escalate_overdue_orders(db, now, grace, size)
+                ),
+                "overdue": self._run_batches(notify_overdue_orders),
+                "completed": self._run_batches(auto_complete_reviewed_orders),
+            }
+
+        result = self._with_lease("order_jobs", process)
+        if any(result.values()):
+            logger.info(f"Заказы по срокам: {result}")
+        return result
+
+    def run_outbox(self) -> dict:
+        """Обработать накопившиеся события переходов"""
+        batch_size = get_settings().outbox_batch_size
+
+        def process() -> dict:
+            total = 0
+            for _ in range(MAX_BATCHES_PER_RUN):
+                db = SessionLocal()
+                try:
+                    events = process_events(db, EVENT_HANDLERS, batch_size)
+                    _invalidate_sellers(db, [order_id for event_type, order_id in events if event_type == RELEASE_EVENT])
+                finally:
+                    db.close()
+
+                # Подписчикам - только после commit обработчика и в канал переходов,
+                # не чата; события чата API рассылает сам, вместе с текстом сообщения
+                for event_type, order_id in events:
+                    if order_id is not None and event_type.startswith("order."):
+                        broker.publish(order_events_channel(order_id), {"type": event_type, "order_id": order_id})
+                total += len(events)
+                if len(events) < batch_size:
+                    break
+            return {"events": total}
+
+        return self._with_lease("outbox", process)
+
+    def run_balance_snapshots(self) -> dict:
+        """Снимки балансов на полночь текущих суток (UTC)"""
+        as_of = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        def process() -> dict:
+            db = SessionLocal()
+            try:
+                return {"snapshots": run_with_retry(db, lambda: compact_balance_snapshots(db, as_of))}
+            finally:
+                db.close()
+
+        result = self._with_lease("balance_snapshots", process)
+        if result:
+            logger.info(f"Снимки балансов на {as_of.isoformat()}: {result['snapshots']}")
+        return result
+
+    async def _order_jobs(self) -> None:
+        try:
+            await run_in_threadpool(self.run_order_jobs)
+        except Exception as e:
+            logger.error(f"Ошибка обработки сроков заказов: {e}", exc_info=True)
+
+    async def _outbox(self) -> None:
+        try:
+            await run_in_threadpool(self.run_outbox)
+        except Exception as e:
+            logger.error(f"Ошибка обработки событий: {e}", exc_info=True)
+
+    async def _balance_snapshots(self) -> None:
+        try:
+            await run_in_threadpool(self.run_balance_snapshots)
+        except Exception as e:
+            logger.error(f"Ошибка снимков балансов: {e}", exc_info=True)
+
+    def start(self) -> None:
+        """Запустить планировщик (из startup приложения)"""
+        if self.scheduler.running:
+            return
+        settings = get_settings()
+        self.scheduler.add_job(
+            self._order_jobs,
+            "interval",
+            seconds=settings.order_jobs_interval_seconds,
+            id="order_jobs",
+            name="Сроки заказов",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        self.scheduler.add_job(
+            self._outbox,
+            "interval",
+            seconds=settings.outbox_interval_seconds,
+            id="outbox",
+            name="События заказов",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        self.scheduler.add_job(
+            self._balance_snapshots,
+            "cron",
+            hour=0,
+            minute=30,
+            id="balance_snapshots",
+            name="Снимки балансов",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        self.scheduler.start()
+        logger.info(
+            f"Планировщик запущен: сроки заказов раз в {settings.order_jobs_interval_seconds} с, "
+            f"события раз в {settings.outbox_interval_seconds} с"
+        )
+
+    def stop(self) -> None:
+        """Остановить планировщик (из shutdown приложения)"""
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+
+scheduler = BackgroundScheduler()
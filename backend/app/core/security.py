@@ -0,0 +1,198 @@
+"""
+Аутентификация пользователей Telegram WebApp
+
+1. Клиент один раз присылает initData (POST /api/v1/auth/telegram): подпись
+   проверяется по HMAC-SHA256 с ключом из токена бота (verify_init_data),
+   пользователь ищется по telegram_id, выдаётся короткий JWT-токен сессии.
+2. Дальше запросы идут с заголовком Authorization: Bearer <токен>. Токен
+   проверяется без БД: подпись и срок JWT, а расшифрованные claims
+   кэшируются в памяти воркера (LRU) - повторный запрос с тем же токеном
+   не пересчитывает даже подпись.
+
+Маршруты по-прежнему принимают buyer_id/seller_id/user_id в query;
+actor_guard сверяет их с пользователем сессии. Без AUTH_REQUIRED запросы
+без токена пропускаются (для старых клиентов), с токеном - проверяются.
+WebSocket из браузера не может передать заголовок, поэтому там токен можно
+передать параметром ?access_token=.
+
+Токены подписываются SECRET_KEY; пока он равен значению из примера (его
+знает любой), токены не выдаются и не принимаются.
+"""
+import hashlib
+import hmac
+import json
+import time
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qsl
+from fastapi import Header, HTTPException, WebSocketException, status
+from jose import JWTError, jwt
+from starlette.requests import HTTPConnection
+from app.core.cache import MISS, LRUCache
+from app.core.config import DEFAULT_SECRET_KEY, get_settings
+
+# Параметры запроса, означающие "действую от имени этого пользователя"
+ACTOR_PARAMS = ("user_id", "buyer_id", "seller_id", "author_id", "reviewer_id")
+
+
+class InitDataError(ValueError):
+    """initData не прошла проверку (текст - для ответа)"""
+
+
+@dataclass(frozen=True)
+class SessionClaims:
+    """Пользователь сессии из токена"""
+    user_id: int
+    telegram_id: int
+    expires_at: int  # Unix time
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age_seconds: int) -> dict:
+    """
+    Проверить подпись initData Telegram WebApp, вернуть поля (user - dict)
+
+    https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+    """
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop("hash", None)
+    if not received_hash:
+        raise InitDataError("В initData нет подписи")
+
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise InitDataError("Неверная подпись initData")
+
+    try:
+        auth_date = int(fields.get("auth_date", 0))
+    except ValueError:
+        raise InitDataError("Неверный auth_date")
+    if time.time() - auth_date > max_age_seconds:
+        raise InitDataError("initData устарела, откройте приложение заново")
+
+    try:
+        fields["user"] = json.loads(fields["user"])
+        int(fields["user"]["id"])
+    except (KeyError, TypeError, ValueError):
+        raise InitDataError("В initData нет пользователя")
+    return fields
+
+
+def _signing_key() -> str:
+    """SECRET_KEY; HTTPException 503, если он не задан (ключ из примера)"""
+    secret_key = get_settings().secret_key
+    if not secret_key or secret_key == DEFAULT_SECRET_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сессии не настроены: задайте SECRET_KEY"
+        )
+    return secret_key
+
+
+def create_session_token(user_id: int, telegram_id: int) -> tuple[str, int]:
+    """Подписанный токен сессии и его срок жизни в секундах"""
+    settings = get_settings()
+    ttl = settings.access_token_expire_minutes * 60
+    now = int(time.time())
+    token = jwt.encode(
+        {"sub": str(user_id), "tg": telegram_id, "iat": now, "exp": now + ttl},
+        _signing_key(),
+        algorithm=settings.algorithm,
+    )
+    return token, ttl
+
+
+# Расшифрованные claims по токену: свой в каждом воркере, живут не дольше токена
+_claims_cache = LRUCache(
+    get_settings().auth_cache_max_entries,
+    get_settings().access_token_expire_minutes * 60,
+)
+
+
+def decode_session_token(token: str) -> SessionClaims:
+    """Claims токена сессии; HTTPException 401, если токен неверный или истёк"""
+    claims = _claims_cache.get(token)
+    if claims is MISS:
+        secret_key = _signing_key()
+        try:
+            payload = jwt.decode(token, secret_key, algorithms=[get_settings().algorithm])
+            claims = SessionClaims(int(payload["sub"]), int(payload["tg"]), int(payload["exp"]))
+        except (JWTError, KeyError, TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Недействительный токен сессии",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        _claims_cache.set(token, claims)
+
+    # Срок проверяем и для кэшированных claims
+    if claims.expires_at <= time.time():
+        _claims_cache.delete(token)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Сессия истекла, войдите заново",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
+
+def session_claims(authorization: Optional[str] = Header(None)) -> Optional[SessionClaims]:
+    """Зависимость: пользователь сессии из Authorization: Bearer (None без токена)"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Ожидается заголовок Authorization: Bearer <токен>",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return decode_session_token(token)
+
+
+def _check_actor(claims: Optional[SessionClaims], actor_ids: list[str]) -> None:
+    if not actor_ids:
+        return
+    if claims is None:
+        if get_settings().auth_required:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Требуется вход через Telegram",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return
+    if any(actor_id != str(claims.user_id) for actor_id in actor_ids):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нельзя действовать от имени другого пользователя"
+        )
+
+
+def _guard(connection: HTTPConnection, authorization: Optional[str], actor_ids: list[str]) -> None:
+    if not actor_ids:
+        return
+    if connection.scope["type"] != "websocket":
+        _check_actor(session_claims(authorization), actor_ids)
+        return
+
+    # WebSocket: токен и из ?access_token=, отказ - закрытием соединения
+    token = connection.query_params.get("access_token")
+    if not authorization and token:
+        authorization = f"Bearer {token}"
+    try:
+        _check_actor(session_claims(authorization), actor_ids)
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+
+
+def actor_guard(connection: HTTPConnection, authorization: Optional[str] = Header(None)) -> None:
+    """Зависимость роутера: buyer_id/seller_id/user_id/... в query - это пользователь сессии"""
+    params = connection.query_params
+    _guard(connection, authorization, [params[name] for name in ACTOR_PARAMS if name in params])
+
+
+def owner_guard(connection: HTTPConnection, authorization: Optional[str] = Header(None)) -> None:
+    """Зависимость: user_id в пути - это пользователь сессии (свой профиль, выписка)"""
+    path_params = connection.path_params
+    _guard(connection, authorization, [path_params["user_id"]] if "user_id" in path_params else [])
@@ -0,0 +1,224 @@
+"""
+Журнал транзакций, снимки балансов и выписки
+
+transactions - журнал только на добавление: проведённая транзакция (статус
+completed/refunded, заполнен completed_at) больше не меняется, возврат -
+это новая строка. Баланс пользователя = сумма проведённых транзакций со
+знаком из BALANCE_SIGN по оси completed_at.
+
+Чтобы не суммировать журнал с начала, ночное сжатие сохраняет снимки
+BalanceSnapshot: баланс на дату X = последний снимок до X + транзакции
+между снимком и X (поиск по индексу (user_id, completed_at)).
+
+Балансы, набранные до журнала, вносятся в него одной входящей
+транзакцией на пользователя (post_opening_balances).
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import and_, case, func, insert, or_, select, tuple_, type_coerce
+from sqlalchemy.orm import Session
+from app.models import BalanceSnapshot, Transaction, TransactionStatus, TransactionType, User
+from app.types import Money, MoneyType
+
+# Как транзакция меняет баланс своего пользователя
+BALANCE_SIGN = {
+    TransactionType.BALANCE_TOP_UP: 1,
+    TransactionType.ORDER_RELEASE: 1,
+    TransactionType.REFUND: 1,
+    TransactionType.DISPUTE_REFUND: 1,
+    TransactionType.ORDER_ESCROW: -1,
+    TransactionType.WITHDRAWAL: -1,
+    TransactionType.PLATFORM_FEE: -1,
+}
+
+# Статусы транзакций, которые уже изменили баланс
+POSTED_STATUSES = (TransactionStatus.COMPLETED, TransactionStatus.REFUNDED)
+
+
+def signed_amount(transaction: Transaction) -> Money:
+    """Сумма транзакции со знаком: + поступление, - списание"""
+    return transaction.amount if BALANCE_SIGN[transaction.type] > 0 else -transaction.amount
+
+
+def _sum_signed():
+    credits = [tx_type for tx_type, sign in BALANCE_SIGN.items() if sign > 0]
+    signed = case((Transaction.type.in_(credits), Transaction.amount), else_=-Transaction.amount)
+    return type_coerce(func.coalesce(func.sum(signed), 0), MoneyType)
+
+
+def posted_transactions(user_id: int):
+    """Условие: проведённые транзакции пользователя"""
+    return and_(
+        Transaction.user_id == user_id,
+        Transaction.completed_at.isnot(None),
+        Transaction.status.in_(POSTED_STATUSES),
+    )
+
+
+def latest_snapshot(db: Session, user_id: int, as_of: datetime, inclusive: bool = True) -> Optional[BalanceSnapshot]:
+    """Последний снимок пользователя не позже as_of"""
+    bound = BalanceSnapshot.as_of <= as_of if inclusive else BalanceSnapshot.as_of < as_of
+    return db.query(BalanceSnapshot).filter(
+        BalanceSnapshot.user_id == user_id, bound
+    ).order_by(BalanceSnapshot.as_of.desc()).first()
+
+
+def balance_at(db: Session, user_id: int, as_of: datetime, last_id: Optional[int] = None) -> Money:
+    """
+    Баланс после всех транзакций с completed_at <= as_of
+
+    С last_id - после транзакций до (as_of, last_id) включительно (для выписки,
+    где у нескольких транзакций может совпадать completed_at).
+    """
+    snapshot = latest_snapshot(db, user_id, as_of, inclusive=last_id is None)
+    query = db.query(_sum_signed()).filter(posted_transactions(user_id))
+    if snapshot is not None:
+        query = query.filter(Transaction.completed_at > snapshot.as_of)
+    if last_id is None:
+        query = query.filter(Transaction.completed_at <= as_of)
+    else:
+        query = query.filter(tuple_(Transaction.completed_at, Transaction.id) <= tuple_(as_of, last_id))
+
+    opening = snapshot.balance if snapshot is not None else Money(0)
+    return opening + query.scalar()
+
+
+def statement_entries(db: Session, user_id: int, transactions: list[Transaction]) -> list[dict]:
+    """Строки выписки (транзакции от новых к старым) с балансом после каждой"""
+    if not transactions:
+        return []
+
+    newest = transactions[0]
+    running = balance_at(db, user_id, newest.completed_at, newest.id)
+    entries = []
+    for transaction in transactions:
+        amount = signed_amount(transaction)
+        entries.append({
+            "id": transaction.id,
+            "order_id": transaction.order_id,
+            "type": transaction.type,
+            "amount": amount,
+            "balance_after": running,
+            "description": transaction.description,
+            "completed_at": transaction.completed_at,
+        })
+        running -= amount
+    return entries
+
+
+def _latest_snapshots(as_of: Optional[datetime]):
+    """Подзапрос: последний снимок каждого пользователя (не позже as_of)"""
+    latest = select(BalanceSnapshot.user_id, func.max(BalanceSnapshot.as_of).label("as_of"))
+    if as_of is not None:
+        latest = latest.where(BalanceSnapshot.as_of <= as_of)
+    latest = latest.group_by(BalanceSnapshot.user_id).subquery()
+    return select(BalanceSnapshot.user_id, BalanceSnapshot.as_of, BalanceSnapshot.balance).join(
+        latest,
+        and_(BalanceSnapshot.user_id == latest.c.user_id, BalanceSnapshot.as_of == latest.c.as_of)
+    ).subquery()
+
+
+def _journal(db: Session, as_of: Optional[datetime], use_snapshots: bool) -> tuple[dict[int, Money], set[int]]:
+    """Балансы всех пользователей по журналу и пользователи с транзакциями после снимка"""
+    balances: dict[int, Money] = {}
+    filters = [Transaction.completed_at.isnot(None), Transaction.status.in_(POSTED_STATUSES)]
+    if as_of is not None:
+        filters.append(Transaction.completed_at <= as_of)
+
+    query = db.query(Transaction.user_id, _sum_signed())
+    if use_snapshots:
+        snapshots = _latest_snapshots(as_of)
+        for user_id, _, balance in db.execute(select(snapshots)):
+            balances[user_id] = balance
+        query = query.outerjoin(snapshots, snapshots.c.user_id == Transaction.user_id)
+        filters.append(or_(snapshots.c.as_of.is_(None), Transaction.completed_at > snapshots.c.as_of))
+
+    changed = set()
+    for user_id, delta in query.filter(*filters).group_by(Transaction.user_id):
+        balances[user_id] = balances.get(user_id, Money(0)) + delta
+        changed.add(user_id)
+    return balances, changed
+
+
+def journal_balances(db: Session, as_of: Optional[datetime] = None, use_snapshots: bool = True) -> dict[int, Money]:
+    """Баланс каждого пользователя по журналу (на дату as_of или на текущий момент)"""
+    return _journal(db, as_of, use_snapshots)[0]
+
+
+def compact_balance_snapshots(db: Session, as_of: datetime) -> int:
+    """
+    Сохранить снимки балансов на as_of (в текущей транзакции)
+
+    Снимок создаётся только тем, у кого после предыдущего снимка были
+    транзакции; повторный запуск с тем же as_of ничего не добавляет.
+    Возвращает количество новых снимков.
+    """
+    balances, changed = _journal(db, as_of, use_snapshots=True)
+    rows = [
+        {"user_id": user_id, "as_of": as_of, "balance": balances[user_id], "created_at": datetime.utcnow()}
+        for user_id in sorted(changed)
+    ]
+    if rows:
+        db.execute(insert(BalanceSnapshot), rows)
+    return len(rows)
+
+
+def post_opening_balances(db: Session) -> int:
+    """
+    Внести в журнал остатки, которых в нём нет (в текущей транзакции)
+
+    Для БД, где балансы меняли до журнала: разница User.balance и журнала
+    проводится входящей транзакцией (пополнение или, если журнал больше,
+    списание). Возвращает количество проведённых остатков.
+    """
+    journal = journal_balances(db, use_snapshots=False)
+    now = datetime.utcnow()
+    rows = []
+    for user_id, balance in db.query(User.id, User.balance).yield_per(1000):
+        difference = balance - journal.get(user_id, Money(0))
+        if difference == 0:
+            continue
+        rows.append({
+            "user_id": user_id,
+            "type": TransactionType.BALANCE_TOP_UP if difference > 0 else TransactionType.WITHDRAWAL,
+            "amount": difference if difference > 0 else -difference,
+            "status": TransactionStatus.COMPLETED,
+            "description": "Входящий остаток (баланс до журнала транзакций)",
+            "created_at": now,
+            "completed_at": now,
+        })
+    if rows:
+        db.execute(insert(Transaction), rows)
+    return len(rows)
+
+
+def reconcile_balances(db: Session, use_snapshots: bool = True) -> list[dict]:
+    """
+    Сверить User.balance с журналом, вернуть расхождения
+
+    Кандидаты в расхождения перепроверяются по одному: баланс мог измениться
+    между чтением журнала и чтением пользователей.
+    """
+    journal = journal_balances(db, use_snapshots=use_snapshots)
+    candidates = [
+        user_id
+        for user_id, balance in db.query(User.id, User.balance).yield_per(1000)
+        if balance != journal.get(user_id, Money(0))
+    ]
+
+    mismatches = []
+    for user_id in candidates:
+        db.rollback()  # Новая транзакция - свежие данные
+        balance = db.query(User.balance).filter(User.id == user_id).scalar()
+        if use_snapshots:
+            expected = balance_at(db, user_id, datetime.utcnow())
+        else:
+            expected = db.query(_sum_signed()).filter(posted_transactions(user_id)).scalar()
+        if balance != expected:
+            mismatches.append({
+                "user_id": user_id,
+                "balance": balance,
+                "journal_balance": expected,
+                "difference": balance - expected,
+            })
+    return mismatches
@@ -0,0 +1,67 @@
+"""
+Обработка сроков заказов (вызывается планировщиком)
+
+- in_progress, срок прошёл: участники уведомляются о просрочке (один раз)
+- in_progress, срок прошёл больше чем на order_overdue_dispute_hours: спор
+- under_review, заказчик не ответил до срока: заказ завершается с выплатой
+
+Заказы выбираются пачками по индексу (status, deadline), пачка переводится
+одним условным UPDATE по статусу (transition_orders), поэтому заказ, который
+успели изменить вручную, пропускается. События пишутся в outbox, выплату
+по завершённым заказам делает обработчик order.completed.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.db.outbox import enqueue_events
+from app.db.transitions import transition_orders
+from app.models import Order, OrderStatus
+
+# Событие просрочки (статус не меняется)
+OVERDUE_EVENT = "order.overdue"
+
+
+def _due_orders(db: Session, status: OrderStatus, before: datetime, limit: int, *conditions):
+    """Заказы статуса со сроком не позже before, самые старые первыми"""
+    return db.query(Order).filter(
+        Order.status == status,
+        Order.deadline <= before,
+        *conditions
+    ).order_by(Order.deadline).limit(limit)
+
+
+def notify_overdue_orders(db: Session, now: datetime, batch_size: int) -> list[int]:
+    """Отметить просроченные заказы и поставить событие order.overdue, вернуть их ID"""
+    ids = [order_id for (order_id,) in _due_orders(
+        db, OrderStatus.IN_PROGRESS, now, batch_size, Order.overdue_notified_at.is_(None)
+    ).with_entities(Order.id)]
+    if not ids:
+        return []
+
+    result = db.execute(
+        update(Order)
+        .where(Order.id.in_(ids), Order.status == OrderStatus.IN_PROGRESS, Order.overdue_notified_at.is_(None))
+        .values(overdue_notified_at=now)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    )
+    notified = [order_id for (order_id,) in result]
+    enqueue_events(db, OVERDUE_EVENT, notified)
+    return notified
+
+
+def escalate_overdue_orders(db: Session, now: datetime, grace: timedelta, batch_size: int) -> list[int]:
+    """Перевести в спор заказы, просроченные больше чем на grace, вернуть их ID"""
+    cutoff = now - grace
+    ids = [order_id for (order_id,) in _due_orders(
+        db, OrderStatus.IN_PROGRESS, cutoff, batch_size
+    ).with_entities(Order.id)]
+    return transition_orders(db, ids, OrderStatus.IN_PROGRESS, OrderStatus.DISPUTE, Order.deadline <= cutoff)
+
+
+def auto_complete_reviewed_orders(db: Session, now: datetime, batch_size: int) -> list[int]:
+    """Завершить заказы, которые заказчик не проверил до срока, вернуть их ID"""
+    ids = [order_id for (order_id,) in _due_orders(
+        db, OrderStatus.UNDER_REVIEW, now, batch_size
+    ).with_entities(Order.id)]
+    return transition_orders(db, ids, OrderStatus.UNDER_REVIEW, OrderStatus.COMPLETED, Order.deadline <= now)
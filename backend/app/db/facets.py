@@ -0,0 +1,143 @@
+"""
+Фасеты каталога: количество активных услуг по категориям и тегам
+
+Счётчики лежат в таблице service_facets и меняются на разницу между
+состоянием услуги до и после изменения (в той же транзакции), поэтому
+эндпоинту фасетов не нужно агрегировать таблицу services.
+"""
+import re
+from typing import Optional
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.models import Service, ServiceFacet, ServiceStatus
+
+CATEGORY = "category"
+TAG = "tag"
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_category(category: str) -> str:
+    """Единое написание категории: без лишних пробелов, с заглавной буквы"""
+    category = _SPACES_RE.sub(" ", category).strip()
+    return category[:1].upper() + category[1:]
+
+
+def normalize_tag(tag: str) -> str:
+    return _SPACES_RE.sub(" ", tag).strip().lower()[:100]
+
+
+def split_tags(tags: Optional[str]) -> list[str]:
+    """Теги из строки через запятую (нормализованные, без повторов)"""
+    if not tags:
+        return []
+    return list(dict.fromkeys(tag for tag in map(normalize_tag, tags.split(",")) if tag))
+
+
+def service_facets(service: Service) -> set[tuple[str, str]]:
+    """Фасеты, в которых учитывается услуга (только активные услуги)"""
+    if service is None or service.status != ServiceStatus.ACTIVE:
+        return set()
+    facets = {(CATEGORY, service.category)}
+    facets.update((TAG, tag) for tag in split_tags(service.tags))
+    return facets
+
+
+def _upsert_increment(db: Session, facets: set[tuple[str, str]]) -> None:
+    dialect = db.get_bind().dialect.name
+    insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    for kind, value in facets:
+        statement = insert(ServiceFacet).values(kind=kind, value=value, count=1)
+        statement = statement.on_conflict_do_update(
+            index_elements=[ServiceFacet.kind, ServiceFacet.value],
+            set_={"count": ServiceFacet.count + 1},
+        )
+        db.execute(statement)
+
+
+def apply_facet_changes(
+    db: Session,
+    before: set[tuple[str, str]],
+    after: set[tuple[str, str]],
+) -> None:
+    """Применить разницу фасетов услуги (в текущей транзакции)"""
+    removed = before - after
+    added = after - before
+
+    for kind, value in removed:
+        db.execute(
+            update(ServiceFacet)
+            .where(ServiceFacet.kind == kind, ServiceFacet.value == value)
+            .values(count=ServiceFacet.count - 1)
+            .execution_options(synchronize_session=False)
+        )
+    if added:
+        _upsert_increment(db, added)
+
+
+def get_facets(db: Session, tags_limit: int = 50) -> dict:
+    """Категории (все) и самые популярные теги с количеством активных услуг"""
+    def load(kind: str, limit: Optional[int] = None) -> list[dict]:
+        query = db.query(ServiceFacet.value, ServiceFacet.count).filter(
+            ServiceFacet.kind == kind,
+            ServiceFacet.count > 0
+        ).order_by(ServiceFacet.count.desc(), ServiceFacet.value)
+        if limit is not None:
+            query = query.limit(limit)
+        return [{"value": value, "count": count} for value, count in query.all()]
+
+    return {"categories": load(CATEGORY), "tags": load(TAG, tags_limit)}
+
+
+def rebuild_service_facets(db: Session) -> int:
+    """Пересчитать все счётчики с нуля, вернуть количество фасетов"""
+    db.execute(delete(ServiceFacet))
+
+    counts: dict[tuple[str, str], int] = {}
+    category_rows = db.query(Service.category, func.count(Service.id)).filter(
+        Service.status == ServiceStatus.ACTIVE
+    ).group_by(Service.category)
+    for category, count in category_rows:
+        counts[(CATEGORY, category)] = count
+
+    tag_rows = db.query(Service.tags).filter(
+        Service.status == ServiceStatus.ACTIVE,
+        Service.tags.isnot(None)
+    ).yield_per(1000)
+    for (tags,) in tag_rows:
+        for tag in split_tags(tags):
+            counts[(TAG, tag)] = counts.get((TAG, tag), 0) + 1
+
+    db.bulk_insert_mappings(ServiceFacet, [
+        {"kind": kind, "value": value, "count": count}
+        for (kind, value), count in counts.items()
+    ])
+    return len(counts)
+
+
+def normalize_service_categories(db: Session) -> int:
+    """Привести категории существующих услуг к единому написанию, вернуть количество услуг"""
+    changed = 0
+    for (category,) in db.query(Service.category).distinct().all():
+        normalized = normalize_category(category)
+        if normalized != category:
+            changed += db.execute(
+                update(Service)
+                .where(Service.category == category)
+                .values(category=normalized)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+    return changed
+
+
+def ensure_service_facets(engine: Engine) -> None:
+    """Заполнить счётчики при первом запуске на БД, где услуги уже есть"""
+    with Session(engine) as db:
+        has_facets = db.query(ServiceFacet.kind).first() is not None
+        has_services = db.query(Service.id).filter(Service.status == ServiceStatus.ACTIVE).first() is not None
+        if has_services and not has_facets:
+            rebuild_service_facets(db)
+            db.commit()
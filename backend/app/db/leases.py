@@ -0,0 +1,51 @@
+"""
+Аренда фоновых задач (одна задача - один исполнитель среди воркеров)
+
+Аренда берётся условным UPDATE: свободна, если истекла или уже наша.
+Первый запуск создаёт строку; при гонке двух воркеров INSERT второго
+упадёт на первичном ключе, и он просто пропустит запуск.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import JobLease
+
+
+def acquire_lease(db: Session, name: str, owner: str, ttl_seconds: int) -> bool:
+    """Взять или продлить аренду задачи, True если она теперь наша"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+
+    taken = db.execute(
+        update(JobLease)
+        .where(JobLease.name == name, or_(JobLease.expires_at < now, JobLease.owner == owner))
+        .values(owner=owner, expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    if taken:
+        db.commit()
+        return True
+
+    if db.get(JobLease, name) is not None:
+        db.rollback()
+        return False
+
+    try:
+        db.add(JobLease(name=name, owner=owner, expires_at=expires_at))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+
+def release_lease(db: Session, name: str, owner: str) -> None:
+    """Отпустить аренду досрочно (следующий запуск может взять любой воркер)"""
+    db.execute(
+        update(JobLease)
+        .where(JobLease.name == name, JobLease.owner == owner)
+        .values(expires_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
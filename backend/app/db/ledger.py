@@ -0,0 +1,178 @@
+"""
+Эскроу-леджер: оплата заказа и выплата продавцу
+
+Балансы меняются только условными UPDATE в SQL, без чтения баланса в Python:
+- оплата: UPDATE orders ... WHERE is_paid = false (заказ оплачивается один раз),
+  затем UPDATE users SET balance = balance - price WHERE balance >= price
+  (параллельные оплаты не уводят баланс в минус);
+- выплата: balance = balance + seller_gets в обработчике события
+  order.completed (app/db/transitions.py): переход в completed происходит
+  один раз, а событие outbox обрабатывается один раз.
+
+Сначала всегда блокируется строка заказа, потом строка пользователя, поэтому
+оплата и выплата не ждут друг друга по кругу. Конфликты блокировок (SQLite
+"database is locked", deadlock/serialization failure в PostgreSQL)
+повторяет run_with_retry().
+"""
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional, TypeVar
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.models import Order, OrderStatus, Service, Transaction, TransactionStatus, TransactionType, User
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Базовая пауза перед повтором (секунды), удваивается с каждой попыткой
+RETRY_BASE_DELAY = 0.02
+
+# SQLSTATE PostgreSQL: serialization_failure, deadlock_detected
+_POSTGRES_CONFLICT_CODES = {"40001", "40P01"}
+
+
+class LedgerError(Exception):
+    """Операция с деньгами отклонена (текст - для ответа пользователю)"""
+
+
+class OrderNotPayable(LedgerError):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+def is_conflict(error: OperationalError) -> bool:
+    """Ошибка - конфликт блокировок, после которого транзакцию можно повторить"""
+    if getattr(error.orig, "pgcode", None) in _POSTGRES_CONFLICT_CODES:
+        return True
+    return "database is locked" in str(error.orig) or "database table is locked" in str(error.orig)
+
+
+def run_with_retry(db: Session, operation: Callable[[], T], attempts: Optional[int] = None) -> T:
+    """
+    Выполнить operation() и закоммитить; при конфликте блокировок - откатить и повторить
+
+    operation должна сама загружать нужные строки: после отката повтор
+    начинается с чистой транзакции.
+    """
+    attempts = attempts or get_settings().ledger_max_retries
+    for attempt in range(1, attempts + 1):
+        try:
+            result = operation()
+            db.commit()
+            return result
+        except OperationalError as e:
+            db.rollback()
+            if attempt == attempts or not is_conflict(e):
+                raise
+            logger.info(f"Конфликт блокировок, повтор {attempt}/{attempts - 1}: {e.orig}")
+            time.sleep(RETRY_BASE_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        except Exception:
+            db.rollback()
+            raise
+
+
+def _conditional_update(db: Session, statement) -> bool:
+    """Выполнить UPDATE ... WHERE <условие>, True если строка обновилась"""
+    result = db.execute(statement.execution_options(synchronize_session=False))
+    return result.rowcount == 1
+
+
+def find_payment(db: Session, idempotency_key: str) -> Optional[Transaction]:
+    """Транзакция оплаты, уже проведённая с этим ключом идемпотентности"""
+    return db.query(Transaction).filter(Transaction.idempotency_key == idempotency_key).first()
+
+
+def pay_order(db: Session, order: Order, idempotency_key: Optional[str] = None) -> Transaction:
+    """
+    Списать цену заказа с баланса покупателя в эскроу (в текущей транзакции)
+
+    При ошибке (LedgerError) часть изменений уже выполнена - транзакцию
+    нужно откатить (run_with_retry делает это сам).
+    """
+    now = datetime.utcnow()
+
+    # Срок выполнения отсчитывается от оплаты, а не от создания заказа
+    claimed = _conditional_update(db, update(Order).where(
+        Order.id == order.id,
+        Order.is_paid == False,
+        Order.status == OrderStatus.WAITING_PAYMENT,
+    ).values(
+        is_paid=True,
+        payment_date=now,
+        status=OrderStatus.IN_PROGRESS,
+        deadline=now + timedelta(days=order.service.execution_days),
+        overdue_notified_at=None,
+        updated_at=now,
+    ))
+    if not claimed:
+        raise OrderNotPayable("Заказ уже оплачен или отменён")
+
+    charged = _conditional_update(db, update(User).where(
+        User.id == order.buyer_id,
+        User.balance >= order.price,
+    ).values(balance=User.balance - order.price, total_spent=User.total_spent + order.price))
+    if not charged:
+        raise InsufficientFunds("Недостаточно средств на балансе")
+
+    escrow_tx = db.query(Transaction).filter(
+        Transaction.order_id == order.id,
+        Transaction.type == TransactionType.ORDER_ESCROW
+    ).first()
+    if escrow_tx is None:
+        escrow_tx = Transaction(
+            user_id=order.buyer_id,
+            order_id=order.id,
+            type=TransactionType.ORDER_ESCROW,
+            amount=order.price,
+            description="Эскроу для заказа",
+            created_at=now,
+        )
+        db.add(escrow_tx)
+
+    escrow_tx.status = TransactionStatus.COMPLETED
+    escrow_tx.completed_at = now
+    escrow_tx.idempotency_key = idempotency_key
+    db.flush()
+    return escrow_tx
+
+
+def release_order(db: Session, order: Order) -> Transaction:
+    """
+    Выплатить продавцу его долю завершённого заказа (в текущей транзакции)
+
+    Вызывается только обработчиком события order.completed - повторно для
+    одного заказа не выполняется.
+    """
+    now = datetime.utcnow()
+
+    db.execute(update(User).where(User.id == order.seller_id).values(
+        balance=User.balance + order.seller_gets,
+        total_earned=User.total_earned + order.seller_gets,
+        completed_orders=User.completed_orders + 1,
+    ).execution_options(synchronize_session=False))
+    db.execute(update(Service).where(Service.id == order.service_id).values(
+        total_orders=Service.total_orders + 1,
+    ).execution_options(synchronize_session=False))
+
+    release_tx = Transaction(
+        user_id=order.seller_id,
+        order_id=order.id,
+        type=TransactionType.ORDER_RELEASE,
+        amount=order.seller_gets,
+        status=TransactionStatus.COMPLETED,
+        description="Выплата за завершённый заказ",
+        created_at=now,
+        completed_at=now,
+    )
+    db.add(release_tx)
+    db.flush()
+    return release_tx
+
@@ -0,0 +1,188 @@
+"""
+Простая доводка схемы существующей БД
+
+create_all() создаёт только отсутствующие таблицы. Новые колонки и индексы
+в уже созданных таблицах добавляются здесь (ALTER TABLE ... ADD COLUMN,
+CREATE INDEX). Денежные колонки, которые ещё хранят рубли в FLOAT,
+переводятся в целые копейки. Агрегаты, добавленные новыми колонками,
+заполняются по существующим данным, балансы, набранные до журнала
+транзакций, вносятся в него входящими остатками, категории услуг
+приводятся к единому написанию.
+"""
+import enum
+from sqlalchemy import Integer, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.db.base import Base
+from app.types import MoneyType
+
+
+def _default_sql(column) -> str:
+    """DEFAULT для новой колонки (чтобы старые строки не получили NULL)"""
+    default = column.default
+    if default is None or not default.is_scalar:
+        return ""
+    value = default.arg
+    if isinstance(value, enum.Enum):
+        # SqlEnum хранит имена членов перечисления
+        return f" DEFAULT '{value.name}'"
+    if isinstance(value, bool):
+        return " DEFAULT TRUE" if value else " DEFAULT FALSE"
+    if isinstance(value, (int, float)):
+        return f" DEFAULT {value}"
+    if isinstance(value, str):
+        escaped = value.replace("'", "''")
+        return f" DEFAULT '{escaped}'"
+    return ""
+
+
+def add_missing_columns(engine: Engine) -> list[str]:
+    """
+    Добавить в существующие таблицы колонки, которых ещё нет в БД
+
+    Возвращает список добавленных колонок в формате "table.column".
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    f"{_default_sql(column)}"
+                ))
+                added.append(f"{table.name}.{column.name}")
+
+    return added
+
+
+def create_missing_indexes(engine: Engine) -> list[str]:
+    """Создать индексы моделей, которых ещё нет в существующих таблицах"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                index.create(bind=conn)
+                created.append(index.name)
+
+    return created
+
+
+def convert_money_columns(engine: Engine) -> list[str]:
+    """
+    Перевести денежные колонки из FLOAT (рубли) в BIGINT (копейки)
+
+    Признак уже переведённой колонки - целочисленный тип в БД, поэтому
+    повторный запуск ничего не делает. Возвращает список "table.column".
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    converted = []
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_types = {col["name"]: col["type"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if not isinstance(column.type, MoneyType) or column.name not in existing_types:
+                    continue
+                if isinstance(existing_types[column.name], Integer):
+                    continue
+
+                name = column.name
+                if engine.dialect.name == "postgresql":
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ALTER COLUMN {name} TYPE BIGINT "
+                        f"USING round({name} * 100)::bigint"
+                    ))
+                else:
+                    # SQLite не меняет тип колонки: заводим новую и переносим значения
+                    legacy = f"{name}_rub"
+                    conn.execute(text(f"ALTER TABLE {table.name} RENAME COLUMN {name} TO {legacy}"))
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} BIGINT DEFAULT 0"))
+                    conn.execute(text(
+                        f"UPDATE {table.name} SET {name} = CAST(ROUND({legacy} * 100) AS INTEGER)"
+                    ))
+                    conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN {legacy}"))
+                converted.append(f"{table.name}.{name}")
+
+    return converted
+
+
+# Колонки агрегатов рейтинга: добавленная колонка получает 0, а total_reviews
+# у продавцов и услуг уже есть - без пересчёта новый отзыв дал бы неверный рейтинг
+RATING_AGGREGATE_COLUMNS = {
+    "users.rating_sum", "services.rating_sum",
+    *(f"users.rating_{rating}_count" for rating in range(1, 6)),
+}
+
+
+def backfill_rating_aggregates(engine: Engine, added_columns: list[str]) -> list[str]:
+    """Пересчитать агрегаты рейтинга, если их колонки только что добавлены"""
+    if not RATING_AGGREGATE_COLUMNS & set(added_columns):
+        return []
+    from app.db.ratings import recompute_rating_aggregates
+
+    with Session(engine) as db:
+        recompute_rating_aggregates(db)
+        db.commit()
+    return ["пересчитаны агрегаты рейтинга"]
+
+
+# Индекс появился вместе с журналом балансов: если его только что создали,
+# балансы БД набраны без журнала
+JOURNAL_INDEX = "ix_transactions_user_completed"
+
+
+def post_opening_balances(engine: Engine, created_indexes: list[str]) -> list[str]:
+    """Внести в журнал балансы, набранные до него (один раз, при появлении журнала)"""
+    if JOURNAL_INDEX not in created_indexes:
+        return []
+    from app.db import balances
+
+    with Session(engine) as db:
+        posted = balances.post_opening_balances(db)
+        db.commit()
+    return [f"входящие остатки в журнале: {posted}"] if posted else []
+
+
+def normalize_categories(engine: Engine) -> list[str]:
+    """Привести категории услуг, записанные до нормализации, к единому написанию"""
+    from app.db.facets import normalize_service_categories, rebuild_service_facets
+
+    with Session(engine) as db:
+        changed = normalize_service_categories(db)
+        if not changed:
+            return []
+        # Счётчики фасетов велись по старому написанию
+        rebuild_service_facets(db)
+        db.commit()
+    return [f"нормализованы категории услуг: {changed}"]
+
+
+def upgrade_schema(engine: Engine) -> list[str]:
+    """Довести схему существующей БД до моделей: деньги в копейки, колонки, индексы, данные"""
+    changes = convert_money_columns(engine)
+    added_columns = add_missing_columns(engine)
+    created_indexes = create_missing_indexes(engine)
+    changes += added_columns + created_indexes
+    changes += backfill_rating_aggregates(engine, added_columns)
+    changes += post_opening_balances(engine, created_indexes)
+    return changes + normalize_categories(engine)
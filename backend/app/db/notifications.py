@@ -0,0 +1,207 @@
+"""
+Уведомления в Telegram по событиям outbox
+
+Обработчики NOTIFICATION_HANDLERS превращают событие (переход статуса
+заказа, новое сообщение, отзыв) в строки telegram_notifications для
+получателей - в той же транзакции, где событие отмечается обработанным.
+Отправляет их воркер уведомлений (app/core/notifier.py): забирает пачку
+условным UPDATE (claim_notifications) и записывает результаты
+(record_results), сама отправка в Telegram идёт вне транзакции.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import insert, or_, update
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.db.outbox import EventHandlers
+from app.models import Message, Notification, NotificationStatus, Order, OrderStatus, OutboxEvent, User
+
+# Длина цитаты сообщения чата в уведомлении
+MESSAGE_PREVIEW_LENGTH = 200
+
+# Базовая пауза перед повтором отправки (секунды), удваивается с каждой попыткой
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+
+
+def _order_title(order: Order) -> str:
+    return f"заказ #{order.id} «{order.service.title}»"
+
+
+def _status_texts(order: Order, event: OutboxEvent) -> list[tuple[int, str]]:
+    """Получатели и тексты уведомления о переходе статуса (по payload события)"""
+    payload = event.payload or {}
+    previous, current = payload.get("from"), payload.get("to")
+    title = _order_title(order)
+    buyer, seller = order.buyer_id, order.seller_id
+
+    if current == OrderStatus.IN_PROGRESS.value and previous == OrderStatus.WAITING_PAYMENT.value:
+        return [(seller, f"💰 Оплачен {title}. Можно приступать к работе")]
+    if current == OrderStatus.IN_PROGRESS.value and previous == OrderStatus.UNDER_REVIEW.value:
+        return [(seller, f"🔁 Заказчик вернул {title} на доработку")]
+    if current == OrderStatus.IN_PROGRESS.value:
+        return [(seller, f"▶️ Спор закрыт, {title} снова в работе")]
+    if current == OrderStatus.UNDER_REVIEW.value:
+        return [(buyer, f"📦 Исполнитель сдал работу: {title}. Проверьте результат")]
+    if current == OrderStatus.COMPLETED.value:
+        return [(seller, f"✅ Завершён {title}. На баланс зачислено {order.seller_gets} ₽")]
+    if current == OrderStatus.DISPUTE.value:
+        return [(buyer, f"⚠️ Открыт спор: {title}"), (seller, f"⚠️ Открыт спор: {title}")]
+    if current == OrderStatus.CANCELLED.value:
+        return [(buyer, f"❌ Отменён {title}"), (seller, f"❌ Отменён {title}")]
+    return []
+
+
+def _texts(db: Session, event: OutboxEvent) -> list[tuple[int, str]]:
+    """Получатели и тексты уведомлений по событию"""
+    order = db.get(Order, event.order_id) if event.order_id else None
+    if order is None:
+        return []
+    payload = event.payload or {}
+    title = _order_title(order)
+
+    if event.event_type == "order.created":
+        return [(order.seller_id, f"🆕 Новый {title} на {order.price} ₽. Ждёт оплаты")]
+    if event.event_type == "order.overdue":
+        return [
+            (order.buyer_id, f"⏰ Истёк срок: {title}"),
+            (order.seller_id, f"⏰ Истёк срок сдачи: {title}"),
+        ]
+    if event.event_type == "message.created":
+        message = db.get(Message, payload.get("message_id"))
+        if message is None:
+            return []
+        recipient = order.seller_id if message.author_id == order.buyer_id else order.buyer_id
+        text = message.text[:MESSAGE_PREVIEW_LENGTH]
+        return [(recipient, f"💬 Новое сообщение, {title}:\n{text}")]
+    if event.event_type == "review.created":
+        return [(order.seller_id, f"⭐ Новый отзыв ({payload.get('rating')}/5), {title}")]
+    return _status_texts(order, event)
+
+
+def _notify(db: Session, event: OutboxEvent) -> None:
+    if not get_settings().telegram_bot_token:
+        return
+    texts = _texts(db, event)
+    if not texts:
+        return
+
+    chat_ids = dict(db.query(User.id, User.telegram_id).filter(
+        User.id.in_([user_id for user_id, _ in texts]),
+        User.is_banned == False,
+    ).all())
+    now = datetime.utcnow()
+    rows = [
+        {
+            "event_id": event.id,
+            "user_id": user_id,
+            "chat_id": chat_ids[user_id],
+            "text": text,
+            "status": NotificationStatus.PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        for user_id, text in texts
+        if user_id in chat_ids
+    ]
+    if rows:
+        db.execute(insert(Notification), rows)
+
+
+NOTIFICATION_HANDLERS: EventHandlers = {
+    event_type: [_notify]
+    for event_type in [
+        "order.created",
+        "order.overdue",
+        "message.created",
+        "review.created",
+        *(f"order.{status.value}" for status in OrderStatus if status != OrderStatus.WAITING_PAYMENT),
+    ]
+}
+
+
+def claim_notifications(db: Session, batch_size: int, lease_seconds: int) -> list[Notification]:
+    """
+    Забрать пачку уведомлений к отправке (commit внутри)
+
+    Забранные получают статус sending до now + lease_seconds: если воркер
+    упадёт, не отправив их, после этого их заберёт другой.
+    """
+    now = datetime.utcnow()
+    due = or_(
+        Notification.status == NotificationStatus.PENDING,
+        Notification.status == NotificationStatus.SENDING,
+    )
+    ids = [notification_id for (notification_id,) in db.query(Notification.id).filter(
+        due, Notification.next_attempt_at <= now
+    ).order_by(Notification.next_attempt_at, Notification.id).limit(batch_size)]
+    if not ids:
+        return []
+
+    claimed = [notification_id for (notification_id,) in db.execute(
+        update(Notification)
+        .where(Notification.id.in_(ids), due, Notification.next_attempt_at <= now)
+        .values(status=NotificationStatus.SENDING, next_attempt_at=now + timedelta(seconds=lease_seconds))
+        .returning(Notification.id)
+        .execution_options(synchronize_session=False)
+    )]
+    db.commit()
+    return db.query(Notification).filter(Notification.id.in_(claimed)).order_by(Notification.id).all()
+
+
+def retry_delay(attempts: int, retry_after: Optional[int] = None) -> int:
+    """Пауза перед следующей попыткой: retry_after от Telegram или экспонента"""
+    if retry_after is not None:
+        return retry_after
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def record_results(db: Session, sent: list[int], retries: dict[int, tuple[int, str]],
+                   failed: dict[int, str], deferred: Optional[dict[int, int]] = None) -> None:
+    """
+    Записать результаты отправки пачки (commit внутри)
+
+    sent - доставленные; retries - {id: (пауза в секундах, ошибка)};
+    failed - {id: ошибка} для тех, кому доставить нельзя; deferred -
+    {id: пауза} для неотправленных из-за лимита (попытка не тратится).
+    """
+    now = datetime.utcnow()
+    max_attempts = get_settings().notification_max_attempts
+    if sent:
+        db.execute(
+            update(Notification)
+            .where(Notification.id.in_(sent))
+            .values(status=NotificationStatus.SENT, sent_at=now, attempts=Notification.attempts + 1, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+    for notification_id, error in failed.items():
+        db.execute(
+            update(Notification)
+            .where(Notification.id == notification_id)
+            .values(status=NotificationStatus.FAILED, attempts=Notification.attempts + 1, last_error=error[:500])
+            .execution_options(synchronize_session=False)
+        )
+    for notification_id, delay in (deferred or {}).items():
+        db.execute(
+            update(Notification)
+            .where(Notification.id == notification_id)
+            .values(status=NotificationStatus.PENDING, next_attempt_at=now + timedelta(seconds=delay))
+            .execution_options(synchronize_session=False)
+        )
+    attempts = dict(db.query(Notification.id, Notification.attempts).filter(Notification.id.in_(list(retries))))
+    for notification_id, (delay, error) in retries.items():
+        used = attempts.get(notification_id, 0) + 1
+        db.execute(
+            update(Notification)
+            .where(Notification.id == notification_id)
+            .values(
+                # Попытки кончились - больше не пробуем
+                status=NotificationStatus.FAILED if used >= max_attempts else NotificationStatus.PENDING,
+                attempts=used,
+                next_attempt_at=now + timedelta(seconds=delay),
+                last_error=error[:500],
+            )
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
@@ -0,0 +1,109 @@
+"""
+Исходящая очередь событий (transactional outbox)
+
+Переход статуса заказа и его событие пишутся одной транзакцией
+(enqueue_events), а побочные эффекты - выплата, уведомления - выполняет
+позже process_events() из планировщика. Каждое событие обрабатывается в
+своей транзакции: условный UPDATE ... WHERE processed_at IS NULL забирает
+событие, обработчик выполняется в той же транзакции, поэтому повторная
+или параллельная обработка ничего не делает.
+
+При ошибке обработчика событие остаётся в очереди, следующая попытка -
+через OUTBOX_RETRY_BASE_SECONDS * 2^(attempts-1), но не позже чем через
+OUTBOX_RETRY_MAX_SECONDS.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from sqlalchemy import insert, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.db.ledger import is_conflict
+from app.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 3600
+
+# Обработчик события: выполняется в транзакции, которая отметит событие
+EventHandler = Callable[[Session, OutboxEvent], None]
+EventHandlers = dict[str, list[EventHandler]]
+
+
+def merge_handlers(*registries: EventHandlers) -> EventHandlers:
+    """Объединить реестры обработчиков (порядок вызова - порядок реестров)"""
+    merged: EventHandlers = {}
+    for registry in registries:
+        for event_type, handlers in registry.items():
+            merged.setdefault(event_type, []).extend(handlers)
+    return merged
+
+
+def enqueue_events(db: Session, event_type: str, order_ids: list[int], payload: Optional[dict] = None) -> None:
+    """Добавить события по заказам (в текущей транзакции)"""
+    if not order_ids:
+        return
+    now = datetime.utcnow()
+    db.execute(insert(OutboxEvent), [
+        {"event_type": event_type, "order_id": order_id, "payload": payload, "created_at": now, "next_attempt_at": now}
+        for order_id in order_ids
+    ])
+
+
+def _pending_ids(db: Session, now: datetime, batch_size: int) -> list[int]:
+    return [event_id for (event_id,) in db.query(OutboxEvent.id).filter(
+        OutboxEvent.processed_at.is_(None),
+        OutboxEvent.next_attempt_at <= now,
+    ).order_by(OutboxEvent.next_attempt_at, OutboxEvent.id).limit(batch_size)]
+
+
+def _record_failure(db: Session, event_id: int, error: Exception) -> None:
+    event = db.get(OutboxEvent, event_id)
+    attempts = event.attempts + 1
+    delay = min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+    event.attempts = attempts
+    event.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+    event.last_error = str(error)[:2000]
+    db.commit()
+    logger.error(f"Событие {event_id} ({event.event_type}): ошибка, попытка {attempts}, повтор через {delay} с: {error}")
+
+
+def process_events(db: Session, handlers: EventHandlers, batch_size: int) -> list[tuple[str, Optional[int]]]:
+    """
+    Обработать очередную пачку событий, вернуть (тип, order_id) обработанных
+
+    Обработчики события выполняются по порядку в одной транзакции; событие
+    без обработчиков просто отмечается. При конфликте блокировок пачка прерывается, событие
+    останется в очереди до следующего запуска.
+    """
+    processed = []
+    for event_id in _pending_ids(db, datetime.utcnow(), batch_size):
+        db.rollback()  # Каждое событие - своя транзакция
+        try:
+            claimed = db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id == event_id, OutboxEvent.processed_at.is_(None))
+                .values(processed_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            ).rowcount == 1
+            if not claimed:
+                continue
+
+            event = db.get(OutboxEvent, event_id)
+            done = (event.event_type, event.order_id)
+            for handler in handlers.get(event.event_type, ()):
+                handler(db, event)
+            db.commit()
+        except OperationalError as e:
+            db.rollback()
+            if is_conflict(e):
+                break
+            _record_failure(db, event_id, e)
+            continue
+        except Exception as e:
+            db.rollback()
+            _record_failure(db, event_id, e)
+            continue
+        processed.append(done)
+    return processed
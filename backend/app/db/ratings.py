@@ -0,0 +1,129 @@
+"""
+Агрегаты рейтинга продавцов и услуг
+
+При новом отзыве агрегаты обновляются одним UPDATE прямо в SQL
+(сумма, количество, гистограмма), без чтения всех отзывов продавца.
+recompute_rating_aggregates() пересчитывает их с нуля (починка/заполнение).
+"""
+from datetime import datetime
+from sqlalchemy import Float, Numeric, bindparam, case, cast, func, update
+from sqlalchemy.orm import Session
+from app.models import Order, Review, Service, User
+
+# Размер пачки для массового UPDATE при пересчёте
+RECOMPUTE_BATCH_SIZE = 1000
+
+
+def _histogram_column(rating: int):
+    return getattr(User, f"rating_{rating}_count")
+
+
+def _average(total, count):
+    """round(total / count, 2) в SQL (через NUMERIC, т.к. в PostgreSQL нет round(float, int))"""
+    return func.round(cast(cast(total, Float) / count, Numeric(10, 4)), 2)
+
+
+def apply_review_rating(db: Session, seller_id: int, service_id: int, rating: int) -> None:
+    """Учесть новую оценку в агрегатах продавца и услуги (в текущей транзакции)"""
+    histogram_column = _histogram_column(rating)
+    db.execute(
+        update(User)
+        .where(User.id == seller_id)
+        .values({
+            User.rating_sum: User.rating_sum + rating,
+            User.total_reviews: User.total_reviews + 1,
+            histogram_column: histogram_column + 1,
+            User.rating: _average(User.rating_sum + rating, User.total_reviews + 1),
+            User.updated_at: datetime.utcnow(),
+        })
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        update(Service)
+        .where(Service.id == service_id)
+        .values({
+            Service.rating_sum: Service.rating_sum + rating,
+            Service.total_reviews: Service.total_reviews + 1,
+            Service.average_rating: _average(Service.rating_sum + rating, Service.total_reviews + 1),
+        })
+        .execution_options(synchronize_session=False)
+    )
+
+
+def recompute_rating_aggregates(db: Session) -> dict:
+    """
+    Пересчитать агрегаты всех продавцов и услуг по таблице reviews
+
+    Агрегация выполняется в БД (GROUP BY), результаты записываются пачками
+    через executemany. Возвращает количество обновлённых продавцов и услуг.
+    """
+    # Сначала обнуляем всех: у кого отзывов нет, тот не попадёт в GROUP BY
+    reset_user = {
+        User.rating: 0.0, User.total_reviews: 0, User.rating_sum: 0,
+        **{_histogram_column(r): 0 for r in range(1, 6)},
+    }
+    db.execute(update(User).values(reset_user).execution_options(synchronize_session=False))
+    db.execute(
+        update(Service)
+        .values({Service.average_rating: 0.0, Service.total_reviews: 0, Service.rating_sum: 0})
+        .execution_options(synchronize_session=False)
+    )
+
+    # Продавцы
+    user_rows = db.query(
+        Review.reviewed_user_id,
+        func.sum(Review.rating),
+        func.count(Review.id),
+        *[func.sum(case((Review.rating == r, 1), else_=0)) for r in range(1, 6)],
+    ).group_by(Review.reviewed_user_id)
+
+    user_stmt = update(User.__table__).where(User.__table__.c.id == bindparam("b_id")).values(
+        rating_sum=bindparam("b_sum"),
+        total_reviews=bindparam("b_count"),
+        rating=bindparam("b_rating"),
+        **{f"rating_{r}_count": bindparam(f"b_r{r}") for r in range(1, 6)},
+    )
+    users_updated = _write_in_batches(db, user_stmt, (
+        {
+            "b_id": user_id,
+            "b_sum": total,
+            "b_count": count,
+            "b_rating": round(total / count, 2),
+            **{f"b_r{r}": histogram[r - 1] for r in range(1, 6)},
+        }
+        for user_id, total, count, *histogram in user_rows.yield_per(RECOMPUTE_BATCH_SIZE)
+    ))
+
+    # Услуги (отзыв привязан к услуге через заказ)
+    service_rows = db.query(
+        Order.service_id,
+        func.sum(Review.rating),
+        func.count(Review.id),
+    ).join(Review, Review.order_id == Order.id).group_by(Order.service_id)
+
+    service_stmt = update(Service.__table__).where(Service.__table__.c.id == bindparam("b_id")).values(
+        rating_sum=bindparam("b_sum"),
+        total_reviews=bindparam("b_count"),
+        average_rating=bindparam("b_rating"),
+    )
+    services_updated = _write_in_batches(db, service_stmt, (
+        {"b_id": service_id, "b_sum": total, "b_count": count, "b_rating": round(total / count, 2)}
+        for service_id, total, count in service_rows.yield_per(RECOMPUTE_BATCH_SIZE)
+    ))
+
+    return {"users": users_updated, "services": services_updated}
+
+
+def _write_in_batches(db: Session, statement, rows) -> int:
+    written = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= RECOMPUTE_BATCH_SIZE:
+            db.connection().execute(statement, batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.connection().execute(statement, batch)
+        written += len(batch)
+    return written
@@ -0,0 +1,184 @@
+"""
+Полнотекстовый поиск по услугам
+
+- SQLite: виртуальная таблица FTS5 `services_fts` (rowid = services.id),
+  синхронизируется из API при создании/изменении/удалении услуги
+- PostgreSQL: генерируемая колонка `services.search_vector` (tsvector, словарь russian)
+  с GIN индексом, обновляется самой БД
+- Остальные БД (или SQLite без FTS5): старый поиск через ILIKE
+"""
+import re
+from sqlalchemy import text, table, column, func, literal_column, false
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, Query
+from app.models import Service, ServiceStatus
+
+FTS_TABLE = "services_fts"
+
+# Веса колонок для bm25: название важнее тегов, теги важнее описания
+_BM25_WEIGHTS = (10.0, 1.0, 5.0)  # title, description, tags
+
+# Окончания для упрощённого русского стемминга (FTS5 не умеет русскую морфологию).
+# В словах запроса отрезается одно окончание, остаток ищется по префиксу:
+# "дизайнера" -> "дизайнер*" (дизайнер, дизайнеры, дизайнерам), "ботов" -> "бот*".
+# Суффиксы не отрезаются: запрос "дизайнера" не найдёт "дизайн"
+_RU_ENDINGS = sorted(
+    [
+        "иями", "ями", "ами", "ией", "ием", "иях", "ого", "его", "ому", "ему",
+        "ыми", "ими", "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой",
+        "ей", "ом", "ем", "ах", "ях", "ов", "ев", "ам", "ям", "ую", "юю",
+        "ия", "ию", "ии", "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+    ],
+    key=len,
+    reverse=True,
+)
+_MIN_STEM_LENGTH = 3
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_POSTGRES_DDL = (
+    """
+    ALTER TABLE services ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_services_search_vector ON services USING GIN (search_vector)",
+)
+
+# Включается в setup_search(), если SQLite собран с FTS5
+_sqlite_fts_enabled = False
+
+
+def _stem(token: str) -> str:
+    """Отрезать типичное окончание (если основа остаётся не короче 3 символов)"""
+    token = token.lower().replace("ё", "е")
+    for ending in _RU_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= _MIN_STEM_LENGTH:
+            return token[:-len(ending)]
+    return token
+
+
+def build_fts_query(q: str) -> str:
+    """
+    Превратить пользовательский запрос в выражение FTS5 MATCH
+
+    Каждое слово стеммится и ищется по префиксу, слова объединяются через AND.
+    Кавычки и операторы FTS5 из запроса отбрасываются токенизацией.
+    """
+    tokens = [_stem(token) for token in _TOKEN_RE.findall(q)]
+    return " ".join(f'"{token}"*' for token in tokens if token)
+
+
+def setup_search(engine: Engine) -> None:
+    """Создать поисковый индекс (вызывается после create_all)"""
+    global _sqlite_fts_enabled
+
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for statement in _POSTGRES_DDL:
+                conn.execute(text(statement))
+        return
+
+    if engine.dialect.name != "sqlite":
+        return
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first()
+        if not exists:
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    "title, description, tags, tokenize = 'unicode61 remove_diacritics 2')"
+                ))
+            except OperationalError:
+                # SQLite без FTS5 - остаёмся на ILIKE
+                _sqlite_fts_enabled = False
+                return
+            _fill_sqlite_index(conn)
+
+    _sqlite_fts_enabled = True
+
+
+def rebuild_search_index(engine: Engine) -> None:
+    """Полностью перестроить индекс SQLite (после массовой загрузки данных в обход API)"""
+    if engine.dialect.name != "sqlite" or not _sqlite_fts_enabled:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        _fill_sqlite_index(conn)
+
+
+def _fill_sqlite_index(conn) -> None:
+    conn.execute(text(
+        f"INSERT INTO {FTS_TABLE}(rowid, title, description, tags) "
+        "SELECT id, title, description, coalesce(tags, '') FROM services"
+    ))
+
+
+def _uses_fts5(db: Session) -> bool:
+    return _sqlite_fts_enabled and db.get_bind().dialect.name == "sqlite"
+
+
+def index_service(db: Session, service: Service) -> None:
+    """Добавить/обновить услугу в индексе (в рамках текущей транзакции)"""
+    if not _uses_fts5(db):
+        return
+    db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": service.id})
+    db.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE}(rowid, title, description, tags) "
+            "VALUES (:id, :title, :description, :tags)"
+        ),
+        {
+            "id": service.id,
+            "title": service.title,
+            "description": service.description,
+            "tags": service.tags or "",
+        },
+    )
+
+
+def unindex_service(db: Session, service_id: int) -> None:
+    """Убрать услугу из индекса (в рамках текущей транзакции)"""
+    if not _uses_fts5(db):
+        return
+    db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": service_id})
+
+
+def search_services_query(db: Session, q: str) -> Query:
+    """
+    Запрос активных услуг по поисковой строке, отсортированный по релевантности
+
+    Пагинацию (offset/limit) добавляет вызывающий код.
+    """
+    query = db.query(Service).filter(Service.status == ServiceStatus.ACTIVE)
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        vector = literal_column("services.search_vector")
+        tsquery = func.websearch_to_tsquery("russian", q)
+        return query.filter(vector.op("@@")(tsquery)).order_by(
+            func.ts_rank(vector, tsquery).desc(), Service.id.desc()
+        )
+
+    if _uses_fts5(db):
+        match = build_fts_query(q)
+        if not match:
+            return query.filter(false())
+        fts = table(FTS_TABLE, column("rowid"))
+        fts_ref = literal_column(FTS_TABLE)
+        return query.join(fts, fts.c.rowid == Service.id).filter(
+            fts_ref.op("MATCH")(match)
+        ).order_by(func.bm25(fts_ref, *_BM25_WEIGHTS), Service.id.desc())
+
+    return query.filter(
+        Service.title.ilike(f"%{q}%") |
+        Service.description.ilike(f"%{q}%") |
+        Service.tags.ilike(f"%{q}%")
+    ).order_by(Service.id.desc())
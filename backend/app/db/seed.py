@@ -0,0 +1,627 @@
+"""
+Массовое заполнение БД согласованными тестовыми данными
+
+Для нагрузочных замеров (benchmarks/, seed_db.py) нужны объёмы, которые
+через API или ORM add() заливаются часами. Здесь строки генерируются и
+пишутся пачками: INSERT компилируется один раз на таблицу и выполняется
+executemany, в PostgreSQL (psycopg2/psycopg) - COPY. id задаются явно
+(1..N), поэтому ссылки между таблицами считаются без чтения из БД.
+
+Данные согласованы так же, как после работы через API:
+- у продавцов - услуги, у заказов - услуга, её продавец и цена с комиссией;
+- оплаченный заказ - эскроу покупателя, завершённый - выплата продавцу;
+- у покупателей - пополнение баланса, балансы сходятся с журналом;
+- отзывы только к завершённым заказам, агрегаты рейтинга пересчитаны;
+- поисковый индекс, фасеты и связи тегов перестроены.
+
+Объёмы - SeedSizes, распределения (доля продавцов, статусы заказов, оценки,
+перекос популярности) - SeedDistribution. Генерация детерминирована: один и
+тот же seed, размеры и распределения дают одни и те же строки. Заполнять
+можно только пустую БД.
+"""
+import csv
+import io
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Optional
+from sqlalchemy import bindparam, insert, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.db.facets import rebuild_service_facets
+from app.db.ratings import recompute_rating_aggregates
+from app.db.search import rebuild_search_index
+from app.db.tags import rebuild_tag_links
+from app.models import (
+    Message,
+    Order,
+    OrderStatus,
+    Review,
+    Service,
+    ServiceStatus,
+    Transaction,
+    TransactionStatus,
+    TransactionType,
+    User,
+)
+from app.types import Money
+
+# Строк в одном executemany
+BATCH_SIZE = 10000
+
+PLATFORM_FEE_PERCENT = 10.0
+
+# Дата, от которой отсчитываются все даты (детерминированно, не от now)
+EPOCH = datetime(2025, 1, 1)
+
+CATEGORIES = {
+    "Программирование": ["python", "django", "fastapi", "telegram", "парсинг", "боты", "api", "sql"],
+    "Дизайн": ["логотип", "figma", "баннер", "иллюстрация", "ui", "брендинг"],
+    "Тексты": ["копирайтинг", "seo", "перевод", "рерайт", "статьи"],
+    "Маркетинг": ["smm", "таргет", "реклама", "seo", "telegram"],
+    "Видео": ["монтаж", "анимация", "reels", "youtube"],
+    "Аудио": ["озвучка", "сведение", "подкаст"],
+}
+TITLES = {
+    "Программирование": ["Разработка телеграм ботов", "Парсер сайтов на Python", "Бэкенд на FastAPI", "Доработка сайта на Django", "Интеграция с API"],
+    "Дизайн": ["Дизайн логотипа", "Макет сайта в Figma", "Баннеры для рекламы", "Иллюстрации для постов"],
+    "Тексты": ["SEO-статьи для сайта", "Перевод текстов", "Продающие тексты", "Рерайт статей"],
+    "Маркетинг": ["Настройка таргета", "Ведение телеграм канала", "Продвижение в соцсетях"],
+    "Видео": ["Монтаж видео для YouTube", "Анимация логотипа", "Монтаж reels"],
+    "Аудио": ["Озвучка роликов", "Сведение подкаста"],
+}
+FIRST_NAMES = ["Алексей", "Мария", "Иван", "Анна", "Дмитрий", "Елена", "Сергей", "Ольга", "Павел", "Наталья"]
+LAST_NAMES = ["Иванов", "Смирнова", "Кузнецов", "Попова", "Соколов", "Лебедева", "Новиков", "Морозова"]
+MESSAGE_TEXTS = [
+    "Здравствуйте! Когда сможете приступить?",
+    "Добрый день, приступаю сегодня",
+    "Прислал первый вариант, посмотрите",
+    "Поправьте, пожалуйста, цвета",
+    "Готово, проверьте результат",
+    "Спасибо, всё отлично!",
+]
+REVIEW_TEXTS = ["Отличная работа", "Всё сделано в срок", "Нормально", "Долго, но результат хороший", None]
+
+# Доли заказов по статусам и отзывов по оценкам (по умолчанию)
+ORDER_STATUS_WEIGHTS = {
+    OrderStatus.COMPLETED: 60,
+    OrderStatus.IN_PROGRESS: 10,
+    OrderStatus.UNDER_REVIEW: 5,
+    OrderStatus.WAITING_PAYMENT: 10,
+    OrderStatus.CANCELLED: 10,
+    OrderStatus.DISPUTE: 5,
+}
+RATING_WEIGHTS = {5: 60, 4: 20, 3: 10, 2: 5, 1: 5}
+
+SEEDED_MODELS = (User, Service, Order, Message, Review, Transaction)
+
+PAID_STATUSES = {OrderStatus.COMPLETED, OrderStatus.IN_PROGRESS, OrderStatus.UNDER_REVIEW, OrderStatus.DISPUTE}
+
+
+@dataclass(frozen=True)
+class SeedSizes:
+    """Сколько строк создать"""
+    users: int = 1000
+    services: int = 5000
+    orders: int = 50000
+    messages: int = 50000  # Всего, распределяются по заказам
+
+
+@dataclass(frozen=True)
+class SeedDistribution:
+    """Как распределены данные"""
+    seller_share: float = 0.2  # Доля пользователей с услугами
+    active_service_share: float = 0.9
+    review_share: float = 0.7  # Доля завершённых заказов с отзывом
+    popularity_skew: float = 2.0  # 1 - продавцы и услуги равновероятны, больше - заказы липнут к популярным
+    max_messages_per_order: int = 50
+    min_price: int = 500  # Руб.
+    max_price: int = 100_000
+    history_days: int = 365
+    order_status_weights: dict = field(default_factory=lambda: dict(ORDER_STATUS_WEIGHTS))
+    rating_weights: dict = field(default_factory=lambda: dict(RATING_WEIGHTS))
+
+    def __post_init__(self):
+        for name in ("seller_share", "active_service_share", "review_share"):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f"{name} должна быть от 0 до 1")
+        if self.popularity_skew <= 0:
+            raise ValueError("popularity_skew должен быть больше 0")
+        if not 100 <= self.min_price <= self.max_price:
+            raise ValueError("Цены: нужно 100 <= min_price <= max_price")
+        for name, weights, allowed in (
+            ("order_status_weights", self.order_status_weights, ORDER_STATUS_WEIGHTS),
+            ("rating_weights", self.rating_weights, RATING_WEIGHTS),
+        ):
+            if set(weights) - set(allowed):
+                raise ValueError(f"{name}: допустимы только {', '.join(str(getattr(key, 'value', key)) for key in allowed)}")
+            if any(weight < 0 for weight in weights.values()) or not sum(weights.values()):
+                raise ValueError(f"{name}: веса неотрицательные и не все нулевые")
+
+
+class SeedError(Exception):
+    """Заполнить БД нельзя (например, она не пустая)"""
+
+
+def _skewed(rng: random.Random, count: int, skew: float) -> int:
+    """Индекс 0..count-1, при skew > 1 чаще маленькие (популярные продавцы и услуги)"""
+    return int(count * rng.random() ** skew)
+
+
+def _at(rng: random.Random, start: datetime, days: float) -> datetime:
+    return start + timedelta(seconds=int(rng.random() * days * 86400))
+
+
+def _copy_value(value):
+    # Значение для CSV в COPY (NULL пишется как \N)
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+class _BulkWriter:
+    """
+    Пачки строк одной таблицы
+
+    core insert() на каждой пачке заново компилирует запрос и собирает
+    параметры каждой строки - на миллионах строк это дольше самой записи.
+    Здесь INSERT компилируется один раз по колонкам первой строки, значения
+    проходят те же bind-процессоры типов (MoneyType, DateTime, Enum), что и
+    в ORM, и уходят в драйвер кортежами. Недостающие колонки получают
+    скалярный default модели.
+
+    dependents - таблицы, ссылающиеся на эту (сообщения заказа): они копятся
+    без ограничения и пишутся сразу после каждой пачки этой таблицы, чтобы
+    внешние ключи в PostgreSQL всегда указывали на уже записанные строки.
+    """
+
+    def __init__(self, conn: Connection, table, dependents: tuple = (), autoflush: bool = True):
+        self.conn = conn
+        self.table = table
+        self.dependents = dependents
+        self.autoflush = autoflush
+        self.rows: list[dict] = []
+        self.written = 0
+        self._fields: Optional[list[tuple]] = None
+        self._sql: Optional[str] = None
+        self._positional = False
+        self._copy_sql: Optional[str] = None
+
+    def add(self, row: dict) -> None:
+        self.rows.append(row)
+        if self.autoflush and len(self.rows) >= BATCH_SIZE:
+            self.flush()
+
+    def close(self) -> int:
+        """Записать остаток, вернуть сколько строк записано всего"""
+        self.flush()
+        return self.written
+
+    def _prepare(self, first_row: dict) -> None:
+        dialect = self.conn.dialect
+        columns = [column for column in self.table.c if column.key in first_row]
+        for column in self.table.c:
+            if column.key in first_row or column.default is None:
+                continue
+            if not column.default.is_scalar:
+                raise ValueError(f"{self.table.name}.{column.key}: значение нужно задать в генераторе")
+            columns.append(column)
+
+        self._fields = [
+            (column.key, column.type.dialect_impl(dialect).bind_processor(dialect),
+             column.default.arg if column.default is not None else None)
+            for column in columns
+        ]
+        if dialect.name == "postgresql" and dialect.driver in ("psycopg2", "psycopg"):
+            preparer = dialect.identifier_preparer
+            self._copy_sql = (
+                f"COPY {preparer.format_table(self.table)} "
+                f"({', '.join(preparer.format_column(column) for column in columns)}) "
+                f"FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+            )
+            return
+
+        compiled = insert(self.table).compile(dialect=dialect, column_keys=[column.key for column in columns])
+        self._sql = str(compiled)
+        self._positional = compiled.positional
+        if compiled.positional:
+            positions = {key: index for index, key in enumerate(compiled.positiontup)}
+            self._fields.sort(key=lambda item: positions[item[0]])
+
+    def flush(self) -> None:
+        if self.rows:
+            if self._fields is None:
+                self._prepare(self.rows[0])
+            for start in range(0, len(self.rows), BATCH_SIZE):
+                self._execute(self.rows[start:start + BATCH_SIZE])
+            self.written += len(self.rows)
+            self.rows = []
+        for dependent in self.dependents:
+            dependent.flush()
+
+    def _execute(self, rows: list[dict]) -> None:
+        values = [
+            tuple([process(row.get(key, default)) if process else row.get(key, default) for key, process, default in self._fields])
+            for row in rows
+        ]
+        if self._copy_sql:
+            self._copy(values)
+        elif self._positional:
+            self.conn.exec_driver_sql(self._sql, values)
+        else:
+            keys = [key for key, _, _ in self._fields]
+            self.conn.exec_driver_sql(self._sql, [dict(zip(keys, row)) for row in values])
+
+    def _copy(self, values: list[tuple]) -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for row in values:
+            writer.writerow([_copy_value(value) for value in row])
+        cursor = self.conn.connection.cursor()
+        try:
+            if hasattr(cursor, "copy_expert"):
+                buffer.seek(0)
+                cursor.copy_expert(self._copy_sql, buffer)  # psycopg2
+            else:
+                with cursor.copy(self._copy_sql) as copy:  # psycopg 3
+                    copy.write(buffer.getvalue())
+        finally:
+            cursor.close()
+
+
+def _write(conn: Connection, table, rows: Iterator[dict]) -> int:
+    """Записать все строки пачками по BATCH_SIZE"""
+    writer = _BulkWriter(conn, table)
+    for row in rows:
+        writer.add(row)
+    return writer.close()
+
+
+class _Generator:
+    """Строки всех таблиц; накапливает то, что нужно для согласованности"""
+
+    def __init__(self, sizes: SeedSizes, distribution: SeedDistribution, seed: int):
+        self.sizes = sizes
+        self.distribution = distribution
+        self.rng = random.Random(seed)
+        self.sellers = max(1, int(sizes.users * distribution.seller_share))
+        self.user_created: list[datetime] = []
+        # Копейки по пользователям (индекс - id)
+        self.spent = [0] * (sizes.users + 1)
+        self.earned = [0] * (sizes.users + 1)
+        self.completed = [0] * (sizes.users + 1)
+        self.service_seller: list[int] = [0]
+        self.service_price: list[int] = [0]
+        self.service_days: list[int] = [0]
+        self.service_created: list[datetime] = [EPOCH]
+        self.active_services: list[int] = []
+        self.service_completed = [0] * (sizes.services + 1)
+        self.next_transaction_id = 1
+        self.next_message_id = 1
+        self.next_review_id = 1
+
+    def users(self) -> Iterator[dict]:
+        rng = self.rng
+        all_tags = sorted({tag for tags in CATEGORIES.values() for tag in tags})
+        for user_id in range(1, self.sizes.users + 1):
+            created_at = _at(rng, EPOCH, self.distribution.history_days / 2)
+            self.user_created.append(created_at)
+            is_seller = user_id <= self.sellers
+            yield {
+                "id": user_id,
+                "telegram_id": 100_000_000 + user_id,
+                "telegram_username": f"user{user_id}",
+                "first_name": rng.choice(FIRST_NAMES),
+                "last_name": rng.choice(LAST_NAMES),
+                "bio": "Фрилансер" if is_seller else None,
+                "skills": ",".join(rng.sample(all_tags, rng.randint(1, 4))) if is_seller else None,
+                "is_active": True,
+                "is_banned": False,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "last_active": created_at,
+            }
+
+    def services(self) -> Iterator[dict]:
+        rng = self.rng
+        distribution = self.distribution
+        categories = list(CATEGORIES)
+        for service_id in range(1, self.sizes.services + 1):
+            seller_id = _skewed(rng, self.sellers, distribution.popularity_skew) + 1
+            category = rng.choice(categories)
+            price = rng.randint(distribution.min_price // 100, distribution.max_price // 100) * 10000  # Кратно 100 руб.
+            days = rng.choice([1, 3, 5, 7, 14])
+            created_at = _at(rng, self.user_created[seller_id - 1], distribution.history_days / 2)
+            active = rng.random() < distribution.active_service_share
+            self.service_seller.append(seller_id)
+            self.service_price.append(price)
+            self.service_days.append(days)
+            self.service_created.append(created_at)
+            if active:
+                self.active_services.append(service_id)
+            yield {
+                "id": service_id,
+                "seller_id": seller_id,
+                "title": f"{rng.choice(TITLES[category])} #{service_id}",
+                "description": f"{rng.choice(TITLES[category])}. Сделаю качественно и в срок",
+                "category": category,
+                "tags": ",".join(rng.sample(CATEGORIES[category], rng.randint(1, 3))),
+                "price": Money.from_kopecks(price),
+                "execution_days": days,
+                "revision_count": 2,
+                "status": ServiceStatus.ACTIVE if active else rng.choice([ServiceStatus.PENDING, ServiceStatus.HIDDEN]),
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+
+    def orders(self, on_order: Callable[[dict], None]) -> Iterator[dict]:
+        """Заказы; для каждого вызывается on_order (транзакции, сообщения, отзыв)"""
+        rng = self.rng
+        skew = self.distribution.popularity_skew
+        statuses = list(self.distribution.order_status_weights)
+        weights = list(self.distribution.order_status_weights.values())
+        services = self.active_services or [1]
+        for order_id in range(1, self.sizes.orders + 1):
+            service_id = services[_skewed(rng, len(services), skew)]
+            seller_id = self.service_seller[service_id]
+            buyer_id = rng.randint(1, self.sizes.users)
+            if buyer_id == seller_id:
+                buyer_id = buyer_id % self.sizes.users + 1
+            status = rng.choices(statuses, weights)[0]
+            price = self.service_price[service_id]
+            fee = Money.from_kopecks(price).percent(PLATFORM_FEE_PERCENT).kopecks
+            created_at = _at(rng, max(self.service_created[service_id], self.user_created[buyer_id - 1]), 30)
+            paid = status in PAID_STATUSES
+            payment_date = created_at + timedelta(minutes=rng.randint(1, 600)) if paid else None
+            completed_at = payment_date + timedelta(days=rng.randint(1, 14)) if status == OrderStatus.COMPLETED else None
+            deadline = None
+            if status in (OrderStatus.IN_PROGRESS, OrderStatus.UNDER_REVIEW):
+                deadline = payment_date + timedelta(days=self.service_days[service_id])
+            order = {
+                "id": order_id,
+                "buyer_id": buyer_id,
+                "seller_id": seller_id,
+                "service_id": service_id,
+                "price": Money.from_kopecks(price),
+                "platform_fee_percent": PLATFORM_FEE_PERCENT,
+                "seller_gets": Money.from_kopecks(price - fee),
+                "is_paid": paid,
+                "payment_date": payment_date,
+                "status": status,
+                "deadline": deadline,
+                "buyer_comment": "Нужно сделать по ТЗ",
+                "revisions_used": 0,
+                "revisions_allowed": 2,
+                "created_at": created_at,
+                "completed_at": completed_at,
+                "updated_at": completed_at or payment_date or created_at,
+            }
+            if paid:
+                self.spent[buyer_id] += price
+            if status == OrderStatus.COMPLETED:
+                self.earned[seller_id] += price - fee
+                self.completed[seller_id] += 1
+                self.service_completed[service_id] += 1
+            on_order(order)
+            yield order
+
+    def order_transactions(self, order: dict) -> list[dict]:
+        rows = []
+        if order["is_paid"]:
+            rows.append(self._transaction(
+                order["buyer_id"], order["id"], TransactionType.ORDER_ESCROW, order["price"],
+                "Эскроу для заказа", order["payment_date"],
+            ))
+        if order["status"] == OrderStatus.COMPLETED:
+            rows.append(self._transaction(
+                order["seller_id"], order["id"], TransactionType.ORDER_RELEASE, order["seller_gets"],
+                "Выплата за завершённый заказ", order["completed_at"],
+            ))
+        return rows
+
+    def _transaction(self, user_id: int, order_id: Optional[int], tx_type: TransactionType,
+                     amount: Money, description: str, at: datetime) -> dict:
+        transaction_id = self.next_transaction_id
+        self.next_transaction_id += 1
+        return {
+            "id": transaction_id,
+            "user_id": user_id,
+            "order_id": order_id,
+            "type": tx_type,
+            "amount": amount,
+            "status": TransactionStatus.COMPLETED,
+            "description": description,
+            "created_at": at,
+            "completed_at": at,
+        }
+
+    def order_messages(self, order: dict, count: int) -> list[dict]:
+        rng = self.rng
+        rows = []
+        at = order["created_at"]
+        for index in range(count):
+            at = at + timedelta(minutes=rng.randint(1, 240))
+            rows.append({
+                "id": self.next_message_id,
+                "order_id": order["id"],
+                "author_id": order["buyer_id"] if index % 2 == 0 else order["seller_id"],
+                "text": rng.choice(MESSAGE_TEXTS),
+                "is_edited": False,
+                "is_deleted": False,
+                "created_at": at,
+            })
+            self.next_message_id += 1
+        return rows
+
+    def order_review(self, order: dict) -> Optional[dict]:
+        rng = self.rng
+        ratings = self.distribution.rating_weights
+        if order["status"] != OrderStatus.COMPLETED or rng.random() >= self.distribution.review_share:
+            return None
+        review = {
+            "id": self.next_review_id,
+            "order_id": order["id"],
+            "reviewer_id": order["buyer_id"],
+            "reviewed_user_id": order["seller_id"],
+            "rating": rng.choices(list(ratings), list(ratings.values()))[0],
+            "text": rng.choice(REVIEW_TEXTS),
+            "created_at": order["completed_at"] + timedelta(hours=rng.randint(1, 72)),
+        }
+        self.next_review_id += 1
+        return review
+
+    def top_ups(self) -> Iterator[dict]:
+        """Пополнение каждому покупателю: потраченное плюс остаток"""
+        rng = self.rng
+        for user_id in range(1, self.sizes.users + 1):
+            if self.spent[user_id]:
+                amount = self.spent[user_id] + rng.randint(0, 100) * 10000
+                yield self._transaction(
+                    user_id, None, TransactionType.BALANCE_TOP_UP, Money.from_kopecks(amount),
+                    "Пополнение баланса", self.user_created[user_id - 1],
+                )
+
+
+def _ensure_empty(db: Session) -> None:
+    for model in SEEDED_MODELS:
+        if db.query(model.id).first() is not None:
+            raise SeedError(f"Таблица {model.__tablename__} не пустая - заполнять можно только пустую БД")
+
+
+def _drop_secondary_indexes(conn: Connection) -> list:
+    # Неуникальный индекс быстрее построить один раз по заполненной таблице,
+    # чем обновлять на каждой вставке; уникальные остаются - они проверяют данные
+    dropped = []
+    for model in SEEDED_MODELS:
+        for index in sorted(model.__table__.indexes, key=lambda index: index.name):
+            if not index.unique:
+                index.drop(conn, checkfirst=True)
+                dropped.append(index)
+    return dropped
+
+
+def _reset_sequences(db: Session) -> None:
+    # id заданы явно - в PostgreSQL сдвигаем последовательности за них
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for model in SEEDED_MODELS:
+        table = model.__tablename__
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 1)) FROM {table}"
+        ))
+
+
+def seed_database(engine: Engine, sizes: SeedSizes, seed: int = 42,
+                  distribution: Optional[SeedDistribution] = None,
+                  progress: Optional[Callable[[str, int], None]] = None) -> dict[str, int]:
+    """
+    Заполнить пустую БД, вернуть количество строк по таблицам
+
+    progress(таблица, строк) вызывается после каждой таблицы.
+    """
+    report = progress or (lambda table, count: None)
+    distribution = distribution or SeedDistribution()
+    generator = _Generator(sizes, distribution, seed)
+    counts: dict[str, int] = {}
+
+    with Session(engine) as db:
+        _ensure_empty(db)
+        conn = db.connection()
+        indexes = _drop_secondary_indexes(conn)
+
+        counts["users"] = _write(conn, User.__table__, generator.users())
+        report("users", counts["users"])
+        counts["services"] = _write(conn, Service.__table__, generator.services())
+        report("services", counts["services"])
+
+        # Сообщения, транзакции и отзывы пишутся после каждой пачки заказов
+        per_order = sizes.messages / max(1, sizes.orders)
+        max_messages = distribution.max_messages_per_order
+        messages = _BulkWriter(conn, Message.__table__, autoflush=False)
+        transactions = _BulkWriter(conn, Transaction.__table__, autoflush=False)
+        reviews = _BulkWriter(conn, Review.__table__, autoflush=False)
+        orders = _BulkWriter(conn, Order.__table__, dependents=(messages, transactions, reviews))
+
+        def on_order(order: dict) -> None:
+            count = min(round(generator.rng.expovariate(1 / per_order)), max_messages) if per_order else 0
+            for row in generator.order_messages(order, count):
+                messages.add(row)
+            for row in generator.order_transactions(order):
+                transactions.add(row)
+            review = generator.order_review(order)
+            if review is not None:
+                reviews.add(review)
+
+        for order in generator.orders(on_order):
+            orders.add(order)
+        counts["orders"] = orders.close()
+        report("orders", counts["orders"])
+        for row in generator.top_ups():
+            transactions.add(row)
+        for name, writer in (("messages", messages), ("transactions", transactions), ("reviews", reviews)):
+            counts[name] = writer.close()
+            report(name, counts[name])
+
+        # Балансы и счётчики - из накопленных сумм, как их вёл бы журнал
+        top_ups = dict(db.query(Transaction.user_id, Transaction.amount).filter(
+            Transaction.type == TransactionType.BALANCE_TOP_UP
+        ).all())
+        _update_users(db, generator, top_ups)
+        _update_services(db, generator.service_completed)
+        for index in indexes:
+            index.create(conn)
+
+        _reset_sequences(db)
+        recompute_rating_aggregates(db)
+        rebuild_service_facets(db)
+        rebuild_tag_links(db)
+        _restore_updated_at(db)
+        db.commit()
+
+    rebuild_search_index(engine)
+    return counts
+
+
+def _update_users(db: Session, generator: _Generator, top_ups: dict[int, Money]) -> None:
+    table = User.__table__
+    statement = table.update().where(table.c.id == bindparam("b_id")).values(
+        balance=bindparam("b_balance"),
+        total_spent=bindparam("b_spent"),
+        total_earned=bindparam("b_earned"),
+        completed_orders=bindparam("b_completed"),
+    )
+    rows = []
+    for user_id in range(1, generator.sizes.users + 1):
+        spent, earned = generator.spent[user_id], generator.earned[user_id]
+        if not spent and not earned:
+            continue
+        top_up = top_ups.get(user_id, Money(0)).kopecks
+        rows.append({
+            "b_id": user_id,
+            "b_balance": Money.from_kopecks(top_up - spent + earned),
+            "b_spent": Money.from_kopecks(spent),
+            "b_earned": Money.from_kopecks(earned),
+            "b_completed": generator.completed[user_id],
+        })
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.connection().execute(statement, rows[start:start + BATCH_SIZE])
+
+
+def _update_services(db: Session, completed: list[int]) -> None:
+    table = Service.__table__
+    statement = table.update().where(table.c.id == bindparam("b_id")).values(total_orders=bindparam("b_total"))
+    rows = [{"b_id": service_id, "b_total": count} for service_id, count in enumerate(completed) if count]
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.connection().execute(statement, rows[start:start + BATCH_SIZE])
+
+
+def _restore_updated_at(db: Session) -> None:
+    # UPDATE счётчиков и агрегатов проставили updated_at = now (onupdate) -
+    # возвращаем даты генератора, чтобы строки не зависели от времени заполнения
+    for model in (User, Service):
+        table = model.__table__
+        db.connection().execute(table.update().values(updated_at=table.c.created_at))
@@ -1,8 +1,12 @@
 """
 Инициализация БД и сессии
+
+Маршруты API объявлены через обычный `def`: FastAPI выполняет их в пуле потоков,
+поэтому синхронные запросы к БД не блокируют event loop. Количество
+одновременных запросов к БД ограничивается пулом соединений ниже.
 """
 from typing import Generator
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import get_settings
 from app.db.base import Base
@@ -11,10 +15,38 @@ settings = get_settings()
 
 # Создание engine и SessionLocal
 DATABASE_URL = settings.database_url
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+
+
+def _engine_options(url: str) -> dict:
+    """Параметры create_engine для выбранной БД"""
+    if url.startswith("sqlite"):
+        # SQLite: один писатель, остальные ждут блокировку не дольше busy timeout
+        return {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": settings.sqlite_busy_timeout,
+            },
+        }
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL: читатели не блокируются пишущей транзакцией
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -37,7 +69,18 @@ def init_db():
         Message,
         Review,
         Transaction,
+        ServiceFacet,
+        Tag,
+        BalanceSnapshot,
+        JobLease,
+        OutboxEvent,
+        Notification,
     )
     
-    # Создаём таблицы
+    from app.db.migrations import upgrade_schema
+    from app.db.search import setup_search
+    
+    # Создаём таблицы, новые колонки/индексы и поисковый индекс
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    setup_search(engine)
@@ -0,0 +1,139 @@
+"""
+Нормализованные теги услуг и навыки пользователей
+
+Service.tags и User.skills хранятся строкой через запятую (так их отдаёт
+API), а для поиска по тегам ведутся таблицы связей service_tags и
+user_skills. Связи пересобираются в той же транзакции, что и запись строки.
+
+Пересечение тегов ("python И telegram") - это поиск по первичному ключу
+(tag_id, owner_id) для каждого тега и GROUP BY ... HAVING COUNT = n.
+"""
+from typing import Optional
+from sqlalchemy import Table, delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+from app.db.facets import split_tags
+from app.models import Service, ServiceStatus, Tag, User, service_tags, user_skills
+
+# Максимум тегов в одном фильтре пересечения
+MAX_TAG_FILTER = 10
+
+# Размер пачки executemany при пересборке связей
+LINK_BATCH_SIZE = 1000
+
+
+def tag_ids(db: Session, names: list[str]) -> dict[str, int]:
+    """ID тегов по именам, отсутствующие теги создаются"""
+    if not names:
+        return {}
+
+    dialect = db.get_bind().dialect.name
+    insert_tag = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    existing = dict(db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    missing = [name for name in names if name not in existing]
+    if missing:
+        # ON CONFLICT: тот же тег мог создать параллельный запрос
+        db.execute(
+            insert_tag(Tag).on_conflict_do_nothing(index_elements=[Tag.name]),
+            [{"name": name} for name in missing]
+        )
+        existing.update(db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing))).all())
+    return existing
+
+
+def _owner_column(links: Table):
+    return links.c.service_id if links is service_tags else links.c.user_id
+
+
+def _set_links(db: Session, links: Table, owner_id: int, value: Optional[str]) -> None:
+    owner = _owner_column(links)
+    db.execute(delete(links).where(owner == owner_id))
+    ids = tag_ids(db, split_tags(value))
+    if ids:
+        db.execute(insert(links), [
+            {owner.name: owner_id, "tag_id": tag_id} for tag_id in ids.values()
+        ])
+
+
+def set_service_tags(db: Session, service_id: int, tags: Optional[str]) -> None:
+    """Пересобрать теги услуги по строке тегов"""
+    _set_links(db, service_tags, service_id, tags)
+
+
+def set_user_skills(db: Session, user_id: int, skills: Optional[str]) -> None:
+    """Пересобрать навыки пользователя по строке навыков"""
+    _set_links(db, user_skills, user_id, skills)
+
+
+def _having_all_tags(links: Table, names: list[str]):
+    """Подзапрос ID владельцев, у которых есть все перечисленные теги"""
+    owner = _owner_column(links)
+    return (
+        select(owner)
+        .join(Tag, Tag.id == links.c.tag_id)
+        .where(Tag.name.in_(names))
+        .group_by(owner)
+        .having(func.count() == len(names))
+    )
+
+
+def services_with_tags_query(db: Session, tags: list[str]) -> Query:
+    """Активные услуги, у которых есть все теги (теги уже нормализованы)"""
+    return db.query(Service).filter(
+        Service.status == ServiceStatus.ACTIVE,
+        Service.id.in_(_having_all_tags(service_tags, tags))
+    )
+
+
+def users_with_skills_query(db: Session, skills: list[str]) -> Query:
+    """Активные пользователи, у которых есть все навыки (навыки уже нормализованы)"""
+    return db.query(User).filter(
+        User.is_active == True,
+        User.is_banned == False,
+        User.id.in_(_having_all_tags(user_skills, skills))
+    )
+
+
+def _rebuild_links(db: Session, links: Table, rows) -> int:
+    owner = _owner_column(links)
+    db.execute(delete(links))
+
+    owner_tags = [(owner_id, split_tags(value)) for owner_id, value in rows]
+    ids = tag_ids(db, list(dict.fromkeys(name for _, names in owner_tags for name in names)))
+    mappings = [
+        {owner.name: owner_id, "tag_id": ids[name]}
+        for owner_id, names in owner_tags
+        for name in names
+    ]
+    for start in range(0, len(mappings), LINK_BATCH_SIZE):
+        db.execute(insert(links), mappings[start:start + LINK_BATCH_SIZE])
+    return len(mappings)
+
+
+def rebuild_tag_links(db: Session) -> dict:
+    """Разложить строки Service.tags и User.skills по таблицам связей заново"""
+    service_rows = db.query(Service.id, Service.tags).filter(Service.tags.isnot(None)).all()
+    user_rows = db.query(User.id, User.skills).filter(User.skills.isnot(None)).all()
+    return {
+        "service_tags": _rebuild_links(db, service_tags, service_rows),
+        "user_skills": _rebuild_links(db, user_skills, user_rows),
+        "tags": db.query(func.count(Tag.id)).scalar(),
+    }
+
+
+def ensure_tag_links(engine: Engine) -> None:
+    """Заполнить связи при первом запуске на БД, где теги были только строками"""
+    with Session(engine) as db:
+        has_links = (
+            db.execute(select(service_tags.c.tag_id).limit(1)).first() is not None or
+            db.execute(select(user_skills.c.tag_id).limit(1)).first() is not None
+        )
+        has_strings = (
+            db.query(Service.id).filter(Service.tags.isnot(None), Service.tags != "").first() is not None or
+            db.query(User.id).filter(User.skills.isnot(None), User.skills != "").first() is not None
+        )
+        if has_strings and not has_links:
+            rebuild_tag_links(db)
+            db.commit()
@@ -0,0 +1,123 @@
+"""
+Переходы статусов заказа
+
+Разрешённые переходы описаны таблицей ORDER_TRANSITIONS (app/models/order.py).
+Переход - один условный UPDATE orders ... WHERE status = :expected (CAS):
+если статус уже сменил параллельный запрос или планировщик, UPDATE ничего
+не запишет, и переход не состоится. Вместе с переходом в той же транзакции
+пишется событие order.<статус> в outbox; побочные эффекты (выплата
+продавцу, уведомления) выполняют обработчики событий ORDER_EVENT_HANDLERS.
+
+Повтор уже выполненного перехода ничего не пишет.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.db.ledger import release_order
+from app.db.outbox import EventHandlers, enqueue_events
+from app.models import ORDER_TRANSITIONS, Order, OrderActor, OrderStatus, OutboxEvent
+
+
+class TransitionNotAllowed(Exception):
+    """Переход отсутствует в таблице или недоступен этому участнику"""
+
+
+def event_type(status: OrderStatus) -> str:
+    """Тип события перехода в статус"""
+    return f"order.{status.value}"
+
+
+def check_transition(from_status: OrderStatus, to_status: OrderStatus, actor: OrderActor) -> None:
+    """Проверить переход по таблице, TransitionNotAllowed если он запрещён"""
+    actors = ORDER_TRANSITIONS.get((from_status, to_status))
+    if actors is None:
+        raise TransitionNotAllowed(f"Нельзя перевести заказ из статуса {from_status.value} в {to_status.value}")
+    if actor not in actors:
+        raise TransitionNotAllowed(f"Вы не можете перевести заказ в статус {to_status.value}")
+
+
+def _transition_values(order: Optional[Order], from_status: OrderStatus, to_status: OrderStatus, now: datetime) -> dict:
+    """Поля, которые меняются вместе со статусом"""
+    values = {"status": to_status, "updated_at": now}
+    if to_status == OrderStatus.COMPLETED:
+        values["completed_at"] = now
+    elif to_status == OrderStatus.UNDER_REVIEW:
+        # Срок этапа: ответ заказчика, после него - автоматическое завершение
+        values["deadline"] = now + timedelta(days=get_settings().order_review_days)
+    elif to_status == OrderStatus.IN_PROGRESS and from_status != OrderStatus.WAITING_PAYMENT:
+        # Доработка: новый срок сдачи (при оплате срок ставит pay_order)
+        values["deadline"] = now + timedelta(days=order.service.execution_days)
+        values["overdue_notified_at"] = None
+        if from_status == OrderStatus.UNDER_REVIEW:
+            values["revisions_used"] = Order.revisions_used + 1
+    return values
+
+
+def record_transitions(db: Session, order_ids: list[int], from_status: OrderStatus, to_status: OrderStatus,
+                       actor: OrderActor) -> None:
+    """Записать события выполненных переходов (в транзакции перехода)"""
+    enqueue_events(db, event_type(to_status), order_ids, {
+        "from": from_status.value, "to": to_status.value, "actor": actor.value,
+    })
+
+
+def transition_order(db: Session, order: Order, to_status: OrderStatus, actor: OrderActor) -> bool:
+    """
+    Перевести заказ в статус (в текущей транзакции)
+
+    True - переход выполнен; False - заказ уже в этом статусе или статус
+    только что сменил другой запрос (ничего не записано).
+    """
+    from_status = order.status
+    if from_status == to_status:
+        return False
+    check_transition(from_status, to_status, actor)
+    now = datetime.utcnow()
+
+    changed = db.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.status == from_status)
+        .values(**_transition_values(order, from_status, to_status, now))
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    if changed:
+        record_transitions(db, [order.id], from_status, to_status, actor)
+    return changed
+
+
+def transition_orders(db: Session, order_ids: list[int], from_status: OrderStatus, to_status: OrderStatus,
+                      *conditions, actor: OrderActor = OrderActor.SYSTEM) -> list[int]:
+    """
+    Перевести пачку заказов одним UPDATE ... RETURNING (в текущей транзакции)
+
+    Переводятся только заказы, всё ещё находящиеся в from_status (и
+    подходящие под conditions); возвращает их ID. Только для переходов,
+    которым не нужны данные самого заказа (в completed и dispute).
+    """
+    if not order_ids:
+        return []
+    check_transition(from_status, to_status, actor)
+    now = datetime.utcnow()
+
+    result = db.execute(
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.status == from_status, *conditions)
+        .values(**_transition_values(None, from_status, to_status, now))
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    )
+    changed = [order_id for (order_id,) in result]
+    record_transitions(db, changed, from_status, to_status, actor)
+    return changed
+
+
+def _release(db: Session, event: OutboxEvent) -> None:
+    release_order(db, db.get(Order, event.order_id))
+
+
+# Денежные побочные эффекты переходов (уведомления - app/db/notifications.py)
+ORDER_EVENT_HANDLERS: EventHandlers = {
+    event_type(OrderStatus.COMPLETED): [_release],
+}
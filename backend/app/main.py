@@ -1,12 +1,27 @@
 """
 FastAPI приложение TgWork
 """
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from app.db.base import Base
 from app.db.session import engine
-from app.api import users_router, services_router, orders_router, messages_router, reviews_router
+from app.db.migrations import upgrade_schema
+from app.db.search import setup_search
+from app.db.facets import ensure_service_facets
+from app.db.tags import ensure_tag_links
+from app.core.cache import cache
+from app.core.activity import activity_tracker
+from app.core.config import get_settings
+from app.core.scheduler import scheduler
+from app.core.notifier import notifier
+from app.core.security import actor_guard, owner_guard
+from app.core.ratelimit import RateLimitMiddleware, rate_limiter
+from app.core.metrics import MetricsMiddleware, instrument_engine, metrics
+from app.api.pagination import NEXT_CURSOR_HEADER
+from app.api.messages import SYNC_EDITED_AFTER_ID_HEADER, SYNC_SINCE_ID_HEADER, SYNC_UPDATED_SINCE_HEADER
+from app.api import users_router, services_router, orders_router, messages_router, reviews_router, statements_router, auth_router
 
 app = FastAPI(
     title="TgWork API",
@@ -18,11 +33,39 @@ app = FastAPI(
 @app.on_event("startup")
 async def startup():
     # Импортируем модели чтобы они зарегистрировались в Base
-    from app.models import User, Service, Order, Message, Review, Transaction
+    from app.models import User, Service, Order, Message, Review, Transaction, ServiceFacet, Tag, BalanceSnapshot, JobLease, OutboxEvent, Notification
     
     # Создаём таблицы
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    setup_search(engine)
+    ensure_service_facets(engine)
+    ensure_tag_links(engine)
     print("✓ База данных инициализирована")
+    
+    activity_tracker.start()
+    if get_settings().scheduler_enabled:
+        scheduler.start()
+    else:
+        print("⚠ Планировщик выключен: события outbox (выплаты продавцам) обрабатывает только notification_worker.py")
+    if get_settings().notification_worker_in_app:
+        notifier.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    scheduler.stop()
+    await notifier.stop()
+    # Дописываем накопленные отметки активности
+    await activity_tracker.stop()
+
+# Метрики запросов и SQL (внутри ограничения частоты: отказы 429 считает оно)
+if get_settings().metrics_enabled:
+    instrument_engine(engine)
+    app.add_middleware(MetricsMiddleware)
+
+# Ограничение частоты запросов (до CORS, чтобы у ответов 429 были CORS-заголовки)
+app.add_middleware(RateLimitMiddleware)
 
 # CORS middleware
 origins = [
@@ -39,14 +82,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "Retry-After", NEXT_CURSOR_HEADER,
+        SYNC_SINCE_ID_HEADER, SYNC_UPDATED_SINCE_HEADER, SYNC_EDITED_AFTER_ID_HEADER,
+    ],
 )
 
 # Подключаем все маршруты
+# (buyer_id/seller_id/... в query и свой user_id в пути сверяются с токеном сессии)
+app.include_router(auth_router)
 app.include_router(users_router)
-app.include_router(services_router)
-app.include_router(orders_router)
-app.include_router(messages_router)
-app.include_router(reviews_router)
+app.include_router(services_router, dependencies=[Depends(actor_guard)])
+app.include_router(orders_router, dependencies=[Depends(actor_guard)])
+app.include_router(messages_router, dependencies=[Depends(actor_guard)])
+app.include_router(reviews_router, dependencies=[Depends(actor_guard)])
+app.include_router(statements_router, dependencies=[Depends(owner_guard)])
 
 
 @app.get("/")
@@ -55,6 +105,7 @@ async def root():
         "message": "TgWork API v0.1.0",
         "status": "ready",
         "endpoints": {
+            "auth": "/api/v1/auth",
             "users": "/api/v1/users",
             "services": "/api/v1/services",
             "orders": "/api/v1/orders",
@@ -67,3 +118,23 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/health/cache")
+async def health_cache():
+    """Счётчики попаданий/промахов кэша (для мониторинга)"""
+    return cache.get_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Метрики запросов и SQL в формате Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/ratelimit")
+async def health_ratelimit():
+    """Счётчики ограничения частоты запросов по правилам"""
+    if rate_limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **rate_limiter.get_stats()}
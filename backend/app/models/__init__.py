@@ -3,10 +3,16 @@
 """
 from app.models.user import User
 from app.models.service import Service, ServiceStatus
-from app.models.order import Order, OrderStatus
+from app.models.order import Order, OrderStatus, OrderActor, ORDER_TRANSITIONS
 from app.models.message import Message
 from app.models.review import Review
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.models.facet import ServiceFacet
+from app.models.tag import Tag, service_tags, user_skills
+from app.models.balance import BalanceSnapshot
+from app.models.job_lease import JobLease
+from app.models.outbox import OutboxEvent
+from app.models.notification import Notification, NotificationStatus
 
 __all__ = [
     "User",
@@ -14,9 +20,20 @@ __all__ = [
     "ServiceStatus",
     "Order",
     "OrderStatus",
+    "OrderActor",
+    "ORDER_TRANSITIONS",
     "Message",
     "Review",
     "Transaction",
     "TransactionType",
     "TransactionStatus",
+    "ServiceFacet",
+    "Tag",
+    "service_tags",
+    "user_skills",
+    "BalanceSnapshot",
+    "JobLease",
+    "OutboxEvent",
+    "Notification",
+    "NotificationStatus",
 ]
@@ -0,0 +1,33 @@
+"""
+Модель снимка баланса пользователя
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from app.db.base import Base
+from app.types import MoneyType
+
+
+class BalanceSnapshot(Base):
+    """
+    Баланс пользователя на момент as_of
+    
+    Учитывает все завершённые транзакции с completed_at <= as_of. Баланс на
+    любую дату = ближайший снимок до неё + транзакции после снимка, поэтому
+    журнал transactions не приходится суммировать с самого начала.
+    Снимки создаёт ночное сжатие (compact_balances.py).
+    """
+    __tablename__ = "balance_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    as_of = Column(DateTime, nullable=False)
+    balance = Column(MoneyType, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Последний снимок пользователя до даты; один снимок на дату
+        Index("ix_balance_snapshots_user_as_of", "user_id", "as_of", unique=True),
+    )
+
+    def __repr__(self):
+        return f"<BalanceSnapshot {self.user_id} @ {self.as_of}: {self.balance}>"
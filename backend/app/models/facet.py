@@ -0,0 +1,22 @@
+"""
+Модель счётчиков фасетов каталога услуг
+"""
+from sqlalchemy import Column, Integer, String
+from app.db.base import Base
+
+
+class ServiceFacet(Base):
+    """
+    Материализованный счётчик активных услуг по категории или тегу
+    
+    Обновляется инкрементально при создании/изменении/удалении услуги,
+    поэтому /services/facets/ читает готовые числа, а не считает их по services.
+    """
+    __tablename__ = "service_facets"
+
+    kind = Column(String(20), primary_key=True)  # "category" или "tag"
+    value = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ServiceFacet {self.kind}:{self.value}={self.count}>"
@@ -0,0 +1,22 @@
+"""
+Модель аренды фоновой задачи
+"""
+from sqlalchemy import Column, String, DateTime
+from app.db.base import Base
+
+
+class JobLease(Base):
+    """
+    Аренда фоновой задачи одним процессом
+    
+    Планировщик запущен в каждом воркере uvicorn, но задачу выполняет только
+    тот, кто взял аренду; если процесс упал, аренда истекает сама.
+    """
+    __tablename__ = "job_leases"
+
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(255), nullable=False)  # hostname:pid
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<JobLease {self.name}: {self.owner} до {self.expires_at}>"
@@ -2,7 +2,7 @@
 Модель сообщения в чате заказа
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -35,7 +35,15 @@ class Message(Base):
     
     # Даты
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
-    edited_at = Column(DateTime, nullable=True)
+    edited_at = Column(DateTime, nullable=True)  # Последнее изменение или удаление
+
+    __table_args__ = (
+        # История чата: сообщения заказа без удалённых, по дате
+        Index("ix_messages_order_deleted_created", "order_id", "is_deleted", "created_at"),
+        # Инкрементальная синхронизация: новые по ID, изменённые по edited_at
+        Index("ix_messages_order_id_id", "order_id", "id"),
+        Index("ix_messages_order_edited", "order_id", "edited_at"),
+    )
 
     def __repr__(self):
         return f"<Message {self.id}: order={self.order_id}>"
@@ -0,0 +1,49 @@
+"""
+Модель уведомления в Telegram
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index, Enum as SqlEnum
+from app.db.base import Base
+import enum
+
+
+class NotificationStatus(str, enum.Enum):
+    """Статусы уведомления"""
+    PENDING = "pending"  # Ждёт отправки
+    SENDING = "sending"  # Забрано воркером (до next_attempt_at)
+    SENT = "sent"  # Доставлено в Telegram
+    FAILED = "failed"  # Не доставлено (бот заблокирован или кончились попытки)
+
+
+class Notification(Base):
+    """
+    Сообщение пользователю от бота
+
+    Создаётся обработчиком события outbox в той же транзакции, что и
+    отметка события; отправляет воркер уведомлений (app/core/notifier.py).
+    """
+    __tablename__ = "telegram_notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("outbox_events.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    chat_id = Column(Integer, nullable=False)  # telegram_id получателя
+    text = Column(Text, nullable=False)
+
+    status = Column(SqlEnum(NotificationStatus), default=NotificationStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String(500), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Очередь воркера: ожидающие и забранные, у которых подошло время
+        Index("ix_telegram_notifications_status_next", "status", "next_attempt_at"),
+        # Одно уведомление получателю на событие
+        Index("ix_telegram_notifications_event_user", "event_id", "user_id", unique=True),
+    )
+
+    def __repr__(self):
+        return f"<Notification {self.id} -> {self.chat_id}: {self.status}>"
@@ -2,9 +2,10 @@
 Модель заказа
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum as SqlEnum
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index, Enum as SqlEnum
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.types import MoneyType
 import enum
 
 
@@ -18,6 +19,35 @@ class OrderStatus(str, enum.Enum):
     DISPUTE = "dispute"  # Спор
 
 
+class OrderActor(str, enum.Enum):
+    """Кто меняет статус заказа"""
+    BUYER = "buyer"  # Заказчик
+    SELLER = "seller"  # Исполнитель
+    SYSTEM = "system"  # Оплата и планировщик
+
+
+# Допустимые переходы статусов: (из, в) -> кто может их выполнить.
+# Всё, чего нет в таблице, запрещено (в том числе из completed/cancelled).
+ORDER_TRANSITIONS: dict[tuple[OrderStatus, OrderStatus], frozenset[OrderActor]] = {
+    # Оплата (pay_order)
+    (OrderStatus.WAITING_PAYMENT, OrderStatus.IN_PROGRESS): frozenset({OrderActor.SYSTEM}),
+    (OrderStatus.WAITING_PAYMENT, OrderStatus.CANCELLED): frozenset({OrderActor.BUYER, OrderActor.SELLER}),
+    # Работа сдана на проверку
+    (OrderStatus.IN_PROGRESS, OrderStatus.UNDER_REVIEW): frozenset({OrderActor.SELLER}),
+    # Заказчик принял работу (в том числе без проверки)
+    (OrderStatus.IN_PROGRESS, OrderStatus.COMPLETED): frozenset({OrderActor.BUYER}),
+    (OrderStatus.UNDER_REVIEW, OrderStatus.COMPLETED): frozenset({OrderActor.BUYER, OrderActor.SYSTEM}),
+    # Доработка
+    (OrderStatus.UNDER_REVIEW, OrderStatus.IN_PROGRESS): frozenset({OrderActor.BUYER}),
+    # Спор: открывают участники, по просрочке - планировщик
+    (OrderStatus.IN_PROGRESS, OrderStatus.DISPUTE): frozenset({OrderActor.BUYER, OrderActor.SELLER, OrderActor.SYSTEM}),
+    (OrderStatus.UNDER_REVIEW, OrderStatus.DISPUTE): frozenset({OrderActor.BUYER, OrderActor.SELLER}),
+    # Заказчик снимает спор: принимает работу или возвращает в работу
+    (OrderStatus.DISPUTE, OrderStatus.COMPLETED): frozenset({OrderActor.BUYER}),
+    (OrderStatus.DISPUTE, OrderStatus.IN_PROGRESS): frozenset({OrderActor.BUYER}),
+}
+
+
 class Order(Base):
     """
     Модель заказа
@@ -36,10 +66,10 @@ class Order(Base):
     seller = relationship("User", foreign_keys=[seller_id], back_populates="orders_as_seller")
     service = relationship("Service", back_populates="orders")
     
-    # Финансы (эскроу)
-    price = Column(Float, nullable=False)
+    # Финансы (эскроу; Money, в БД - целые копейки)
+    price = Column(MoneyType, nullable=False)
     platform_fee_percent = Column(Float, default=10.0)  # Процент комиссии платформы
-    seller_gets = Column(Float, nullable=False)  # Что получит продавец (после комиссии)
+    seller_gets = Column(MoneyType, nullable=False)  # Что получит продавец (после комиссии)
     
     # Деньги заморожены в эскроу до завершения заказа
     is_paid = Column(Boolean, default=False)
@@ -49,7 +79,8 @@ class Order(Base):
     status = Column(SqlEnum(OrderStatus), default=OrderStatus.WAITING_PAYMENT, index=True)
     
     # Сроки
-    deadline = Column(DateTime, nullable=True)  # Дедлайн (created_at + execution_days)
+    deadline = Column(DateTime, nullable=True)  # Срок текущего этапа: сдача работы, на проверке - ответ заказчика
+    overdue_notified_at = Column(DateTime, nullable=True)  # Когда участников уведомили о просрочке
     
     # Данные заказа
     buyer_comment = Column(Text, nullable=True)  # Что хочет заказчик
@@ -69,5 +100,15 @@ class Order(Base):
     review = relationship("Review", back_populates="order", uselist=False)
     transactions = relationship("Transaction", back_populates="order")
 
+    __table_args__ = (
+        # Списки заказов покупателя/продавца по дате: все и с фильтром по статусу
+        Index("ix_orders_buyer_created_id", "buyer_id", "created_at", "id"),
+        Index("ix_orders_seller_created_id", "seller_id", "created_at", "id"),
+        Index("ix_orders_buyer_status_created", "buyer_id", "status", "created_at"),
+        Index("ix_orders_seller_status_created", "seller_id", "status", "created_at"),
+        # Планировщик: заказы статуса, у которых наступил срок
+        Index("ix_orders_status_deadline", "status", "deadline"),
+    )
+
     def __repr__(self):
         return f"<Order {self.id}: {self.buyer_id} -> {self.seller_id}>"
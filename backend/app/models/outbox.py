@@ -0,0 +1,39 @@
+"""
+Модель события исходящей очереди (outbox)
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, Index
+from app.db.base import Base
+
+
+class OutboxEvent(Base):
+    """
+    Событие, которое нужно обработать после смены статуса заказа
+    
+    Пишется в той же транзакции, что и смена статуса, поэтому событие есть
+    тогда и только тогда, когда переход состоялся. Обрабатывает его
+    планировщик (app/db/outbox.py); processed_at ставится в той же
+    транзакции, что и побочные эффекты, - событие обрабатывается один раз.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String(50), nullable=False)  # order.completed, order.dispute, ...
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True, index=True)
+    payload = Column(JSON, nullable=True)  # {"from": ..., "to": ..., "actor": ...}
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    
+    # Повторы при ошибке обработчика
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Очередь: необработанные события, у которых подошло время попытки
+        Index("ix_outbox_events_pending", "processed_at", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<OutboxEvent {self.id}: {self.event_type} {self.order_id}>"
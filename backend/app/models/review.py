@@ -2,7 +2,7 @@
 Модель отзыва и рейтинга
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, Float, DateTime, Text, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, Float, DateTime, Text, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -38,6 +38,9 @@ class Review(Base):
 
     __table_args__ = (
         CheckConstraint('rating >= 1 and rating <= 5', name='check_rating_range'),
+        # Отзывы о пользователе и выборка по оценке, от новых к старым
+        Index("ix_reviews_reviewed_user_created", "reviewed_user_id", "created_at"),
+        Index("ix_reviews_rating_created", "rating", "created_at"),
     )
 
     def __repr__(self):
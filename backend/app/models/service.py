@@ -2,9 +2,10 @@
 Модель услуги (кворка)
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum as SqlEnum
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index, Enum as SqlEnum
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.types import MoneyType
 import enum
 
 
@@ -36,7 +37,7 @@ class Service(Base):
     tags = Column(String(500), nullable=True)  # Теги, разделённые запятой
     
     # Параметры
-    price = Column(Float, nullable=False)  # Фиксированная цена
+    price = Column(MoneyType, nullable=False)  # Фиксированная цена
     execution_days = Column(Integer, default=7)  # Срок выполнения в днях
     revision_count = Column(Integer, default=2)  # Количество правок
     
@@ -49,6 +50,8 @@ class Service(Base):
     # Статистика
     total_orders = Column(Integer, default=0)
     average_rating = Column(Float, default=0.0)
+    rating_sum = Column(Integer, default=0)  # Сумма оценок (average_rating = rating_sum / total_reviews)
+    total_reviews = Column(Integer, default=0)
     
     # Даты
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -57,5 +60,12 @@ class Service(Base):
     # Отношения
     orders = relationship("Order", back_populates="service")
 
+    __table_args__ = (
+        # Каталог: активные услуги по дате (все и по категории); услуги продавца
+        Index("ix_services_status_created_id", "status", "created_at", "id"),
+        Index("ix_services_status_category_created", "status", "category", "created_at"),
+        Index("ix_services_seller_status_created", "seller_id", "status", "created_at"),
+    )
+
     def __repr__(self):
         return f"<Service {self.id}: {self.title}>"
@@ -0,0 +1,39 @@
+"""
+Модель тега и таблицы связей услуга-тег, пользователь-навык
+"""
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, Table
+from app.db.base import Base
+
+
+class Tag(Base):
+    """
+    Нормализованный тег (общий справочник для тегов услуг и навыков пользователей)
+    
+    Строки Service.tags и User.skills остаются как есть (их отдаёт API),
+    а связи ниже пересобираются при каждой их записи.
+    """
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<Tag {self.id}: {self.name}>"
+
+
+# Первичный ключ начинается с tag_id: пересечение тегов - поиск по индексу
+service_tags = Table(
+    "service_tags",
+    Base.metadata,
+    Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True),
+    Column("service_id", Integer, ForeignKey("services.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_service_tags_service_id", "service_id"),
+)
+
+user_skills = Table(
+    "user_skills",
+    Base.metadata,
+    Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_user_skills_user_id", "user_id"),
+)
@@ -2,9 +2,10 @@
 Модель транзакции (эскроу и выплаты)
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Enum as SqlEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Index, Enum as SqlEnum
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.types import MoneyType
 import enum
 
 
@@ -46,7 +47,7 @@ class Transaction(Base):
     
     # Тип и сумма
     type = Column(SqlEnum(TransactionType), nullable=False, index=True)
-    amount = Column(Float, nullable=False)
+    amount = Column(MoneyType, nullable=False)
     status = Column(SqlEnum(TransactionStatus), default=TransactionStatus.PENDING, index=True)
     
     # Описание
@@ -54,10 +55,18 @@ class Transaction(Base):
     
     # Дополнительная информация
     reference = Column(String(255), nullable=True)  # Для платёжных систем
+    idempotency_key = Column(String(255), nullable=True)  # Заголовок Idempotency-Key запроса оплаты
     
     # Даты
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     completed_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # Повторный запрос с тем же ключом не проведёт оплату второй раз
+        Index("ix_transactions_idempotency_key", "idempotency_key", unique=True),
+        # Выписка и баланс на дату: проведённые транзакции пользователя по completed_at
+        Index("ix_transactions_user_completed", "user_id", "completed_at"),
+    )
+
     def __repr__(self):
         return f"<Transaction {self.id}: {self.type.value} {self.amount}>"
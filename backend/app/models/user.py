@@ -2,9 +2,10 @@
 Модель пользователя
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.types import MoneyType
 
 
 class User(Base):
@@ -32,13 +33,21 @@ class User(Base):
     is_banned = Column(Boolean, default=False)
     
     # Рейтинг (0-5)
-    rating = Column(Float, default=0.0)
+    rating = Column(Float, default=0.0, index=True)  # Индекс для топа продавцов
     total_reviews = Column(Integer, default=0)
     
-    # Финансы
-    balance = Column(Float, default=0.0)  # Внутренний баланс
-    total_earned = Column(Float, default=0.0)  # Всего заработано
-    total_spent = Column(Float, default=0.0)  # Всего потрачено
+    # Накопительные агрегаты отзывов (rating = rating_sum / total_reviews)
+    rating_sum = Column(Integer, default=0)
+    rating_1_count = Column(Integer, default=0)
+    rating_2_count = Column(Integer, default=0)
+    rating_3_count = Column(Integer, default=0)
+    rating_4_count = Column(Integer, default=0)
+    rating_5_count = Column(Integer, default=0)
+    
+    # Финансы (Money, в БД - целые копейки)
+    balance = Column(MoneyType, default=0)  # Внутренний баланс
+    total_earned = Column(MoneyType, default=0)  # Всего заработано
+    total_spent = Column(MoneyType, default=0)  # Всего потрачено
     
     # Статистика
     completed_orders = Column(Integer, default=0)
@@ -58,5 +67,10 @@ class User(Base):
     messages = relationship("Message", back_populates="author")
     transactions = relationship("Transaction", back_populates="user")
 
+    __table_args__ = (
+        # Список пользователей: активные и не заблокированные, по дате
+        Index("ix_users_active_banned_created_id", "is_active", "is_banned", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<User {self.telegram_id}: {self.first_name}>"
@@ -7,6 +7,9 @@ from app.schemas.user import (
     UserUpdate,
     UserResponse,
     UserPublicResponse,
+    TelegramUserPublicResponse,
+    UserBatchRequest,
+    TelegramUserBatchRequest,
 )
 from app.schemas.service import (
     ServiceBase,
@@ -31,6 +34,14 @@ from app.schemas.review import (
     ReviewResponse,
     ReviewDetailResponse,
 )
+from app.schemas.transaction import (
+    StatementEntry,
+    BalanceResponse,
+)
+from app.schemas.auth import (
+    TelegramAuthRequest,
+    SessionResponse,
+)
 
 __all__ = [
     # User
@@ -39,6 +50,9 @@ __all__ = [
     "UserUpdate",
     "UserResponse",
     "UserPublicResponse",
+    "TelegramUserPublicResponse",
+    "UserBatchRequest",
+    "TelegramUserBatchRequest",
     # Service
     "ServiceBase",
     "ServiceCreate",
@@ -58,4 +72,10 @@ __all__ = [
     "ReviewCreate",
     "ReviewResponse",
     "ReviewDetailResponse",
+    # Transaction
+    "StatementEntry",
+    "BalanceResponse",
+    # Auth
+    "TelegramAuthRequest",
+    "SessionResponse",
 ]
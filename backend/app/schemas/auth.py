@@ -0,0 +1,17 @@
+"""
+Pydantic схемы для входа через Telegram WebApp
+"""
+from pydantic import BaseModel, Field
+
+
+class TelegramAuthRequest(BaseModel):
+    """Вход по initData (window.Telegram.WebApp.initData как есть)"""
+    init_data: str = Field(..., min_length=1)
+
+
+class SessionResponse(BaseModel):
+    """Токен сессии для заголовка Authorization: Bearer"""
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int  # Секунды
+    user_id: int
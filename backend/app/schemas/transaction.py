@@ -0,0 +1,25 @@
+"""
+Pydantic схемы для выписки по счёту
+"""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+from app.models.transaction import TransactionType
+
+
+class StatementEntry(BaseModel):
+    """Строка выписки: проведённая транзакция и баланс после неё"""
+    id: int
+    order_id: Optional[int]
+    type: TransactionType
+    amount: float  # Со знаком: + поступление, - списание
+    balance_after: float
+    description: Optional[str]
+    completed_at: datetime
+
+
+class BalanceResponse(BaseModel):
+    """Баланс пользователя на дату"""
+    user_id: int
+    as_of: datetime
+    balance: float
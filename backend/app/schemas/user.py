@@ -5,6 +5,9 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional
 
+# Максимум ID в одном пакетном запросе
+MAX_BATCH_IDS = 500
+
 
 class UserBase(BaseModel):
     """Базовые данные пользователя"""
@@ -69,3 +72,18 @@ class UserPublicResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class TelegramUserPublicResponse(UserPublicResponse):
+    """Публичный профиль с Telegram ID, по которому его запросили"""
+    telegram_id: int
+
+
+class UserBatchRequest(BaseModel):
+    """Пакетный запрос профилей по ID"""
+    ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+
+
+class TelegramUserBatchRequest(BaseModel):
+    """Пакетный запрос профилей по Telegram ID"""
+    telegram_ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
@@ -1,9 +1,12 @@
 """
 Утилиты и типы для работы с БД
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 from enum import Enum
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
 
 # Типы для SQL
 class DatabaseType(str, Enum):
@@ -18,9 +21,82 @@ class TelegramUser(Dict[str, Any]):
     pass
 
 # Типы для финансов
-class Money(float):
-    """Денежная сумма в рублях"""
-    pass
+KOPECK = Decimal("0.01")
+
+
+class Money(Decimal):
+    """
+    Денежная сумма в рублях с точностью до копейки
+    
+    Decimal, округлённый до копеек (ROUND_HALF_UP), поэтому суммы складываются
+    точно, а в JSON отдаются обычным числом. В БД хранится целым числом
+    копеек (MoneyType).
+    """
+
+    def __new__(cls, value: Union[int, float, str, Decimal] = 0):
+        if isinstance(value, float):
+            # str: 0.1 -> "0.1", а не двоичный хвост 0.1000000000000000055...
+            value = str(value)
+        return super().__new__(cls, Decimal(value).quantize(KOPECK, rounding=ROUND_HALF_UP))
+
+    @classmethod
+    def from_kopecks(cls, kopecks: int) -> "Money":
+        return super().__new__(cls, Decimal(int(kopecks)).scaleb(-2))
+
+    @property
+    def kopecks(self) -> int:
+        return int(self.scaleb(2))
+
+    def percent(self, percent: Union[int, float, Decimal]) -> "Money":
+        """Доля суммы в процентах, округлённая до копейки (целочисленно)"""
+        basis_points = int((Decimal(str(percent)) * 100).to_integral_value())
+        share, remainder = divmod(abs(self.kopecks) * basis_points, 10000)
+        if remainder * 2 >= 10000:
+            share += 1
+        return Money.from_kopecks(share if self >= 0 else -share)
+
+    def __add__(self, other):
+        if isinstance(other, (int, Decimal)):
+            return Money.from_kopecks(self.kopecks + Money(other).kopecks)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, (int, Decimal)):
+            return Money.from_kopecks(self.kopecks - Money(other).kopecks)
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, (int, Decimal)):
+            return Money.from_kopecks(Money(other).kopecks - self.kopecks)
+        return NotImplemented
+
+    def __neg__(self, context=None):
+        return Money.from_kopecks(-self.kopecks)
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+
+class MoneyType(TypeDecorator):
+    """
+    Колонка с деньгами: в БД целое число копеек, в Python - Money
+    
+    Обычные числа в запросах (например balance - 100) считаются рублями.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return Money(value).kopecks
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return Money.from_kopecks(value)
 
 # Типы для рейтинга
 class Rating(float):
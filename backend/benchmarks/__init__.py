@@ -0,0 +1 @@
+"""Нагрузочные замеры API (запуск: python benchmarks/run_api.py из backend/)"""
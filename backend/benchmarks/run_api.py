@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+"""
+Нагрузочный замер API маркетплейса
+
+1. Заполняет БД заданного масштаба (app/db/seed.py) - один раз: готовая БД
+   хранится в benchmarks/.data и переиспользуется, каждый прогон идёт на
+   её копии (сценарии пишут в БД).
+2. Запускает приложение в отдельном процессе uvicorn (без фоновых задач и
+   ограничения частоты запросов).
+3. Гоняет сценарии (benchmarks/scenarios.py) по очереди, каждый --duration
+   секунд в --concurrency параллельных воркеров httpx.AsyncClient.
+4. Печатает и сохраняет в JSON по каждому маршруту: запросов, ошибок,
+   запросов в секунду, p50/p95/p99. --compare сравнивает с прошлым JSON.
+
+Масштабы: small (1k пользователей, 5k услуг, 50k заказов и сообщений),
+medium (x10), full (100k, 500k, 5M, 5M - заполнение занимает долго).
+
+Запускать из backend/:
+    python benchmarks/run_api.py                          # small, все сценарии
+    python benchmarks/run_api.py --scale medium --scenarios search,listing
+    python benchmarks/run_api.py --compare benchmarks/results/abc1234.json
+    python benchmarks/run_api.py --base-url http://127.0.0.1:8000 --scale full  # уже запущенный сервер
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCHMARKS_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+SCALES = {
+    "small": {"users": 1_000, "services": 5_000, "orders": 50_000, "messages": 50_000},
+    "medium": {"users": 10_000, "services": 50_000, "orders": 500_000, "messages": 500_000},
+    "full": {"users": 100_000, "services": 500_000, "orders": 5_000_000, "messages": 5_000_000},
+}
+
+# Сколько id брать в выборки Context
+SAMPLE_SIZE = 500
+BENCHMARK_BUYERS = 200
+BENCHMARK_BUYER_TOP_UP = 100_000_000  # Руб., хватает на любое число заказов за прогон
+
+
+def parse_args():
+    from benchmarks.scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description="Нагрузочный замер API")
+    parser.add_argument("--scale", choices=list(SCALES), default="small", help="Объём данных")
+    parser.add_argument("--seed", type=int, default=42, help="Seed генератора данных и сценариев")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Сценарии через запятую")
+    parser.add_argument("--concurrency", type=int, default=16, help="Параллельных воркеров")
+    parser.add_argument("--duration", type=float, default=10.0, help="Секунд на сценарий")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Секунд прогрева перед каждым сценарием")
+    parser.add_argument("--base-url", help="Замерять уже запущенный сервер (БД заполнена этим же --scale)")
+    parser.add_argument("--workers", type=int, default=1, help="Воркеров uvicorn")
+    parser.add_argument("--output", help="Куда сохранить JSON (по умолчанию benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    return parser.parse_args()
+
+
+def git_revision() -> tuple[str, bool]:
+    """Коммит и есть ли незакоммиченные изменения"""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--", "."], text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def seller_count(users: int) -> int:
+    """Продавцы при заполнении - пользователи 1..N (см. app/db/seed.py)"""
+    from app.db.seed import SeedDistribution
+
+    return max(1, int(users * SeedDistribution().seller_share))
+
+
+def seeded_database(scale: str, seed: int) -> str:
+    """Путь к заполненной SQLite БД масштаба scale (заполняется при первом вызове)"""
+    path = os.path.join(DATA_DIR, f"tgwork_{scale}_{seed}.db")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    partial = path + ".partial"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(partial + suffix):
+            os.remove(partial + suffix)
+    # Приложение ещё не импортировано - настройки прочитают этот DATABASE_URL
+    os.environ["DATABASE_URL"] = f"sqlite:///{partial}"
+    from app.db.session import engine, init_db
+    from app.db.seed import SeedSizes, seed_database
+
+    print(f"Заполнение БД ({scale}, seed {seed})...")
+    started = time.perf_counter()
+    init_db()
+    seed_database(
+        engine, SeedSizes(**SCALES[scale]), seed,
+        progress=lambda table, count: print(f"  {table}: {count}"),
+    )
+    engine.dispose()
+    print(f"  за {time.perf_counter() - started:.0f} с")
+
+    _checkpoint(partial)
+    os.replace(partial, path)
+    return path
+
+
+def _checkpoint(path: str) -> None:
+    # Весь WAL - в основной файл, чтобы БД можно было копировать одним файлом
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+
+
+def top_up_buyers(database_url: str, users: int, sellers: int, rng: random.Random) -> list[int]:
+    """Пополнить баланс покупателям сценария lifecycle (через журнал, как настоящее пополнение)"""
+    from sqlalchemy import create_engine, insert, update
+    from app.models import Transaction, TransactionStatus, TransactionType, User
+    from app.types import Money
+
+    buyers = sorted(rng.sample(range(sellers + 1, users + 1), min(BENCHMARK_BUYERS, users - sellers)))
+    amount = Money(BENCHMARK_BUYER_TOP_UP)
+    now = datetime.utcnow()
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        conn.execute(update(User).where(User.id.in_(buyers)).values(balance=User.balance + amount))
+        conn.execute(insert(Transaction), [
+            {
+                "user_id": user_id,
+                "type": TransactionType.BALANCE_TOP_UP,
+                "amount": amount,
+                "status": TransactionStatus.COMPLETED,
+                "description": "Пополнение для нагрузочного замера",
+                "created_at": now,
+                "completed_at": now,
+            }
+            for user_id in buyers
+        ])
+    engine.dispose()
+    return buyers
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        SCHEDULER_ENABLED="false",
+        NOTIFICATION_WORKER_IN_APP="false",
+        RATE_LIMIT_ENABLED="false",
+        DEBUG="false",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+
+
+async def wait_ready(client, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Сервер не запустился")
+
+
+async def build_context(client, scale: str, buyers: list[int], rng: random.Random):
+    """Выборки существующих id через API"""
+    from benchmarks.scenarios import API, Context
+
+    sizes = SCALES[scale]
+    ctx = Context(users=sizes["users"], sellers=seller_count(sizes["users"]))
+
+    cursor = None
+    while len(ctx.services) < SAMPLE_SIZE:
+        params = {"limit": 100, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(f"{API}/services/", params=params)
+        ctx.services.extend((service["id"], service["seller_id"]) for service in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    for order_id in rng.sample(range(1, sizes["orders"] + 1), min(SAMPLE_SIZE, sizes["orders"])):
+        response = await client.get(f"{API}/orders/{order_id}")
+        if response.status_code == 200:
+            order = response.json()
+            ctx.orders.append((order["id"], order["buyer_id"], order["seller_id"]))
+            if order["status"] == "completed" and order.get("review") is not None:
+                ctx.completed_orders.append(order["id"])
+
+    ctx.buyers = buyers or [rng.randint(ctx.sellers + 1, ctx.users) for _ in range(BENCHMARK_BUYERS)]
+    if not ctx.services or not ctx.orders:
+        raise RuntimeError("В БД нет услуг или заказов - заполните её этим же --scale")
+    return ctx
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(share * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: dict[str, list[float]], errors: dict[str, int], seconds: float) -> dict:
+    results = {}
+    for name in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(name, []))
+        total = len(values) + errors.get(name, 0)
+        results[name] = {
+            "requests": total,
+            "errors": errors.get(name, 0),
+            "rps": round(total / seconds, 1),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+        }
+    return results
+
+
+async def run_scenario(client, scenario, ctx, concurrency: int, duration: float, warmup: float,
+                       seed: int) -> tuple[dict, float]:
+    """Крутить сценарий в concurrency воркерах; время успешных запросов по маршрутам"""
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    measuring = False
+
+    def record(name: str, seconds: float, ok: bool) -> None:
+        if not measuring:
+            return
+        if ok:
+            latencies[name].append(seconds)
+        else:
+            errors[name] += 1
+
+    async def worker(index: int, until: float) -> None:
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < until:
+            await scenario(client, ctx, rng, record)
+
+    if warmup > 0:
+        await asyncio.gather(*(worker(i, time.monotonic() + warmup) for i in range(concurrency)))
+    measuring = True
+    started = time.monotonic()
+    await asyncio.gather(*(worker(i, started + duration) for i in range(concurrency)))
+    elapsed = time.monotonic() - started
+    return summarize(latencies, errors, elapsed), elapsed
+
+
+def print_results(endpoints: dict, baseline: Optional[dict]) -> None:
+    header = f"{'маршрут':28} {'запросов':>9} {'ошибок':>7} {'rps':>8} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, row in endpoints.items():
+        line = (f"{name:28} {row['requests']:9} {row['errors']:7} {row['rps']:8.1f} "
+                f"{row['p50_ms']:9.2f} {row['p95_ms']:9.2f} {row['p99_ms']:9.2f}")
+        old = (baseline or {}).get(name)
+        if old:
+            deltas = []
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+                if old[key]:
+                    deltas.append(f"{key} {(row[key] - old[key]) / old[key] * 100:+.0f}%")
+            line += "   " + ", ".join(deltas)
+        print(line)
+
+
+async def run(args, base_url: str, buyers: list[int]) -> dict:
+    import httpx
+    from benchmarks.scenarios import SCENARIOS
+
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    endpoints: dict[str, dict] = {}
+    scenarios: dict[str, dict] = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        await wait_ready(client)
+        ctx = await build_context(client, args.scale, buyers, rng)
+        for name in args.scenarios.split(","):
+            print(f"Сценарий {name}...")
+            results, elapsed = await run_scenario(
+                client, SCENARIOS[name], ctx, args.concurrency, args.duration, args.warmup, args.seed
+            )
+            scenarios[name] = {"seconds": round(elapsed, 2), "endpoints": results}
+            for endpoint, row in results.items():
+                # Маршрут из нескольких сценариев (send_message) - отдельной строкой на сценарий
+                endpoints[endpoint if endpoint not in endpoints else f"{endpoint}@{name}"] = row
+    return {"scenarios": scenarios, "endpoints": endpoints}
+
+
+def main():
+    args = parse_args()
+    commit, dirty = git_revision()
+
+    server = None
+    buyers: list[int] = []
+    database = "external"
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        source = seeded_database(args.scale, args.seed)
+        run_path = os.path.join(DATA_DIR, f"run_{os.getpid()}.db")
+        shutil.copyfile(source, run_path)
+        database_url = f"sqlite:///{run_path}"
+        database = f"sqlite ({args.scale})"
+        sizes = SCALES[args.scale]
+        buyers = top_up_buyers(database_url, sizes["users"], seller_count(sizes["users"]), random.Random(args.seed))
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(database_url, port, args.workers)
+
+    try:
+        measured = asyncio.run(run(args, base_url, buyers))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(run_path + suffix):
+                    os.remove(run_path + suffix)
+
+    result = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": database,
+            "scale": args.scale,
+            "sizes": SCALES[args.scale],
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "workers": args.workers,
+        },
+        **measured,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline_result = json.load(f)
+        baseline = baseline_result["endpoints"]
+        print(f"\nСравнение с {baseline_result['meta']['commit']} ({args.compare}):")
+    print()
+    print_results(result["endpoints"], baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nРезультаты: {output}")
+
+
+if __name__ == "__main__":
+    main()
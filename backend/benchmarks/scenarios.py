@@ -0,0 +1,140 @@
+"""
+Сценарии нагрузки на API
+
+Сценарий - одна итерация действий пользователя; каждый HTTP-запрос
+записывается отдельно под именем маршрута (record). Итерации крутятся
+параллельно в нескольких воркерах, поэтому сценарии берут id из общего
+Context случайно, а не по порядку.
+"""
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+import httpx
+
+API = "/api/v1"
+
+SEARCH_QUERIES = ["бот", "логотип", "монтаж", "сайт", "python", "перевод", "таргет", "figma"]
+TAG_QUERIES = ["python,telegram", "логотип", "seo", "монтаж,youtube", "api,sql"]
+CATEGORIES = ["Программирование", "Дизайн", "Тексты", "Маркетинг", "Видео", "Аудио"]
+MESSAGE_TEXT = "Сообщение из нагрузочного теста"
+
+Record = Callable[[str, float, bool], None]
+
+
+@dataclass
+class Context:
+    """id существующих данных, из которых сценарии выбирают случайно"""
+    users: int
+    sellers: int
+    services: list[tuple[int, int]] = field(default_factory=list)  # (id, seller_id) активных услуг
+    orders: list[tuple[int, int, int]] = field(default_factory=list)  # (id, buyer_id, seller_id)
+    completed_orders: list[int] = field(default_factory=list)
+    buyers: list[int] = field(default_factory=list)  # Покупатели с балансом на оплату
+
+
+async def call(client: httpx.AsyncClient, record: Record, name: str, method: str, url: str,
+               expected: int = 200, **kwargs) -> Optional[httpx.Response]:
+    """Выполнить запрос и записать время; None - ошибка"""
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.HTTPError:
+        record(name, time.perf_counter() - started, False)
+        return None
+    ok = response.status_code == expected
+    record(name, time.perf_counter() - started, ok)
+    return response if ok else None
+
+
+async def search(client: httpx.AsyncClient, ctx: Context, rng: random.Random, record: Record) -> None:
+    """Полнотекстовый поиск, поиск по тегам, фасеты"""
+    await call(client, record, "search_services", "GET", f"{API}/services/search/",
+               params={"q": rng.choice(SEARCH_QUERIES), "limit": 20})
+    await call(client, record, "get_services_by_tags", "GET", f"{API}/services/by-tags/",
+               params={"tags": rng.choice(TAG_QUERIES), "limit": 20})
+    await call(client, record, "get_service_facets", "GET", f"{API}/services/facets/")
+
+
+async def listing(client: httpx.AsyncClient, ctx: Context, rng: random.Random, record: Record) -> None:
+    """Каталог: лента, категория со второй страницей, карточка услуги, услуги продавца"""
+    await call(client, record, "list_services", "GET", f"{API}/services/", params={"limit": 20})
+    response = await call(client, record, "list_services_category", "GET", f"{API}/services/",
+                          params={"category": rng.choice(CATEGORIES), "limit": 20})
+    cursor = response.headers.get("x-next-cursor") if response is not None else None
+    if cursor:
+        await call(client, record, "list_services_cursor", "GET", f"{API}/services/",
+                   params={"limit": 20, "cursor": cursor})
+    service_id, seller_id = rng.choice(ctx.services)
+    await call(client, record, "get_service", "GET", f"{API}/services/{service_id}")
+    await call(client, record, "get_seller_services", "GET", f"{API}/services/seller/{seller_id}/")
+    await call(client, record, "get_user_public_profile", "GET", f"{API}/users/public/{seller_id}")
+
+
+async def orders(client: httpx.AsyncClient, ctx: Context, rng: random.Random, record: Record) -> None:
+    """Списки заказов покупателя и продавца, карточка заказа"""
+    order_id, buyer_id, seller_id = rng.choice(ctx.orders)
+    await call(client, record, "get_buyer_orders", "GET", f"{API}/orders/buyer/{buyer_id}/")
+    await call(client, record, "get_seller_orders", "GET", f"{API}/orders/seller/{seller_id}/")
+    await call(client, record, "get_order", "GET", f"{API}/orders/{order_id}")
+
+
+async def chat(client: httpx.AsyncClient, ctx: Context, rng: random.Random, record: Record) -> None:
+    """Сообщение в чат заказа и синхронизация чата собеседником"""
+    order_id, buyer_id, seller_id = rng.choice(ctx.orders)
+    response = await call(client, record, "get_messages", "GET", f"{API}/orders/{order_id}/messages/",
+                          params={"user_id": buyer_id})
+    last_id = max((message["id"] for message in response.json()), default=0) if response is not None else 0
+    await call(client, record, "send_message", "POST", f"{API}/orders/{order_id}/messages/",
+               expected=201, params={"author_id": buyer_id}, json={"text": MESSAGE_TEXT})
+    await call(client, record, "get_messages_since", "GET", f"{API}/orders/{order_id}/messages/",
+               params={"user_id": seller_id, "since_id": last_id})
+
+
+async def reviews(client: httpx.AsyncClient, ctx: Context, rng: random.Random, record: Record) -> None:
+    """Отзывы продавца, топ продавцов, отзывы по оценке, отзыв к заказу"""
+    _, seller_id = rng.choice(ctx.services)
+    await call(client, record, "get_user_reviews", "GET", f"{API}/orders/user/{seller_id}/reviews/")
+    await call(client, record, "get_top_rated_sellers", "GET", f"{API}/orders/top-rated/")
+    await call(client, record, "get_reviews_by_rating", "GET", f"{API}/orders/by-rating/",
+               params={"rating": rng.randint(1, 5)})
+    if ctx.completed_orders:
+        order_id = rng.choice(ctx.completed_orders)
+        await call(client, record, "get_review", "GET", f"{API}/orders/{order_id}/review/")
+
+
+async def lifecycle(client: httpx.AsyncClient, ctx: Context, rng: random.Random, record: Record) -> None:
+    """Полный путь заказа: создание, оплата, сдача, приёмка, отзыв"""
+    service_id, seller_id = rng.choice(ctx.services)
+    buyer_id = rng.choice(ctx.buyers)
+    if buyer_id == seller_id:
+        return
+    response = await call(client, record, "create_order", "POST", f"{API}/orders/", expected=201,
+                          params={"buyer_id": buyer_id}, json={"service_id": service_id})
+    if response is None:
+        return
+    order_id = response.json()["id"]
+    if await call(client, record, "pay_order", "POST", f"{API}/orders/{order_id}/pay",
+                  params={"buyer_id": buyer_id}) is None:
+        return
+    await call(client, record, "send_message", "POST", f"{API}/orders/{order_id}/messages/",
+               expected=201, params={"author_id": seller_id}, json={"text": MESSAGE_TEXT})
+    await call(client, record, "update_order", "PUT", f"{API}/orders/{order_id}",
+               params={"user_id": seller_id}, json={"status": "under_review"})
+    if await call(client, record, "update_order", "PUT", f"{API}/orders/{order_id}",
+                  params={"user_id": buyer_id}, json={"status": "completed"}) is None:
+        return
+    await call(client, record, "create_review", "POST", f"{API}/orders/{order_id}/review/", expected=201,
+               params={"reviewer_id": buyer_id}, json={"rating": rng.randint(3, 5), "text": "Спасибо"})
+
+
+Scenario = Callable[[httpx.AsyncClient, Context, random.Random, Record], Awaitable[None]]
+
+SCENARIOS: dict[str, Scenario] = {
+    "search": search,
+    "listing": listing,
+    "orders": orders,
+    "chat": chat,
+    "reviews": reviews,
+    "lifecycle": lifecycle,
+}
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+"""
+Проверка входа через Telegram WebApp и замер стоимости аутентификации
+
+Сначала проверяет правила: подписанная initData даёт токен, подделанная и
+устаревшая - 401, токен чужого пользователя в buyer_id - 403, испорченный
+токен - 401; WebSocket чата открывается без токена и со своим токеном, с
+чужим - закрывается; с SECRET_KEY из примера токены не выдаются и не
+принимаются (503). Затем замеряет, сколько стоит аутентификация одного запроса:
+- initData: проверка HMAC + поиск пользователя в БД (так было бы без сессий);
+- токен без кэша: проверка подписи и срока JWT;
+- токен из кэша: claims из памяти воркера;
+- сквозной запрос через TestClient с токеном и без.
+
+    python check_auth.py
+    python check_auth.py --iterations 20000
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+BOT_TOKEN = "123456:check-auth"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проверка входа через Telegram WebApp")
+    parser.add_argument("--iterations", type=int, default=5000, help="Повторов для замеров без HTTP")
+    parser.add_argument("--requests", type=int, default=500, help="Повторов для сквозных замеров")
+    return parser.parse_args()
+
+
+def sign_init_data(user: dict, auth_date: int, bot_token: str = BOT_TOKEN) -> str:
+    """initData, подписанная как это делает Telegram"""
+    fields = {"auth_date": str(auth_date), "query_id": "AAF-check", "user": json.dumps(user)}
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def per_call(func, iterations: int) -> float:
+    """Микросекунд на вызов"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def check_rules(client) -> list[str]:
+    """Правила входа и проверки токена"""
+    problems = []
+    now = int(time.time())
+
+    def expect(name: str, response, code: int):
+        if response.status_code != code:
+            problems.append(f"{name}: {response.status_code} вместо {code} ({response.text[:100]})")
+
+    seller = client.post("/api/v1/auth/telegram", json={
+        "init_data": sign_init_data({"id": 7001, "first_name": "Seller"}, now)
+    })
+    expect("вход по initData", seller, 200)
+    buyer = client.post("/api/v1/auth/telegram", json={
+        "init_data": sign_init_data({"id": 7002, "first_name": "Buyer", "username": "buyer"}, now)
+    })
+    expect("вход второго пользователя", buyer, 200)
+    again = client.post("/api/v1/auth/telegram", json={
+        "init_data": sign_init_data({"id": 7001, "first_name": "Seller"}, now)
+    })
+    expect("повторный вход", again, 200)
+    if problems:
+        return problems
+    if again.json()["user_id"] != seller.json()["user_id"]:
+        problems.append("повторный вход создал нового пользователя")
+
+    tampered = sign_init_data({"id": 7001, "first_name": "Seller"}, now).replace("7001", "7003")
+    expect("подделанная initData", client.post("/api/v1/auth/telegram", json={"init_data": tampered}), 401)
+    foreign = sign_init_data({"id": 7001, "first_name": "Seller"}, now, bot_token="654321:other-bot")
+    expect("initData другого бота", client.post("/api/v1/auth/telegram", json={"init_data": foreign}), 401)
+    stale = sign_init_data({"id": 7001, "first_name": "Seller"}, now - 2 * 86400)
+    expect("устаревшая initData", client.post("/api/v1/auth/telegram", json={"init_data": stale}), 401)
+
+    seller_id, seller_token = seller.json()["user_id"], seller.json()["access_token"]
+    buyer_id, buyer_token = buyer.json()["user_id"], buyer.json()["access_token"]
+    service = {
+        "title": "Проверка входа",
+        "description": "Услуга для проверки входа через Telegram",
+        "category": "Программирование",
+        "price": 100,
+    }
+    created = client.post(
+        f"/api/v1/services/?seller_id={seller_id}", json=service,
+        headers={"Authorization": f"Bearer {seller_token}"},
+    )
+    expect("своя услуга", created, 201)
+    expect("услуга от чужого имени", client.post(
+        f"/api/v1/services/?seller_id={seller_id}", json=service,
+        headers={"Authorization": f"Bearer {buyer_token}"},
+    ), 403)
+    expect("испорченный токен", client.get(
+        f"/api/v1/orders/buyer/{buyer_id}/?buyer_id={buyer_id}",
+        headers={"Authorization": f"Bearer {buyer_token[:-2]}xx"},
+    ), 401)
+    expect("чужая выписка", client.get(
+        f"/api/v1/users/{seller_id}/statement", headers={"Authorization": f"Bearer {buyer_token}"}
+    ), 403)
+    expect("своя выписка", client.get(
+        f"/api/v1/users/{buyer_id}/statement", headers={"Authorization": f"Bearer {buyer_token}"}
+    ), 200)
+    expect("чужой профиль", client.put(
+        f"/api/v1/users/{seller_id}", json={"bio": "чужой"}, headers={"Authorization": f"Bearer {buyer_token}"}
+    ), 403)
+    expect("публичный список без токена", client.get("/api/v1/services/"), 200)
+    if created.status_code == 201:
+        client.put(
+            f"/api/v1/services/{created.json()['id']}?seller_id={seller_id}", json={"status": "active"},
+            headers={"Authorization": f"Bearer {seller_token}"},
+        )
+        order = client.post(
+            f"/api/v1/orders/?buyer_id={buyer_id}", json={"service_id": created.json()["id"]},
+            headers={"Authorization": f"Bearer {buyer_token}"},
+        )
+        expect("заказ", order, 201)
+        if order.status_code == 201:
+            problems.extend(check_websocket(client, order.json()["id"], buyer_id, buyer_token, seller_token))
+    problems.extend(check_default_secret_key(client, buyer_id, buyer_token))
+    return problems
+
+
+def check_websocket(client, order_id: int, buyer_id: int, buyer_token: str, seller_token: str) -> list[str]:
+    """WebSocket чата под actor_guard: без токена, со своим и с чужим"""
+    from starlette.websockets import WebSocketDisconnect
+
+    problems = []
+    path = f"/api/v1/orders/{order_id}/messages/ws?user_id={buyer_id}"
+    for name, url, allowed in (
+        ("без токена", path, True),
+        ("со своим токеном", f"{path}&access_token={buyer_token}", True),
+        ("с чужим токеном", f"{path}&access_token={seller_token}", False),
+    ):
+        try:
+            with client.websocket_connect(url):
+                connected = True
+        except WebSocketDisconnect:
+            connected = False
+        except Exception as e:
+            problems.append(f"WebSocket {name}: {type(e).__name__}: {e}")
+            continue
+        if connected != allowed:
+            problems.append(f"WebSocket {name}: {'открылся' if connected else 'закрыт'}")
+    return problems
+
+
+def check_default_secret_key(client, buyer_id: int, buyer_token: str) -> list[str]:
+    """С SECRET_KEY из примера токены не выдаются и не принимаются"""
+    from app.core import security
+    from app.core.config import DEFAULT_SECRET_KEY, get_settings
+
+    problems = []
+    settings = get_settings()
+    secret_key = settings.secret_key
+    settings.secret_key = DEFAULT_SECRET_KEY
+    security._claims_cache.clear()
+    try:
+        login = client.post("/api/v1/auth/telegram", json={
+            "init_data": sign_init_data({"id": 7002, "first_name": "Buyer"}, int(time.time()))
+        })
+        if login.status_code != 503:
+            problems.append(f"вход с SECRET_KEY из примера: {login.status_code} вместо 503")
+        request = client.get(
+            f"/api/v1/orders/buyer/{buyer_id}/?buyer_id={buyer_id}",
+            headers={"Authorization": f"Bearer {buyer_token}"},
+        )
+        if request.status_code != 503:
+            problems.append(f"токен при SECRET_KEY из примера: {request.status_code} вместо 503")
+    finally:
+        settings.secret_key = secret_key
+        security._claims_cache.clear()
+    return problems
+
+
+def measure(client, iterations: int, requests: int) -> None:
+    """Стоимость аутентификации одного запроса"""
+    from app.core import security
+    from app.core.config import get_settings
+    from app.db.session import SessionLocal
+    from app.models import User
+
+    settings = get_settings()
+    init_data = sign_init_data({"id": 7002, "first_name": "Buyer"}, int(time.time()))
+    session = client.post("/api/v1/auth/telegram", json={"init_data": init_data}).json()
+    token, user_id = session["access_token"], session["user_id"]
+
+    def by_init_data():
+        fields = security.verify_init_data(init_data, BOT_TOKEN, settings.init_data_max_age_seconds)
+        db = SessionLocal()
+        try:
+            db.query(User).filter(User.telegram_id == fields["user"]["id"]).first()
+        finally:
+            db.close()
+
+    def by_token_uncached():
+        security._claims_cache.clear()
+        security.decode_session_token(token)
+
+    def by_token_cached():
+        security.decode_session_token(token)
+
+    print(f"Аутентификация запроса, мкс на вызов ({iterations} повторов):")
+    print(f"  initData + поиск в БД: {per_call(by_init_data, iterations):8.1f}")
+    print(f"  токен без кэша:        {per_call(by_token_uncached, iterations):8.1f}")
+    security.decode_session_token(token)
+    print(f"  токен из кэша:         {per_call(by_token_cached, iterations):8.1f}")
+
+    path = f"/api/v1/orders/buyer/{user_id}/?buyer_id={user_id}"
+    headers = {"Authorization": f"Bearer {token}"}
+    print(f"Сквозной запрос {path}, мкс ({requests} повторов):")
+    print(f"  без токена:            {per_call(lambda: client.get(path), requests):8.1f}")
+    print(f"  с токеном:             {per_call(lambda: client.get(path, headers=headers), requests):8.1f}")
+
+
+def main():
+    args = parse_args()
+    scratch_dir = tempfile.mkdtemp(prefix="tgwork_auth_")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(scratch_dir, 'auth.db')}",
+        "TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+        "SECRET_KEY": "check-auth-secret-key",
+        "SCHEDULER_ENABLED": "false",
+        "NOTIFICATION_WORKER_IN_APP": "false",
+        "RATE_LIMIT_ENABLED": "false",
+    })
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        problems = check_rules(client)
+        if problems:
+            for problem in problems:
+                print(f"✗ {problem}")
+            sys.exit(1)
+        print("✓ Подпись initData, срок и владелец токена проверяются")
+        print()
+        measure(client, args.iterations, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+Нагрузочная проверка эскроу-леджера
+
+Много потоков одновременно оплачивают заказы одного покупателя (каждую
+оплату - дважды с одним Idempotency-Key и ещё раз без ключа), затем
+завершают заказы (каждый - дважды). Денег у покупателя хватает только на
+часть заказов; завершаются только оплаченные. Выплаты продавцу проводит
+обработчик событий outbox - очередь разбирается перед проверкой. После
+этого проверяется, что книги сходятся:
+- баланс покупателя не ушёл в минус и равен пополнению минус эскроу;
+- каждый заказ оплачен и выплачен продавцу не больше одного раза;
+- повторы с одним Idempotency-Key вернули одну и ту же транзакцию;
+- балансы сходятся с журналом транзакций (reconcile_balances);
+- WebSocket чата заказа не закрывается на переходе статуса: сообщение
+  после оплаты и обработки outbox доходит до подписчика.
+
+По умолчанию работает на временной SQLite БД. Для PostgreSQL:
+    python check_ledger.py --database-url postgresql://.../scratch_db
+(БД будет заполнена тестовыми данными - используйте пустую базу)
+"""
+import argparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+PRICE = 100
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка эскроу-леджера")
+    parser.add_argument("--database-url", help="БД для проверки (по умолчанию временная SQLite)")
+    parser.add_argument("--orders", type=int, default=60, help="Количество заказов")
+    parser.add_argument("--workers", type=int, default=16, help="Количество параллельных потоков")
+    return parser.parse_args()
+
+
+def seed(client, orders: int) -> list[int]:
+    """Продавец, покупатель, одна услуга и заказы на неё"""
+    client.post("/api/v1/users/register", json={"telegram_id": 2001, "first_name": "Seller"})
+    client.post("/api/v1/users/register", json={"telegram_id": 2002, "first_name": "Buyer"})
+    client.post("/api/v1/services/?seller_id=1", json={
+        "title": "Проверка леджера под нагрузкой",
+        "description": "Услуга для нагрузочной проверки эскроу",
+        "category": "Программирование",
+        "price": PRICE,
+    })
+    client.put("/api/v1/services/1?seller_id=1", json={"status": "active"})
+    return [
+        client.post("/api/v1/orders/?buyer_id=2", json={"service_id": 1}).json()["id"]
+        for _ in range(orders)
+    ]
+
+
+def top_up(user_id: int, amount: int) -> None:
+    """Пополнить баланс напрямую в БД (эндпоинта пополнения нет)"""
+    from datetime import datetime
+    from sqlalchemy import update
+    from app.db.session import SessionLocal
+    from app.models import User, Transaction, TransactionType, TransactionStatus
+
+    db = SessionLocal()
+    try:
+        db.execute(update(User).where(User.id == user_id).values(balance=User.balance + amount))
+        db.add(Transaction(
+            user_id=user_id,
+            type=TransactionType.BALANCE_TOP_UP,
+            amount=amount,
+            status=TransactionStatus.COMPLETED,
+            created_at=datetime.utcnow(),
+            completed_at=datetime.utcnow(),
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def check_chat_socket(client, order_id: int) -> list[str]:
+    """Чат заказа открыт во время оплаты и обработки outbox - следующее сообщение доходит"""
+    from starlette.websockets import WebSocketDisconnect
+    from app.core.scheduler import scheduler
+
+    try:
+        with client.websocket_connect(f"/api/v1/orders/{order_id}/messages/ws?user_id=2") as websocket:
+            response = client.post(f"/api/v1/orders/{order_id}/pay?buyer_id=2")
+            if response.status_code != 200:
+                return [f"чат: оплата заказа {order_id} - {response.status_code}"]
+            scheduler.run_outbox()
+            client.post(f"/api/v1/orders/{order_id}/messages/?author_id=2", json={"text": "после оплаты"})
+            event = websocket.receive_json()
+    except WebSocketDisconnect as e:
+        return [f"чат: WebSocket закрыт после перехода статуса (код {e.code})"]
+    except Exception as e:
+        return [f"чат: WebSocket упал после перехода статуса: {type(e).__name__}: {e}"]
+    if event.get("type") != "message.created" or event["message"]["text"] != "после оплаты":
+        return [f"чат: вместо сообщения пришло {event}"]
+    return []
+
+
+def check_books(funds: int, replays: dict) -> list[str]:
+    """Проверить, что книги сходятся; вернуть список расхождений"""
+    from sqlalchemy import func
+    from app.db.session import SessionLocal
+    from app.db.balances import reconcile_balances
+    from app.models import User, Order, OrderStatus, Transaction, TransactionType, TransactionStatus
+
+    problems = []
+    db = SessionLocal()
+    try:
+        buyer = db.get(User, 2)
+        seller = db.get(User, 1)
+
+        escrow_total = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(
+            Transaction.user_id == buyer.id,
+            Transaction.type == TransactionType.ORDER_ESCROW,
+            Transaction.status == TransactionStatus.COMPLETED,
+        ).scalar()
+        paid_orders = db.query(func.count(Order.id)).filter(Order.payment_date.isnot(None)).scalar()
+
+        print(f"Оплачено заказов: {paid_orders}, баланс покупателя: {buyer.balance}")
+        if buyer.balance < 0:
+            problems.append(f"баланс покупателя отрицательный: {buyer.balance}")
+        if funds - escrow_total != buyer.balance:
+            problems.append(f"пополнение {funds} - эскроу {escrow_total} != баланс {buyer.balance}")
+        if buyer.total_spent != escrow_total:
+            problems.append(f"total_spent {buyer.total_spent} != эскроу {escrow_total}")
+        if paid_orders * PRICE != escrow_total:
+            problems.append(f"оплачено заказов {paid_orders}, а эскроу {escrow_total}")
+
+        releases = db.query(Transaction.order_id, func.count(Transaction.id)).filter(
+            Transaction.type == TransactionType.ORDER_RELEASE
+        ).group_by(Transaction.order_id).all()
+        released_twice = [order_id for order_id, count in releases if count > 1]
+        if released_twice:
+            problems.append(f"выплачено дважды: заказы {released_twice}")
+
+        release_total = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(
+            Transaction.type == TransactionType.ORDER_RELEASE
+        ).scalar()
+        completed = db.query(func.count(Order.id)).filter(Order.status == OrderStatus.COMPLETED).scalar()
+        print(f"Завершено заказов: {completed}, баланс продавца: {seller.balance}")
+        if completed != paid_orders:
+            problems.append(f"оплачено {paid_orders} заказов, а завершено {completed}")
+        if len(releases) != completed:
+            problems.append(f"завершено {completed} заказов, а выплат {len(releases)}")
+        if seller.balance != release_total or seller.completed_orders != completed:
+            problems.append(f"баланс продавца {seller.balance} != выплаты {release_total}")
+
+        for mismatch in reconcile_balances(db):
+            problems.append(f"пользователь {mismatch['user_id']}: баланс не сходится с журналом ({mismatch['difference']})")
+    finally:
+        db.close()
+
+    for order_id, transaction_ids in replays.items():
+        if len(transaction_ids) > 1:
+            problems.append(f"заказ {order_id}: один Idempotency-Key дал разные транзакции {transaction_ids}")
+    return problems
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        scratch_dir = tempfile.mkdtemp(prefix="tgwork_ledger_")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch_dir, 'ledger.db')}"
+    # Скрипт шлёт запросы с одного адреса быстрее любого лимита
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.core.scheduler import scheduler
+
+    # Денег хватает только на половину заказов
+    funds = PRICE * (args.orders // 2)
+
+    # 5xx должны попасть в статистику, а не оборвать поток исключением
+    with TestClient(app, raise_server_exceptions=False) as client:
+        order_ids = seed(client, args.orders)
+        top_up(2, funds)
+        # Первый заказ оплачивается при открытом чате, остальные - под нагрузкой
+        socket_problems = check_chat_socket(client, order_ids[0])
+
+        def pay(order_id: int, key):
+            headers = {"Idempotency-Key": key} if key else {}
+            return order_id, client.post(f"/api/v1/orders/{order_id}/pay?buyer_id=2", headers=headers)
+
+        def complete(order_id: int):
+            return order_id, client.put(f"/api/v1/orders/{order_id}?user_id=2", json={"status": "completed"})
+
+        # Сначала параллельные оплаты, затем параллельные завершения: завершить
+        # можно только оплаченный заказ, повтор завершения ничего не меняет
+        pay_calls = []
+        complete_calls = []
+        for order_id in order_ids:
+            pay_calls += [(pay, (order_id, f"pay-{order_id}")), (pay, (order_id, f"pay-{order_id}")), (pay, (order_id, None))]
+            complete_calls += [(complete, (order_id,)), (complete, (order_id,))]
+        
+        results = []
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            for calls in (pay_calls, complete_calls):
+                results += list(pool.map(lambda call: call[0](*call[1]), calls))
+        
+        # Выплаты по завершённым заказам
+        scheduler.run_outbox()
+
+    statuses = {}
+    replays = {}
+    for order_id, response in results:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        body = response.json()
+        if "transaction_id" in body:
+            replays.setdefault(order_id, set()).add(body["transaction_id"])
+    print(f"Запросов: {len(results)}, ответы: {dict(sorted(statuses.items()))}")
+
+    problems = check_books(funds, replays) + socket_problems
+    if any(code >= 500 for code in statuses):
+        problems.append("были ответы 5xx")
+
+    print()
+    if problems:
+        for problem in problems:
+            print(f"✗ {problem}")
+        sys.exit(1)
+    print("✓ Книги сходятся")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Проверка точности денежной арифметики (Money, целые копейки)
+
+Моделирует N заказов со случайными ценами и процентами комиссии и проверяет
+свойства, которые должны выполняться точно, до копейки:
+- комиссия + доля продавца == цена (для каждого заказа и в сумме);
+- 0 <= комиссия <= цена, комиссия округлена до копейки по ROUND_HALF_UP;
+- SUM(amount) в SQL по колонке MoneyType равна сумме в Python.
+
+Для сравнения выводится, насколько ушла бы та же сумма при расчёте во float
+(как было раньше). Генератор детерминирован (--seed).
+
+    python check_money.py                     # 10 млн заказов
+    python check_money.py --orders 100000     # быстрый прогон
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+FEE_PERCENTS = [5, 7.5, 10, 12.5, 15, 20]
+MAX_PRICE_KOPECKS = 10_000_000  # 100 000 руб.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проверка точности денежной арифметики")
+    parser.add_argument("--orders", type=int, default=10_000_000, help="Количество заказов")
+    parser.add_argument("--db-rows", type=int, default=100_000, help="Сколько сумм записать в БД для проверки SUM()")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def check_orders(orders: int, sample_size: int, rng: random.Random) -> tuple[list[str], list]:
+    """Свойства комиссии на orders заказах; вернуть расхождения и первые sample_size сумм для БД"""
+    from app.types import Money
+
+    problems = []
+    total_price = total_fee = total_gets = 0
+    float_gets = 0.0
+    sample = []
+
+    for i in range(orders):
+        price = Money.from_kopecks(rng.randint(1, MAX_PRICE_KOPECKS))
+        percent = rng.choice(FEE_PERCENTS)
+        fee = price.percent(percent)
+        gets = price - fee
+
+        if fee + gets != price or not 0 <= fee <= price:
+            problems.append(f"заказ {i}: цена {price}, комиссия {fee}, продавцу {gets}")
+        if i % 1000 == 0:
+            expected = (price * Decimal(str(percent)) / 100).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            if fee != expected:
+                problems.append(f"заказ {i}: комиссия {fee}, ожидалось {expected}")
+        if len(problems) >= 10:
+            break
+
+        total_price += price.kopecks
+        total_fee += fee.kopecks
+        total_gets += gets.kopecks
+        float_price = price.kopecks / 100
+        float_gets += float_price - float_price * (percent / 100)
+        if len(sample) < sample_size:
+            sample.append(gets)
+
+    exact_gets = Money.from_kopecks(total_gets)
+    print(f"Заказов: {orders}")
+    print(f"Сумма цен: {Money.from_kopecks(total_price)}, комиссий: {Money.from_kopecks(total_fee)}, продавцам: {exact_gets}")
+    print(f"Та же сумма продавцам во float: {float_gets:.6f} (расхождение {float_gets - float(exact_gets):+.6f})")
+    if total_fee + total_gets != total_price:
+        problems.append("сумма комиссий и долей продавцов не равна сумме цен")
+    return problems, sample
+
+
+def check_sql_sum(amounts: list) -> list[str]:
+    """SUM() по колонке MoneyType в SQLite совпадает с суммой в Python"""
+    from sqlalchemy import Column, Integer, MetaData, Table, create_engine, func, insert, select
+    from app.types import Money, MoneyType
+
+    metadata = MetaData()
+    table = Table("money_check", metadata, Column("id", Integer, primary_key=True), Column("amount", MoneyType))
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        conn.execute(insert(table), [{"amount": amount} for amount in amounts])
+        sql_total = conn.execute(select(func.sum(table.c.amount))).scalar()
+
+    python_total = sum(amounts, Money(0))
+    print(f"SUM() в SQL по {len(amounts)} строкам: {sql_total}, в Python: {python_total}")
+    if sql_total != python_total:
+        return [f"SUM() в SQL {sql_total} != {python_total}"]
+    return []
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    started = time.perf_counter()
+    problems, sample = check_orders(args.orders, args.db_rows, rng)
+    problems += check_sql_sum(sample)
+    print(f"Готово за {time.perf_counter() - started:.1f} с")
+
+    print()
+    if problems:
+        for problem in problems:
+            print(f"✗ {problem}")
+        sys.exit(1)
+    print("✓ Все суммы сходятся до копейки")
+
+
+if __name__ == "__main__":
+    main()
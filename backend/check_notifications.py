@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+Сквозная проверка уведомлений в Telegram на фейковом Bot API
+
+Поднимает локальный сервер, который отвечает как api.telegram.org на
+sendMessage и сам следит за лимитами (сообщений в секунду на бота и
+интервал между сообщениями в один чат): нарушение - ответ 429 и запись в
+статистику. Кроме того сервер нарочно отвечает 500 на часть запросов, 429
+с retry_after на первое сообщение одному из чатов и 403 ("бот
+заблокирован") одному из пользователей.
+
+Через API проходит весь путь заказа: создание, оплата, сообщения в чате,
+сдача, завершение, отзыв. Затем события outbox превращаются в уведомления,
+и воркер отправляет очередь. Проверяется:
+- каждое уведомление доставлено ровно один раз (кроме заблокировавшего бота);
+- заблокировавшему бота - отказ без повторов;
+- лимиты ни разу не нарушены.
+
+    python check_notifications.py                 # 10 покупателей
+    python check_notifications.py --buyers 30 --chat-interval 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+SELLER_TELEGRAM_ID = 5000
+BLOCKED_TELEGRAM_ID = 5002  # Этот покупатель заблокировал бота
+THROTTLED_TELEGRAM_ID = 5003  # Первое сообщение ему - 429
+FAIL_EVERY = 7  # Каждый N-й запрос - 500
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проверка уведомлений на фейковом Telegram")
+    parser.add_argument("--buyers", type=int, default=10, help="Количество покупателей (по заказу на каждого)")
+    parser.add_argument("--global-rate", type=float, default=30.0, help="Лимит сообщений в секунду на бота")
+    parser.add_argument("--chat-interval", type=float, default=0.2, help="Интервал между сообщениями в чат (в Telegram - 1 с)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Сколько ждать доставки всей очереди (секунды)")
+    return parser.parse_args()
+
+
+class FakeTelegram(ThreadingHTTPServer):
+    """Bot API sendMessage с проверкой лимитов и подстроенными ошибками"""
+
+    def __init__(self, global_rate: float, chat_interval: float):
+        super().__init__(("127.0.0.1", 0), FakeTelegramHandler)
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.delivered: list[tuple[int, str]] = []
+        self.violations: list[str] = []
+        self.recent: deque = deque()
+        self.last_in_chat: dict[int, float] = {}
+        self.throttled: set[int] = set()
+
+    def handle_send(self, chat_id: int, text: str) -> tuple[int, dict]:
+        now = time.monotonic()
+        with self.lock:
+            self.requests += 1
+
+            # Лимиты - как их соблюдает Telegram (с небольшим допуском на таймеры)
+            while self.recent and self.recent[0] <= now - 1:
+                self.recent.popleft()
+            if len(self.recent) >= self.global_rate + 1:
+                self.violations.append(f"больше {self.global_rate:g} сообщений в секунду")
+                return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 1}}
+            last = self.last_in_chat.get(chat_id)
+            if last is not None and now - last < self.chat_interval * 0.9:
+                self.violations.append(f"чат {chat_id}: сообщения через {now - last:.3f} с")
+                return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 1}}
+            self.recent.append(now)
+            self.last_in_chat[chat_id] = now
+
+            # Подстроенные ошибки
+            if chat_id == BLOCKED_TELEGRAM_ID:
+                return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+            if chat_id == THROTTLED_TELEGRAM_ID and chat_id not in self.throttled:
+                self.throttled.add(chat_id)
+                return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 1}}
+            if self.requests % FAIL_EVERY == 0:
+                return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+
+            self.delivered.append((chat_id, text))
+            return 200, {"ok": True, "result": {"message_id": len(self.delivered), "chat": {"id": chat_id}, "text": text}}
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/sendMessage"):
+            code, answer = 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        else:
+            code, answer = self.server.handle_send(int(body["chat_id"]), body["text"])
+        data = json.dumps(answer).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_orders(client, buyers: int) -> None:
+    """Полный путь заказа для каждого покупателя"""
+    from sqlalchemy import update
+    from app.db.session import SessionLocal
+    from app.models import User
+
+    client.post("/api/v1/users/register", json={"telegram_id": SELLER_TELEGRAM_ID, "first_name": "Seller"})
+    client.post("/api/v1/services/?seller_id=1", json={
+        "title": "Проверка уведомлений",
+        "description": "Услуга для проверки уведомлений в Telegram",
+        "category": "Программирование",
+        "price": 100,
+    })
+    client.put("/api/v1/services/1?seller_id=1", json={"status": "active"})
+
+    for i in range(buyers):
+        buyer_id = client.post("/api/v1/users/register", json={
+            "telegram_id": SELLER_TELEGRAM_ID + 1 + i, "first_name": f"Buyer {i}"
+        }).json()["id"]
+        db = SessionLocal()
+        try:
+            db.execute(update(User).where(User.id == buyer_id).values(balance=1000))
+            db.commit()
+        finally:
+            db.close()
+
+        order_id = client.post(f"/api/v1/orders/?buyer_id={buyer_id}", json={"service_id": 1}).json()["id"]
+        client.post(f"/api/v1/orders/{order_id}/pay?buyer_id={buyer_id}")
+        client.post(f"/api/v1/orders/{order_id}/messages/?author_id={buyer_id}", json={"text": f"Здравствуйте! Заказ {i}"})
+        client.post(f"/api/v1/orders/{order_id}/messages/?author_id=1", json={"text": f"Добрый день, приступаю {i}"})
+        client.put(f"/api/v1/orders/{order_id}?user_id=1", json={"status": "under_review"})
+        client.put(f"/api/v1/orders/{order_id}?user_id={buyer_id}", json={"status": "completed"})
+        client.post(f"/api/v1/orders/{order_id}/review/?reviewer_id={buyer_id}", json={"rating": 5, "text": "Спасибо"})
+
+
+async def deliver(timeout: float) -> None:
+    """Отправлять очередь, пока в ней есть не доставленные и не отклонённые"""
+    from sqlalchemy import func
+    from app.core.notifier import notifier
+    from app.db.session import SessionLocal
+    from app.models import Notification, NotificationStatus
+
+    deadline = time.monotonic() + timeout
+    async with notifier:
+        while time.monotonic() < deadline:
+            await notifier.drain()
+            db = SessionLocal()
+            try:
+                waiting_until = db.query(func.min(Notification.next_attempt_at)).filter(
+                    Notification.status.in_([NotificationStatus.PENDING, NotificationStatus.SENDING])
+                ).scalar()
+            finally:
+                db.close()
+            if waiting_until is None:
+                return
+            await asyncio.sleep(0.2)
+
+
+def check(server: FakeTelegram) -> list[str]:
+    """Сверить очередь с тем, что получил фейковый Telegram"""
+    from app.db.session import SessionLocal
+    from app.models import Notification, NotificationStatus
+
+    problems = []
+    db = SessionLocal()
+    try:
+        notifications = db.query(Notification).all()
+    finally:
+        db.close()
+
+    by_status = Counter(n.status.value for n in notifications)
+    print(f"Уведомлений: {len(notifications)}, по статусам: {dict(by_status)}")
+    print(f"Запросов к Telegram: {server.requests}, доставлено: {len(server.delivered)}")
+
+    expected = Counter((n.chat_id, n.text) for n in notifications if n.chat_id != BLOCKED_TELEGRAM_ID)
+    delivered = Counter(server.delivered)
+    if delivered != expected:
+        missing = expected - delivered
+        duplicated = delivered - expected
+        if missing:
+            problems.append(f"не доставлено: {sum(missing.values())}")
+        if duplicated:
+            problems.append(f"доставлено лишний раз: {sum(duplicated.values())}")
+
+    for n in notifications:
+        if n.chat_id == BLOCKED_TELEGRAM_ID and (n.status != NotificationStatus.FAILED or n.attempts != 1):
+            problems.append(f"уведомление {n.id} заблокировавшему бота: {n.status.value}, попыток {n.attempts}")
+        elif n.chat_id != BLOCKED_TELEGRAM_ID and n.status != NotificationStatus.SENT:
+            problems.append(f"уведомление {n.id}: {n.status.value} ({n.last_error})")
+
+    per_chat = defaultdict(int)
+    for chat_id, _ in server.delivered:
+        per_chat[chat_id] += 1
+    print(f"Больше всего сообщений в один чат: {max(per_chat.values(), default=0)}")
+    for violation in server.violations:
+        problems.append(f"нарушен лимит: {violation}")
+    return problems
+
+
+def main():
+    args = parse_args()
+    server = FakeTelegram(args.global_rate, args.chat_interval)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    scratch_dir = tempfile.mkdtemp(prefix="tgwork_notify_")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(scratch_dir, 'notify.db')}",
+        "TELEGRAM_BOT_TOKEN": "123456:fake",
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{server.server_address[1]}",
+        "TELEGRAM_GLOBAL_RATE": str(args.global_rate),
+        "TELEGRAM_CHAT_INTERVAL_SECONDS": str(args.chat_interval),
+        # Очередь разбираем сами, а не фоновыми задачами
+        "SCHEDULER_ENABLED": "false",
+        "NOTIFICATION_WORKER_IN_APP": "false",
+        "RATE_LIMIT_ENABLED": "false",
+    })
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.core.scheduler import scheduler
+
+    with TestClient(app) as client:
+        run_orders(client, args.buyers)
+
+    started = time.perf_counter()
+    print(f"Событий обработано: {scheduler.run_outbox()['events']}")
+    asyncio.run(deliver(args.timeout))
+    print(f"Очередь отправлена за {time.perf_counter() - started:.1f} с")
+    server.shutdown()
+
+    problems = check(server)
+    print()
+    if problems:
+        for problem in problems[:20]:
+            print(f"✗ {problem}")
+        sys.exit(1)
+    print("✓ Все уведомления доставлены ровно один раз, лимиты соблюдены")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+"""
+Скрипт для проверки планов запросов API
+
+Вызывает основные маршруты через TestClient, перехватывает все SELECT'ы,
+которые они выполняют, и прогоняет их через EXPLAIN QUERY PLAN (SQLite)
+или EXPLAIN (PostgreSQL). Если запрос читает таблицу полным сканированием
+без индекса - скрипт завершается с кодом 1 (как и если заполнение или
+маршрут ответили не 2xx: тогда часть запросов не была бы проверена).
+Для списков с пагинацией ошибка и сортировка без индекса (USE TEMP B-TREE
+FOR ORDER BY): иначе каждая страница сортирует все подходящие строки.
+
+По умолчанию работает на временной SQLite БД. Для PostgreSQL:
+    python check_query_plans.py --database-url postgresql://.../scratch_db
+(БД будет заполнена тестовыми данными - используйте пустую базу)
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+# Маршруты и запросы к ним: (имя, метод, путь, параметры)
+ENDPOINTS = [
+    ("get_service", "GET", "/api/v1/services/1", {}),
+    ("list_services", "GET", "/api/v1/services/", {"limit": 2}),
+    ("list_services_category", "GET", "/api/v1/services/", {"category": "Программирование", "limit": 2}),
+    ("list_services_cursor", "GET", "/api/v1/services/", {"limit": 1, "cursor": "{next_cursor}"}),
+    ("list_services_category_cursor", "GET", "/api/v1/services/",
+     {"category": "Программирование", "limit": 1, "cursor": "{next_cursor}"}),
+    ("search_services", "GET", "/api/v1/services/search/", {"q": "ботов"}),
+    ("get_service_facets", "GET", "/api/v1/services/facets/", {}),
+    ("get_services_by_tags", "GET", "/api/v1/services/by-tags/", {"tags": "python,telegram"}),
+    ("get_seller_services", "GET", "/api/v1/services/seller/1/", {}),
+    ("get_user", "GET", "/api/v1/users/1", {}),
+    ("get_user_by_telegram_id", "GET", "/api/v1/users/telegram/1001", {}),
+    ("get_user_public_profile", "GET", "/api/v1/users/public/1", {}),
+    ("list_users", "GET", "/api/v1/users/", {}),
+    ("list_users_cursor", "GET", "/api/v1/users/", {"limit": 1, "cursor": "{next_cursor}"}),
+    ("get_users_by_skills", "GET", "/api/v1/users/by-skills/", {"skills": "python"}),
+    ("search_users_by_name", "GET", "/api/v1/users/search/by-name", {"q": "Seller"}),
+    ("get_order", "GET", "/api/v1/orders/1", {}),
+    ("get_buyer_orders", "GET", "/api/v1/orders/buyer/2/", {}),
+    ("get_buyer_orders_status", "GET", "/api/v1/orders/buyer/2/", {"status_filter": "COMPLETED"}),
+    ("get_buyer_orders_cursor", "GET", "/api/v1/orders/buyer/2/", {"limit": 1, "cursor": "{next_cursor}"}),
+    ("get_seller_orders", "GET", "/api/v1/orders/seller/1/", {}),
+    ("get_seller_orders_cursor", "GET", "/api/v1/orders/seller/1/", {"limit": 1, "cursor": "{next_cursor}"}),
+    ("get_seller_orders_status", "GET", "/api/v1/orders/seller/1/", {"status_filter": "COMPLETED"}),
+    ("get_messages", "GET", "/api/v1/orders/1/messages/", {"user_id": 2}),
+    ("get_review", "GET", "/api/v1/orders/1/review/", {}),
+    ("get_user_reviews", "GET", "/api/v1/orders/user/1/reviews/", {}),
+    ("get_top_rated_sellers", "GET", "/api/v1/orders/top-rated/", {}),
+    ("get_reviews_by_rating", "GET", "/api/v1/orders/by-rating/", {"rating": 5}),
+    ("get_statement", "GET", "/api/v1/users/1/statement", {}),
+    ("get_balance", "GET", "/api/v1/users/1/balance", {}),
+]
+
+# Списки с пагинацией: сортировка должна идти по индексу
+PAGINATED = {
+    "list_services", "list_services_category", "list_services_cursor", "list_services_category_cursor",
+    "get_services_by_tags", "get_seller_services",
+    "list_users", "list_users_cursor", "get_users_by_skills",
+    "get_buyer_orders", "get_buyer_orders_status", "get_buyer_orders_cursor",
+    "get_seller_orders", "get_seller_orders_status", "get_seller_orders_cursor",
+    "get_messages", "get_user_reviews", "get_statement",
+}
+
+# Запросы, где полный проход по таблице ожидаем (с причиной)
+KNOWN_SCANS = {
+    "search_users_by_name": "ILIKE '%q%' по имени не может использовать индекс",
+}
+
+SQLITE_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+POSTGRES_SCAN_RE = re.compile(r"Seq Scan on (\w+)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проверка планов запросов API")
+    parser.add_argument("--database-url", help="БД для проверки (по умолчанию временная SQLite)")
+    return parser.parse_args()
+
+
+def top_up(user_id: int, amount: int) -> None:
+    """Пополнить баланс напрямую в БД (эндпоинта пополнения нет)"""
+    from datetime import datetime
+    from sqlalchemy import update
+    from app.db.session import SessionLocal
+    from app.models import User, Transaction, TransactionType, TransactionStatus
+
+    db = SessionLocal()
+    try:
+        db.execute(update(User).where(User.id == user_id).values(balance=User.balance + amount))
+        db.add(Transaction(
+            user_id=user_id,
+            type=TransactionType.BALANCE_TOP_UP,
+            amount=amount,
+            status=TransactionStatus.COMPLETED,
+            created_at=datetime.utcnow(),
+            completed_at=datetime.utcnow(),
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def seed(client) -> list[str]:
+    """Минимальный набор данных, чтобы маршруты дошли до всех запросов; вернуть ошибки"""
+    problems = []
+
+    def call(method: str, path: str, **kwargs) -> None:
+        response = client.request(method, path, **kwargs)
+        if not 200 <= response.status_code < 300:
+            problems.append(f"{method} {path}: HTTP {response.status_code} ({response.text[:100]})")
+
+    call("POST", "/api/v1/users/register", json={"telegram_id": 1001, "first_name": "Seller", "skills": "python,django"})
+    call("POST", "/api/v1/users/register", json={"telegram_id": 1002, "first_name": "Buyer"})
+    for i in range(2):
+        call("POST", "/api/v1/services/?seller_id=1", json={
+            "title": f"Разработка телеграм ботов {i}",
+            "description": "Напишу бота на Python под ваши задачи",
+            "category": "Программирование",
+            "tags": "python,telegram",
+            "price": 1000,
+        })
+        call("PUT", f"/api/v1/services/{i + 1}?seller_id=1", json={"status": "active"})
+    top_up(2, 1000)
+    # Заказ по всем статусам до отзыва: оплата, сдача, приёмка
+    call("POST", "/api/v1/orders/?buyer_id=2", json={"service_id": 1})
+    # Второй заказ - чтобы у списков заказов была следующая страница
+    call("POST", "/api/v1/orders/?buyer_id=2", json={"service_id": 2})
+    call("POST", "/api/v1/orders/1/messages/?author_id=2", json={"text": "Здравствуйте!"})
+    call("POST", "/api/v1/orders/1/pay?buyer_id=2")
+    call("PUT", "/api/v1/orders/1?user_id=1", json={"status": "under_review"})
+    call("PUT", "/api/v1/orders/1?user_id=2", json={"status": "completed"})
+    call("POST", "/api/v1/orders/1/review/?reviewer_id=2", json={"rating": 5, "text": "Отлично"})
+    return problems
+
+
+def explain(conn, dialect: str, statement: str, parameters) -> list[str]:
+    """План запроса в виде списка строк"""
+    if dialect == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        return [row[-1] for row in rows]
+    rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+    return [row[0] for row in rows]
+
+
+def find_scans(dialect: str, plan: list[str]) -> list[str]:
+    """Таблицы, которые читаются полным сканированием"""
+    pattern = SQLITE_SCAN_RE if dialect == "sqlite" else POSTGRES_SCAN_RE
+    scans = []
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match:
+            scans.append(match.group(1))
+    return scans
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        scratch_dir = tempfile.mkdtemp(prefix="tgwork_plans_")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch_dir, 'plans.db')}"
+    # Скрипт шлёт запросы с одного адреса быстрее любого лимита
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.db.session import engine
+
+    dialect = engine.dialect.name
+    captured = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            captured.append((statement, parameters))
+
+    failures = []
+    with TestClient(app) as client:
+        seed_problems = seed(client)
+        for problem in seed_problems:
+            print(f"✗ Заполнение: {problem}")
+        if seed_problems:
+            sys.exit(1)
+
+        for name, method, path, params in ENDPOINTS:
+            if params.get("cursor") == "{next_cursor}":
+                # Курсор - из первой страницы того же списка
+                first_page = {key: value for key, value in params.items() if key != "cursor"}
+                next_cursor = client.get(path, params=first_page).headers.get("x-next-cursor")
+                if not next_cursor:
+                    print(f"{name}: ✗ у первой страницы нет X-Next-Cursor")
+                    failures.append((name, "нет курсора"))
+                    continue
+                params = {**params, "cursor": next_cursor}
+            captured.clear()
+            response = client.request(method, path, params=params)
+            statements = list(captured)
+            print(f"{name}: HTTP {response.status_code}, запросов {len(statements)}")
+            if not 200 <= response.status_code < 300:
+                print(f"   ✗ маршрут ответил HTTP {response.status_code}: {response.text[:100]}")
+                failures.append((name, f"HTTP {response.status_code}"))
+
+            with engine.connect() as conn:
+                if dialect == "postgresql":
+                    # На маленьких таблицах PostgreSQL выберет seq scan и при наличии индекса
+                    conn.exec_driver_sql("SET enable_seqscan = off")
+                for statement, parameters in statements:
+                    plan = explain(conn, dialect, statement, parameters)
+                    if any("TEMP B-TREE FOR ORDER BY" in line for line in plan):
+                        if name in PAGINATED:
+                            print("   ✗ список сортируется без индекса (USE TEMP B-TREE FOR ORDER BY)")
+                            print("     " + " ".join(statement.split()))
+                            failures.append((name, "сортировка"))
+                        else:
+                            print("   ~ сортировка без индекса (USE TEMP B-TREE FOR ORDER BY)")
+                    for table in find_scans(dialect, plan):
+                        if name in KNOWN_SCANS:
+                            print(f"   ~ {table}: полный проход ({KNOWN_SCANS[name]})")
+                            continue
+                        print(f"   ✗ {table}: полный проход по таблице")
+                        print("     " + " ".join(statement.split()))
+                        for line in plan:
+                            print(f"       {line}")
+                        failures.append((name, table))
+
+    print()
+    if failures:
+        print(f"✗ Маршрутов с ошибкой, запросов с полным сканированием таблиц или сортировкой списка без индекса: {len(failures)}")
+        sys.exit(1)
+    print("✓ Все запросы используют индексы")
+
+
+if __name__ == "__main__":
+    main()
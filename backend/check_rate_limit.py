@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Проверка ограничения частоты запросов и замер его накладных расходов
+
+Сначала через TestClient с маленькими лимитами проверяет правила: ведро
+выдаёт ровно ёмкость, дальше 429 с Retry-After; у маршрута с собственным
+правилом - своё ведро; у пользователя с токеном - своё, отдельно от IP;
+ведро пополняется со временем.
+
+Затем замеряет стоимость middleware на голом ASGI-приложении (без сети и
+FastAPI): мкс на запрос и доля ядра при 10 000 запросов в секунду - для
+маршрута с собственным правилом и для общего, с токеном и без.
+
+    python check_rate_limit.py
+    python check_rate_limit.py --requests 200000 --clients 50000
+    python check_rate_limit.py --redis               # то же на Redis (REDIS_URL)
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+TARGET_RPS = 10000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проверка ограничения частоты запросов")
+    parser.add_argument("--requests", type=int, default=100000, help="Запросов в замере")
+    parser.add_argument("--clients", type=int, default=10000, help="Разных клиентов (IP) в замере")
+    parser.add_argument("--redis", action="store_true", help="Вёдра в Redis вместо памяти")
+    return parser.parse_args()
+
+
+def check_rules(client) -> list[str]:
+    """Правила при RATE_LIMIT_DEFAULT=5/1 и search_services=3/60"""
+    from app.core.security import create_session_token
+
+    problems = []
+
+    def codes(path: str, count: int, headers: dict = None) -> list[int]:
+        return [client.get(path, headers=headers).status_code for _ in range(count)]
+
+    statuses = codes("/api/v1/services/", 6)
+    if statuses != [200] * 5 + [429]:
+        problems.append(f"общее правило 5/1: {statuses}")
+    limited = client.get("/api/v1/services/")
+    if limited.status_code == 429 and limited.headers.get("retry-after") != "1":
+        problems.append(f"Retry-After: {limited.headers.get('retry-after')} вместо 1")
+
+    statuses = codes("/api/v1/services/search/?q=бот", 4)
+    if statuses != [200] * 3 + [429]:
+        problems.append(f"search_services 3/60 (своё ведро): {statuses}")
+    retry_after = int(client.get("/api/v1/services/search/?q=бот").headers.get("retry-after", 0))
+    if not 15 <= retry_after <= 20:
+        problems.append(f"search_services: Retry-After {retry_after} вместо ~20")
+
+    token, _ = create_session_token(1, 1001)
+    statuses = codes("/api/v1/services/", 5, {"Authorization": f"Bearer {token}"})
+    if statuses != [200] * 5:
+        problems.append(f"пользователь с токеном - не своё ведро: {statuses}")
+
+    if client.get("/health").status_code != 200:
+        problems.append("/health ограничивается")
+
+    time.sleep(1.1)
+    statuses = codes("/api/v1/services/", 5)
+    if statuses != [200] * 5:
+        problems.append(f"ведро не пополнилось за секунду: {statuses}")
+
+    stats = client.get("/health/ratelimit").json()
+    print(f"Счётчики: {json.dumps(stats['rules'], ensure_ascii=False)}")
+    if stats["rules"]["default"]["limited"] < 2 or stats["rules"]["search_services"]["limited"] < 2:
+        problems.append("счётчики отказов не растут")
+    return problems
+
+
+async def measure(requests: int, clients: int) -> None:
+    """Накладные расходы middleware на голом ASGI-приложении"""
+    from app.core.ratelimit import RateLimitMiddleware, RateLimit, RateLimiter, MemoryBuckets, RedisBuckets
+    from app.core.config import get_settings
+    from app.core.security import create_session_token
+    from app.main import app as fastapi_app
+
+    settings = get_settings()
+
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    def scopes(path: str, headers: list) -> list[dict]:
+        return [
+            {
+                "type": "http", "method": "GET", "path": path, "root_path": "",
+                "query_string": b"", "headers": headers,
+                "client": (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 50000),
+                "app": fastapi_app,
+            }
+            for i in range(clients)
+        ]
+
+    async def per_request(handler, batch: list[dict]) -> float:
+        started = time.perf_counter()
+        for i in range(requests):
+            await handler(batch[i % len(batch)], receive, send)
+        return (time.perf_counter() - started) / requests * 1e6
+
+    buckets = RedisBuckets(settings.redis_url) if settings.rate_limit_backend == "redis" else MemoryBuckets(settings.rate_limit_max_keys)
+    # Лимит заведомо выше нагрузки: замеряем стоимость проверки, а не отказы
+    limiter = RateLimiter(
+        default=RateLimit.parse("1000000/1"),
+        routes={"search_services": RateLimit.parse("1000000/1")},
+        buckets=buckets,
+        api_prefix=settings.api_v1_prefix,
+        trust_forwarded=False,
+    )
+    limited = RateLimitMiddleware(endpoint, limiter)
+    token, _ = create_session_token(1, 1001)
+    cases = [
+        ("общее правило, по IP", scopes("/api/v1/services/", [])),
+        ("своё правило маршрута, по IP", scopes("/api/v1/services/search/", [])),
+        ("общее правило, по токену", scopes("/api/v1/services/", [(b"authorization", f"Bearer {token}".encode())])),
+    ]
+
+    baseline = await per_request(endpoint, cases[0][1])
+    print(f"Накладные расходы, {type(buckets).__name__}, {requests} запросов от {clients} клиентов:")
+    print(f"  без ограничения: {baseline:6.2f} мкс на запрос")
+    for name, batch in cases:
+        cost = await per_request(limited, batch) - baseline
+        print(f"  {name:30} +{cost:6.2f} мкс, при {TARGET_RPS} запросов/с - {cost * TARGET_RPS / 1e4:.1f}% ядра")
+    print(f"  вёдер в памяти: {len(buckets)}")
+
+
+def main():
+    args = parse_args()
+    scratch_dir = tempfile.mkdtemp(prefix="tgwork_ratelimit_")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(scratch_dir, 'ratelimit.db')}",
+        "SCHEDULER_ENABLED": "false",
+        "NOTIFICATION_WORKER_IN_APP": "false",
+        "SECRET_KEY": "check-rate-limit-secret-key",
+        "RATE_LIMIT_ENABLED": "true",
+        "RATE_LIMIT_BACKEND": "redis" if args.redis else "memory",
+        "RATE_LIMIT_DEFAULT": "5/1",
+        "RATE_LIMIT_ROUTES": json.dumps({"search_services": "3/60"}),
+    })
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        problems = check_rules(client)
+    if problems:
+        for problem in problems:
+            print(f"✗ {problem}")
+        sys.exit(1)
+    print("✓ Лимиты, Retry-After и отдельные вёдра работают")
+    print()
+    asyncio.run(measure(args.requests, args.clients))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Проверка количества SQL-запросов в списках отзывов
+
+Автор и получатель отзыва подгружаются JOIN'ом в том же SELECT, поэтому
+число запросов маршрута не должно зависеть от числа отзывов в ответе.
+Скрипт заполняет временную БД генератором тестовых данных, вызывает
+списки отзывов с маленькой и большой страницей и считает выполненные
+SELECT'ы. Если на большой странице запросов больше - где-то ленивая
+загрузка на каждую строку (N+1), скрипт завершается с кодом 1.
+
+    python check_review_queries.py
+    python check_review_queries.py --small 2 --large 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проверка количества запросов в списках отзывов")
+    parser.add_argument("--small", type=int, default=2, help="Размер маленькой страницы")
+    parser.add_argument("--large", type=int, default=50, help="Размер большой страницы (не больше 100)")
+    parser.add_argument("--database-url", help="БД для проверки (по умолчанию временная SQLite)")
+    return parser.parse_args()
+
+
+def busiest(engine) -> tuple[int, int, int]:
+    """Продавец с наибольшим числом отзывов, самая частая и самая редкая оценка"""
+    from sqlalchemy import func, select
+    from app.models import Review
+
+    with engine.connect() as conn:
+        user_id = conn.execute(
+            select(Review.reviewed_user_id)
+            .group_by(Review.reviewed_user_id)
+            .order_by(func.count(Review.id).desc())
+            .limit(1)
+        ).scalar()
+        ratings = conn.execute(
+            select(Review.rating).group_by(Review.rating).order_by(func.count(Review.id).desc())
+        ).scalars().all()
+    return user_id, ratings[0], ratings[-1]
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        scratch_dir = tempfile.mkdtemp(prefix="tgwork_reviews_")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch_dir, 'reviews.db')}"
+    # Скрипт шлёт запросы с одного адреса быстрее любого лимита
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.db.session import engine
+    from app.db.seed import SeedDistribution, SeedSizes, seed_database
+
+    captured = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append(statement)
+
+    failures = []
+    with TestClient(app) as client:
+        seed_database(
+            engine,
+            SeedSizes(users=200, services=100, orders=1000, messages=0),
+            distribution=SeedDistribution(popularity_skew=3.0),
+        )
+        user_id, common_rating, rare_rating = busiest(engine)
+
+        def count(path: str, params: dict) -> tuple[int, int]:
+            """(отзывов в ответе, SELECT'ов)"""
+            captured.clear()
+            response = client.get(path, params=params)
+            if response.status_code != 200:
+                failures.append(f"{path}: HTTP {response.status_code}")
+            return len(response.json()), len(captured)
+
+        # Одинаковый маршрут, разное число отзывов в ответе
+        checks = [
+            ("get_user_reviews", f"/api/v1/orders/user/{user_id}/reviews/",
+             {"limit": args.small}, {"limit": args.large}),
+            ("get_reviews_by_rating", "/api/v1/orders/by-rating/",
+             {"rating": rare_rating}, {"rating": common_rating}),
+        ]
+        for name, path, small_params, large_params in checks:
+            small_rows, small_queries = count(path, small_params)
+            large_rows, large_queries = count(path, large_params)
+            print(f"{name}: {small_rows} отзывов - {small_queries} запросов, "
+                  f"{large_rows} отзывов - {large_queries} запросов")
+            if large_rows <= small_rows:
+                failures.append(f"{name}: в большой странице не больше отзывов ({large_rows} <= {small_rows})")
+            elif large_queries > small_queries:
+                failures.append(f"{name}: запросов растёт с числом отзывов ({small_queries} -> {large_queries})")
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"✗ {failure}")
+        sys.exit(1)
+    print("✓ Число запросов не зависит от размера страницы")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Скрипт ночного сжатия журнала транзакций в снимки балансов
+
+Сохраняет BalanceSnapshot на полночь (UTC) текущих суток для всех, у кого
+после предыдущего снимка были транзакции. После этого баланс на дату и
+выписка суммируют только транзакции после снимка.
+
+В приложении то же самое раз в сутки делает планировщик (app/core/scheduler.py);
+скрипт - для ручного запуска или cron при SCHEDULER_ENABLED=false:
+    30 0 * * * cd /app/backend && python compact_balances.py
+Повторный запуск за те же сутки ничего не добавляет.
+"""
+import argparse
+import sys
+import os
+import time
+from datetime import datetime
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сжатие журнала транзакций в снимки балансов")
+    parser.add_argument(
+        "--as-of",
+        type=datetime.fromisoformat,
+        help="Дата снимка (ISO, UTC). По умолчанию - полночь текущих суток"
+    )
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    as_of = args.as_of or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    print(f"🔄 Снимки балансов на {as_of.isoformat()}...")
+    try:
+        from app.db.session import SessionLocal, init_db
+        from app.db.balances import compact_balance_snapshots
+        
+        # Создаём таблицу balance_snapshots в старой БД
+        init_db()
+        
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            created = compact_balance_snapshots(db, as_of)
+            db.commit()
+        finally:
+            db.close()
+        
+        elapsed = time.perf_counter() - started
+        print(f"✓ Новых снимков: {created}")
+        print(f"✓ Готово за {elapsed:.2f} с")
+        
+    except Exception as e:
+        print(f"✗ Ошибка: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
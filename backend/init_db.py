@@ -12,12 +12,20 @@ def main():
     try:
         from app.db.base import Base
         from app.db.session import engine
-        from app.models import User, Service, Order, Message, Review, Transaction
+        from app.db.migrations import upgrade_schema
+        from app.db.search import setup_search
+        from app.db.facets import ensure_service_facets
+        from app.db.tags import ensure_tag_links
+        from app.models import User, Service, Order, Message, Review, Transaction, ServiceFacet, Tag, BalanceSnapshot, JobLease, OutboxEvent, Notification
         
         print("✓ Модели загружены")
         
         # Создаём таблицы
         Base.metadata.create_all(bind=engine)
+        schema_changes = upgrade_schema(engine)
+        setup_search(engine)
+        ensure_service_facets(engine)
+        ensure_tag_links(engine)
         print("✓ БД инициализирована успешно!")
         print("✓ Все таблицы созданы:")
         print("  - users")
@@ -26,6 +34,15 @@ def main():
         print("  - messages")
         print("  - reviews")
         print("  - transactions")
+        print("  - balance_snapshots")
+        print("  - job_leases")
+        print("  - outbox_events")
+        print("  - telegram_notifications")
+        print("  - service_facets")
+        print("  - tags, service_tags, user_skills")
+        print("  - services_fts (поисковый индекс)")
+        for change in schema_changes:
+            print(f"✓ Обновлена схема: {change}")
         
     except Exception as e:
         print(f"✗ Ошибка: {e}")
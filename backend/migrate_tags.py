@@ -0,0 +1,44 @@
+"""
+Скрипт для переноса тегов услуг и навыков пользователей в таблицы связей
+
+Раскладывает строки Service.tags и User.skills (через запятую) по таблицам
+tags, service_tags и user_skills. Повторный запуск пересобирает связи заново.
+"""
+import sys
+import os
+import time
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+def main():
+    print("🔄 Перенос тегов в таблицы связей...")
+    try:
+        from app.db.session import SessionLocal, init_db
+        from app.db.tags import rebuild_tag_links
+        
+        # Создаём таблицы tags, service_tags, user_skills в старой БД
+        init_db()
+        
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            result = rebuild_tag_links(db)
+            db.commit()
+        finally:
+            db.close()
+        
+        elapsed = time.perf_counter() - started
+        print(f"✓ Тегов: {result['tags']}")
+        print(f"✓ Связей услуга-тег: {result['service_tags']}")
+        print(f"✓ Связей пользователь-навык: {result['user_skills']}")
+        print(f"✓ Готово за {elapsed:.2f} с")
+        
+    except Exception as e:
+        print(f"✗ Ошибка: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Воркер уведомлений в Telegram и событий outbox (отдельный процесс)
+
+- раз в outbox_interval_seconds обрабатывает события переходов заказов:
+  выплата продавцу по order.completed, постановка уведомлений в очередь.
+  То же делает планировщик приложения; задачу в каждый момент выполняет
+  один процесс (аренда outbox), так что работать они могут одновременно.
+  С SCHEDULER_ENABLED=false этот воркер обязателен - иначе завершённые
+  заказы не выплачиваются;
+- если задан TELEGRAM_BOT_TOKEN, отправляет очередь telegram_notifications
+  с соблюдением лимитов Bot API, см. app/core/notifier.py.
+
+Запускать в одном экземпляре рядом с приложением:
+    cd /app/backend && python notification_worker.py
+"""
+import asyncio
+import logging
+import sys
+import os
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+logger = logging.getLogger("notification_worker")
+
+
+async def run_outbox_forever() -> None:
+    """Обрабатывать события outbox, пока задачу не отменят"""
+    from app.core.config import get_settings
+    from app.core.scheduler import scheduler
+    
+    while True:
+        try:
+            await asyncio.to_thread(scheduler.run_outbox)
+        except Exception as e:
+            logger.error(f"Ошибка обработки событий: {e}", exc_info=True)
+        await asyncio.sleep(get_settings().outbox_interval_seconds)
+
+
+async def run(send_notifications: bool) -> None:
+    from app.core.notifier import notifier
+    
+    tasks = [run_outbox_forever()]
+    if send_notifications:
+        tasks.append(notifier.run_forever())
+    await asyncio.gather(*tasks)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from app.core.config import get_settings
+    from app.db.session import init_db
+    
+    send_notifications = bool(get_settings().telegram_bot_token)
+    if not send_notifications:
+        print("⚠ TELEGRAM_BOT_TOKEN не задан - только события outbox, без отправки уведомлений")
+    
+    # Создаём таблицы outbox и telegram_notifications в старой БД
+    init_db()
+    
+    print("📨 Воркер событий и уведомлений запущен (Ctrl+C - остановить)")
+    try:
+        asyncio.run(run(send_notifications))
+    except KeyboardInterrupt:
+        print("✓ Остановлен")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Скрипт для пересчёта рейтингов продавцов и услуг по всем отзывам
+
+Нужен после переноса данных или если агрегаты разошлись с таблицей reviews.
+"""
+import sys
+import os
+import time
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+def main():
+    print("🔄 Пересчёт рейтингов...")
+    try:
+        from app.db.session import SessionLocal, init_db
+        from app.db.ratings import recompute_rating_aggregates
+        
+        # Добавляем недостающие колонки агрегатов в старую БД
+        init_db()
+        
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            result = recompute_rating_aggregates(db)
+            db.commit()
+        finally:
+            db.close()
+        
+        elapsed = time.perf_counter() - started
+        print(f"✓ Продавцов с отзывами: {result['users']}")
+        print(f"✓ Услуг с отзывами: {result['services']}")
+        print(f"✓ Готово за {elapsed:.2f} с")
+        
+    except Exception as e:
+        print(f"✗ Ошибка: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Скрипт сверки балансов пользователей с журналом транзакций
+
+Сравнивает User.balance с балансом по журналу (последний снимок +
+транзакции после него). С --full журнал суммируется с начала, без снимков -
+так проверяются и сами снимки. Завершается с кодом 1, если есть расхождения.
+"""
+import argparse
+import sys
+import os
+import time
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+# Сколько расхождений выводить подробно
+MAX_PRINTED = 20
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сверка балансов с журналом транзакций")
+    parser.add_argument("--full", action="store_true", help="Суммировать журнал с начала, без снимков")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    print("🔄 Сверка балансов с журналом транзакций...")
+    try:
+        from app.db.session import SessionLocal
+        from app.db.balances import reconcile_balances
+        
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            mismatches = reconcile_balances(db, use_snapshots=not args.full)
+        finally:
+            db.close()
+        
+        elapsed = time.perf_counter() - started
+        for mismatch in mismatches[:MAX_PRINTED]:
+            print(
+                f"✗ Пользователь {mismatch['user_id']}: баланс {mismatch['balance']}, "
+                f"по журналу {mismatch['journal_balance']} (разница {mismatch['difference']})"
+            )
+        print(f"Готово за {elapsed:.2f} с")
+        
+        if mismatches:
+            print(f"✗ Расхождений: {len(mismatches)}")
+            sys.exit(1)
+        print("✓ Балансы совпадают с журналом")
+        
+    except Exception as e:
+        print(f"✗ Ошибка: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
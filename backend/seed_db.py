@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Скрипт заполнения БД тестовыми данными (пользователи, услуги, заказы,
+сообщения, отзывы, транзакции)
+
+Данные согласованы (балансы сходятся с журналом, рейтинги пересчитаны) и
+детерминированы: тот же --seed, размеры и распределения дают те же строки.
+Пишет пачками через executemany, в PostgreSQL - через COPY. Заполняет
+только пустую БД; --reset сначала удаляет все таблицы.
+
+    python seed_db.py                                   # 1k/5k/50k/50k
+    python seed_db.py --users 100000 --services 500000 --orders 5000000 --messages 5000000
+    python seed_db.py --seed 7 --skew 1 --statuses completed=80,cancelled=20
+    python seed_db.py --database-url sqlite:///./seed.db --reset
+"""
+import argparse
+import os
+import sys
+import time
+
+# Добавляем текущую директорию в path
+sys.path.insert(0, os.getcwd())
+
+
+def parse_weights(value: str) -> dict[str, int]:
+    """'completed=60,cancelled=10' -> {'completed': 60, 'cancelled': 10}"""
+    weights = {}
+    for item in value.split(","):
+        key, _, weight = item.partition("=")
+        try:
+            weights[key.strip()] = int(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"ожидается ключ=вес через запятую: {item}")
+    return weights
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Заполнение БД тестовыми данными")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--services", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--messages", type=int, default=50000, help="Всего, распределяются по заказам")
+    parser.add_argument("--seed", type=int, default=42, help="Seed генератора")
+    parser.add_argument("--seller-share", type=float, help="Доля пользователей с услугами (0.2)")
+    parser.add_argument("--active-share", type=float, help="Доля активных услуг (0.9)")
+    parser.add_argument("--review-share", type=float, help="Доля завершённых заказов с отзывом (0.7)")
+    parser.add_argument("--skew", type=float, help="Перекос популярности продавцов и услуг, 1 - равномерно (2)")
+    parser.add_argument("--max-messages", type=int, help="Максимум сообщений в заказе (50)")
+    parser.add_argument("--price", help="Диапазон цен услуг в рублях, например 500-100000")
+    parser.add_argument("--statuses", type=parse_weights,
+                        help="Веса статусов заказов, например completed=60,in_progress=10,cancelled=30")
+    parser.add_argument("--ratings", type=parse_weights, help="Веса оценок отзывов, например 5=60,4=20,3=10,2=5,1=5")
+    parser.add_argument("--database-url", help="БД (по умолчанию DATABASE_URL из окружения/.env)")
+    parser.add_argument("--reset", action="store_true", help="Удалить все таблицы и создать заново")
+    return parser.parse_args()
+
+
+def build_distribution(args):
+    """SeedDistribution из аргументов; не заданные - по умолчанию"""
+    from app.db.seed import SeedDistribution
+    from app.models import OrderStatus
+
+    options = {}
+    for option, name in (
+        ("seller_share", "seller_share"),
+        ("active_share", "active_service_share"),
+        ("review_share", "review_share"),
+        ("skew", "popularity_skew"),
+        ("max_messages", "max_messages_per_order"),
+    ):
+        if getattr(args, option) is not None:
+            options[name] = getattr(args, option)
+    if args.price:
+        low, _, high = args.price.partition("-")
+        options["min_price"], options["max_price"] = int(low), int(high)
+    if args.statuses:
+        options["order_status_weights"] = {OrderStatus(status): weight for status, weight in args.statuses.items()}
+    if args.ratings:
+        options["rating_weights"] = {int(rating): weight for rating, weight in args.ratings.items()}
+    return SeedDistribution(**options)
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        # До импорта приложения: настройки читают DATABASE_URL при импорте
+        os.environ["DATABASE_URL"] = args.database_url
+
+    print("🔄 Заполнение БД тестовыми данными...")
+    try:
+        from app.db.base import Base
+        from app.db.session import engine, init_db
+        from app.db.seed import SeedError, SeedSizes, seed_database
+
+        try:
+            distribution = build_distribution(args)
+        except ValueError as e:
+            print(f"✗ Неверные распределения: {e}")
+            sys.exit(2)
+        sizes = SeedSizes(users=args.users, services=args.services, orders=args.orders, messages=args.messages)
+
+        if args.reset:
+            Base.metadata.drop_all(bind=engine)
+            print("✓ Таблицы удалены")
+        init_db()
+
+        started = time.perf_counter()
+        last = [started]
+
+        def progress(table: str, count: int) -> None:
+            now = time.perf_counter()
+            print(f"  {table:14} {count:>10} строк  {now - last[0]:7.1f} с")
+            last[0] = now
+
+        try:
+            counts = seed_database(engine, sizes, args.seed, distribution, progress)
+        except SeedError as e:
+            print(f"✗ {e} (--reset удалит все данные)")
+            sys.exit(1)
+
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        print(f"✓ Создано {total} строк за {elapsed:.1f} с ({total / elapsed:,.0f} строк/с), seed {args.seed}")
+
+    except SystemExit:
+        raise
+    except Exception as e:
+        print(f"✗ Ошибка: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()